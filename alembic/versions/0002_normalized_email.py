@@ -0,0 +1,45 @@
+"""Normalized email column for case-insensitive lookups
+
+Adds users.email_normalized (lower(trim(email))) with a unique index that
+also covers id, and drops the case-sensitive unique index on email.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("users", sa.Column("email_normalized", sa.String(), nullable=True))
+    op.execute("UPDATE users SET email_normalized = lower(trim(email))")
+
+    # Accounts that only differ by case have to be merged by hand first
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT email_normalized FROM users GROUP BY email_normalized "
+        "HAVING count(*) > 1 LIMIT 10"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            f"Users differing only by email case must be merged before this migration: {duplicates}"
+        )
+
+    op.alter_column("users", "email_normalized", nullable=False)
+    op.create_index(
+        "ix_users_email_normalized",
+        "users",
+        ["email_normalized"],
+        unique=True,
+        postgresql_include=["id"]
+    )
+    op.drop_index("ix_users_email", table_name="users")
+
+def downgrade():
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.drop_index("ix_users_email_normalized", table_name="users")
+    op.drop_column("users", "email_normalized")
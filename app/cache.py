@@ -1,10 +1,24 @@
 from redis.asyncio import Redis
 import os
-from typing import Optional
+import time
+from typing import Any, Optional
 import logging
+from .metrics import REDIS_COMMAND_SECONDS
 
 logger = logging.getLogger(__name__)
 
+class InstrumentedRedis(Redis):
+    """Redis client that records the round-trip time of every command."""
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.labels(command=str(args[0]).upper()).observe(
+                time.perf_counter() - start_time
+            )
+
 redis_client: Optional[Redis] = None
 
 async def init_redis_pool() -> Redis:
@@ -14,7 +28,7 @@ async def init_redis_pool() -> Redis:
         if not redis_url:
             raise ValueError("REDIS_URL environment variable is not set")
             
-        redis_client = Redis.from_url(
+        redis_client = InstrumentedRedis.from_url(
             redis_url,
             decode_responses=True
         )
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
 from functools import lru_cache
+from typing import Dict, List, Optional
+import json
 import os
 from dotenv import load_dotenv
 
@@ -8,21 +10,159 @@ load_dotenv()
 class Settings(BaseModel):
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
+    # Total connections all workers together may open; split per worker
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    DB_POOL_SIZE: Optional[int] = int(os.getenv("DB_POOL_SIZE")) if os.getenv("DB_POOL_SIZE") else None
+    DB_MAX_OVERFLOW: Optional[int] = int(os.getenv("DB_MAX_OVERFLOW")) if os.getenv("DB_MAX_OVERFLOW") else None
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_TIMEOUT_SECONDS: int = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    # asyncpg prepared statement cache; set to 0 behind pgbouncer transaction pooling
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    # Read-only lookups go to these when set, falling back to the primary
+    DATABASE_REPLICA_URLS: List[str] = [u for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u]
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+    REPLICA_CHECK_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "1"))
     
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
+    # HS256 signs with SECRET_KEY; RS*/ES* sign with the PEM keys in JWT_KEYS_DIR
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
+    JWT_KEYS_DIR: str = os.getenv("JWT_KEYS_DIR", "")
+    JWT_ACTIVE_KID: str = os.getenv("JWT_ACTIVE_KID", "")
+    # Shared secret internal services send as X-Internal-Token to /introspect
+    INTROSPECTION_CLIENT_SECRET: str = os.getenv("INTROSPECTION_CLIENT_SECRET", "")
+    # X-Admin-Token for the admin API; the admin routes answer 404 while unset
+    ADMIN_API_TOKEN: str = os.getenv("ADMIN_API_TOKEN", "")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    TOKEN_CACHE_TTL_SECONDS: int = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+    # Per-worker Bloom filter over revoked token ids (2**20 bits = 128 KiB)
+    REVOCATION_BLOOM_BITS: int = int(os.getenv("REVOCATION_BLOOM_BITS", str(2 ** 20)))
+    REVOCATION_BLOOM_HASHES: int = int(os.getenv("REVOCATION_BLOOM_HASHES", "7"))
+    REVOCATION_BLOOM_REBUILD_SECONDS: int = int(os.getenv("REVOCATION_BLOOM_REBUILD_SECONDS", "900"))
+    
+    # Password hashing
+    # Every web worker has its own pool, so by default they share the cores between them
+    PASSWORD_HASH_WORKERS: int = int(os.getenv(
+        "PASSWORD_HASH_WORKERS",
+        str(max((os.cpu_count() or 1) // max(int(os.getenv("WEB_CONCURRENCY", "1")), 1), 1))
+    ))
+    PASSWORD_HASH_QUEUE_SIZE: int = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+    PASSWORD_HASH_SCHEME: str = os.getenv("PASSWORD_HASH_SCHEME", "argon2")
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "4"))
+    PASSWORD_HASH_CALIBRATE: bool = os.getenv("PASSWORD_HASH_CALIBRATE", "false").lower() == "true"
+    PASSWORD_HASH_TARGET_MS: int = int(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+    
+    # Bulk user import
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    IMPORT_MAX_LINE_BYTES: int = int(os.getenv("IMPORT_MAX_LINE_BYTES", "65536"))
+    # Imports share the hashing pool with logins: small jobs, at most half the
+    # workers at a time, so an interactive hash never queues behind a whole chunk
+    IMPORT_HASH_BATCH_SIZE: int = int(os.getenv("IMPORT_HASH_BATCH_SIZE", "4"))
+    # Per-row failures returned by the API; the CLI writes every one to a file
+    IMPORT_MAX_REPORTED_FAILURES: int = int(os.getenv("IMPORT_MAX_REPORTED_FAILURES", "1000"))
+    
+    # User cache
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "5000"))
+    USER_CACHE_LOCAL_TTL_SECONDS: int = int(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", "30"))
+    USER_CACHE_REDIS_TTL_SECONDS: int = int(os.getenv("USER_CACHE_REDIS_TTL_SECONDS", "300"))
+    # Kept short: an unknown email may be registered a moment later
+    USER_CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "5"))
     
     # Rate limiting
-    RATE_LIMIT_PER_MINUTE: int = 100
+    # Only for load tests, which send everything from one IP
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "100"))
+    # sliding_window_log, sliding_window_counter or token_bucket
+    RATE_LIMIT_ALGORITHM: str = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window_counter")
+    # exact: one Redis call per request; approximate: local counters synced in batches
+    RATE_LIMIT_MODE: str = os.getenv("RATE_LIMIT_MODE", "exact")
+    RATE_LIMIT_SYNC_INTERVAL_MS: int = int(os.getenv("RATE_LIMIT_SYNC_INTERVAL_MS", "250"))
+    RATE_LIMIT_ERROR_BUDGET: float = float(os.getenv("RATE_LIMIT_ERROR_BUDGET", "0.1"))
+    
+    # Access logging (JSON lines, written by a background thread)
+    ACCESS_LOG_FILE: str = os.getenv("ACCESS_LOG_FILE", "")  # stdout when empty
+    ACCESS_LOG_MAX_BYTES: int = int(os.getenv("ACCESS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    ACCESS_LOG_BACKUP_COUNT: int = int(os.getenv("ACCESS_LOG_BACKUP_COUNT", "5"))
+    ACCESS_LOG_QUEUE_SIZE: int = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+    ACCESS_LOG_BATCH_SIZE: int = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "256"))
+    # Fraction of 2xx responses logged on the sampled paths (all paths when empty)
+    ACCESS_LOG_SAMPLE_RATE: float = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+    ACCESS_LOG_SAMPLE_PATHS: List[str] = [p for p in os.getenv("ACCESS_LOG_SAMPLE_PATHS", "").split(",") if p]
+    
+    # Webhook ingestion (Redis Streams)
+    # HMAC-SHA256 keys for X-Webhook-Signature: WEBHOOK_SECRET for /webhook and
+    # WEBHOOK_SECRETS ({"integration id": "secret"}) for /webhook/{integration id}.
+    # Integrations without a secret answer 404.
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_SECRETS: Dict[str, str] = json.loads(os.getenv("WEBHOOK_SECRETS", "{}"))
+    WEBHOOK_MAX_BODY_BYTES: int = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", str(256 * 1024)))
+    # Maximum age (or clock skew) of the payload timestamp; 0 disables the check
+    WEBHOOK_REPLAY_WINDOW_SECONDS: int = int(os.getenv("WEBHOOK_REPLAY_WINDOW_SECONDS", "300"))
+    WEBHOOK_IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("WEBHOOK_IDEMPOTENCY_TTL_SECONDS", str(3 * 86400)))
+    WEBHOOK_STREAM_MAXLEN: int = int(os.getenv("WEBHOOK_STREAM_MAXLEN", "100000"))
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "2"))  # per process
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+    WEBHOOK_BLOCK_MS: int = int(os.getenv("WEBHOOK_BLOCK_MS", "1000"))
+    WEBHOOK_HANDLER_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_HANDLER_TIMEOUT_SECONDS", "10"))
+    # Failed events are retried after 1x, 2x, 4x ... this delay, then dead-lettered
+    WEBHOOK_RETRY_BASE_SECONDS: int = int(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "15"))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+    
+    # Integration callbacks
+    CALLBACK_MAX_BODY_BYTES: int = int(os.getenv("CALLBACK_MAX_BODY_BYTES", str(64 * 1024)))
+    
+    # Notifications (outbox dispatcher)
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_USERNAME: str = os.getenv("SMTP_USERNAME", "")
+    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
+    SMTP_STARTTLS: bool = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_TIMEOUT_SECONDS: float = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+    EMAIL_FROM: str = os.getenv("EMAIL_FROM", "")
+    # Bulk SMS API: one POST of {"messages": [...]} per batch
+    SMS_API_URL: str = os.getenv("SMS_API_URL", "")
+    SMS_API_KEY: str = os.getenv("SMS_API_KEY", "")
+    SMS_FROM: str = os.getenv("SMS_FROM", "")
+    # Users may only notify their own email address, plus any recipient listed
+    # for the template here: {"template id": ["ops@example.com", "+15550100"]}
+    NOTIFICATION_ALLOWED_RECIPIENTS: Dict[str, List[str]] = json.loads(os.getenv("NOTIFICATION_ALLOWED_RECIPIENTS", "{}"))
+    NOTIFICATION_BATCH_SIZE: int = int(os.getenv("NOTIFICATION_BATCH_SIZE", "100"))
+    NOTIFICATION_POLL_SECONDS: float = float(os.getenv("NOTIFICATION_POLL_SECONDS", "1"))
+    # After a wake-up, wait this long so a burst of requests shares one batch
+    NOTIFICATION_LINGER_MS: int = int(os.getenv("NOTIFICATION_LINGER_MS", "50"))
+    NOTIFICATION_MAX_ATTEMPTS: int = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+    # Failed sends are retried after 1x, 2x, 4x ... this delay
+    NOTIFICATION_RETRY_BASE_SECONDS: int = int(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", "30"))
+    # How long a claimed batch is hidden from other dispatchers while it is sent;
+    # raised to twice the provider's worst-case send time for the batch
+    NOTIFICATION_LEASE_SECONDS: int = int(os.getenv("NOTIFICATION_LEASE_SECONDS", "60"))
+    # Provider limits for the whole deployment; each worker gets its share
+    NOTIFICATION_EMAIL_RATE_PER_SECOND: float = float(os.getenv("NOTIFICATION_EMAIL_RATE_PER_SECOND", "10"))
+    NOTIFICATION_SMS_RATE_PER_SECOND: float = float(os.getenv("NOTIFICATION_SMS_RATE_PER_SECOND", "10"))
+    
+    # Outbound HTTP (social auth providers)
+    HTTP_CLIENT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "5"))
+    HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS", "2"))
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "100"))
+    HTTP_CLIENT_MAX_KEEPALIVE: int = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "20"))
     
     # OAuth settings
+    GOOGLE_AUTH_URL: str = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+    GOOGLE_TOKEN_URL: str = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+    GOOGLE_JWKS_URL: str = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
     GOOGLE_REDIRECT_URI: str = os.getenv("GOOGLE_REDIRECT_URI", "")
     
+    FACEBOOK_AUTH_URL: str = os.getenv("FACEBOOK_AUTH_URL", "https://www.facebook.com/v12.0/dialog/oauth")
+    FACEBOOK_GRAPH_URL: str = os.getenv("FACEBOOK_GRAPH_URL", "https://graph.facebook.com/v12.0")
     FACEBOOK_CLIENT_ID: str = os.getenv("FACEBOOK_CLIENT_ID", "")
     FACEBOOK_CLIENT_SECRET: str = os.getenv("FACEBOOK_CLIENT_SECRET", "")
     FACEBOOK_REDIRECT_URI: str = os.getenv("FACEBOOK_REDIRECT_URI", "")
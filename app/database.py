@@ -1,10 +1,26 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from contextlib import asynccontextmanager
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import asyncio
 import os
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, List, Optional, Tuple
 from fastapi import HTTPException
 import logging
 from dotenv import load_dotenv
+from .config import Settings, get_settings
+from .metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_CHECKOUT_WAIT_SECONDS,
+    DB_CONNECTIONS_OPENED,
+    DB_CONNECTIONS_CLOSED,
+    DB_REPLICA_LAG_SECONDS,
+    DB_REPLICA_HEALTHY
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,40 +32,246 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-# Ensure the URL uses the async driver
-if DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+def async_url(url: str) -> str:
+    # Ensure the URL uses the async driver
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
-# Create async engine with better error handling
-try:
+DATABASE_URL = async_url(DATABASE_URL)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long a checkout waits for a connection."""
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT_SECONDS.observe(time.perf_counter() - start_time)
+
+def pool_budget(settings: Settings) -> Tuple[int, int]:
+    """
+    Split DB_MAX_CONNECTIONS across every worker process so the cluster as a
+    whole stays under the server's max_connections. Explicit DB_POOL_SIZE /
+    DB_MAX_OVERFLOW settings win over the computed budget.
+    """
+    per_worker = max(settings.DB_MAX_CONNECTIONS // max(settings.WEB_CONCURRENCY, 1), 1)
+    pool_size = settings.DB_POOL_SIZE or max(per_worker * 2 // 3, 1)
+    max_overflow = settings.DB_MAX_OVERFLOW
+    if max_overflow is None:
+        max_overflow = max(per_worker - pool_size, 0)
+    return pool_size, max_overflow
+
+def _attach_pool_events(engine: AsyncEngine):
+    pool = engine.sync_engine.pool
+
+    def record_pool_state(*args):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    def record_connect(*args):
+        DB_CONNECTIONS_OPENED.inc()
+
+    def record_close(*args):
+        DB_CONNECTIONS_CLOSED.inc()
+
+    event.listen(pool, "checkout", record_pool_state)
+    event.listen(pool, "checkin", record_pool_state)
+    event.listen(pool, "connect", record_connect)
+    event.listen(pool, "close", record_close)
+    event.listen(pool, "close_detached", record_close)
+
+def build_engine(url: str) -> AsyncEngine:
+    settings = get_settings()
+    pool_size, max_overflow = pool_budget(settings)
+    # Driver-specific; lets SQLite files stand in for Postgres in tests
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg://"):
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
     engine = create_async_engine(
-        DATABASE_URL,
-        echo=True,
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
         pool_pre_ping=True,
-        pool_size=10,
-        max_overflow=20
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        connect_args=connect_args
     )
+    _attach_pool_events(engine)
+    logger.info(f"Database pool sized at {pool_size} connections plus {max_overflow} overflow")
+    return engine
+
+def read_only(engine: AsyncEngine) -> AsyncEngine:
+    """
+    A view of the engine, sharing its pool, whose connections run in
+    autocommit: each SELECT is one round trip, without the BEGIN before it
+    or the COMMIT/ROLLBACK after it.
+    """
+    return engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# Create async engine with better error handling
+try:
+    engine = build_engine(DATABASE_URL)
     async_session = sessionmaker(
         engine,
         class_=AsyncSession,
         expire_on_commit=False
     )
+    read_only_session = sessionmaker(
+        read_only(engine),
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
     Base = declarative_base()
 except Exception as e:
     logger.error(f"Failed to create database engine: {str(e)}")
     raise
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+@asynccontextmanager
+async def write_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Read-write session on the primary. The transaction starts with the first
+    statement and is committed once at the end; callers only commit earlier
+    when something has to happen after the commit.
+    """
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
-        except Exception as e:
+            # Nothing to commit when the caller never touched the database
+            if session.in_transaction():
+                await session.commit()
+        except SQLAlchemyError as e:
             await session.rollback()
             logger.error(f"Database error: {str(e)}")
             raise HTTPException(status_code=500, detail="Database error")
-        finally:
-            await session.close()
+        except Exception:
+            # HTTPExceptions and the like reach the client unchanged
+            await session.rollback()
+            raise
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Declare as Depends(get_db, scope="function"): with the default request
+    scope the commit only runs once the response is sent, so a failed commit
+    would still reach the client as a success.
+    """
+    async with write_session() as session:
+        yield session
+
+@asynccontextmanager
+async def _read_only_scope(session_factory: sessionmaker) -> AsyncGenerator[AsyncSession, None]:
+    async with session_factory() as session:
+        try:
+            yield session
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {str(e)}")
+            raise HTTPException(status_code=500, detail="Database error")
+
+async def get_primary_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Read-only session on the primary, for reads that must see the latest writes."""
+    async with _read_only_scope(read_only_session) as session:
+        yield session
+
+# Read replicas, routed to by get_read_db while they keep up with the primary
+replica_engines: List[AsyncEngine] = []
+replica_sessions: List[sessionmaker] = []
+replica_healthy: List[bool] = []
+_next_replica = 0
+_replica_monitor_task: Optional[asyncio.Task] = None
+
+# Lag is zero while a replica has replayed everything it received, so an
+# idle primary doesn't make healthy replicas look stale
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+def init_replicas(urls: Optional[List[str]] = None):
+    """
+    Build an engine per replica. Replicas start out unhealthy, so nothing is
+    routed to one before its lag has been measured.
+    """
+    urls = get_settings().DATABASE_REPLICA_URLS if urls is None else urls
+    for url in urls:
+        replica_engine = build_engine(async_url(url))
+        replica_engines.append(replica_engine)
+        replica_sessions.append(sessionmaker(read_only(replica_engine), class_=AsyncSession, expire_on_commit=False))
+        replica_healthy.append(False)
+    if urls:
+        logger.info(f"Configured {len(urls)} read replicas")
+
+async def replication_lag(replica_engine: AsyncEngine) -> float:
+    if replica_engine.dialect.name != "postgresql":
+        return 0.0
+    async with replica_engine.connect() as conn:
+        return float((await conn.execute(REPLICA_LAG_QUERY)).scalar())
+
+async def check_replicas():
+    max_lag = get_settings().REPLICA_MAX_LAG_SECONDS
+    for index, replica_engine in enumerate(replica_engines):
+        label = str(index)
+        try:
+            lag = await replication_lag(replica_engine)
+            DB_REPLICA_LAG_SECONDS.labels(replica=label).set(lag)
+            healthy = lag <= max_lag
+        except Exception as e:
+            logger.warning(f"Read replica {index} unavailable: {str(e)}")
+            healthy = False
+        if healthy != replica_healthy[index]:
+            logger.info(f"Read replica {index} is now {'in' if healthy else 'out of'} rotation")
+        replica_healthy[index] = healthy
+        DB_REPLICA_HEALTHY.labels(replica=label).set(1 if healthy else 0)
+
+def read_sessionmaker() -> sessionmaker:
+    """Round-robin over the healthy replicas, or the read-only primary when there are none."""
+    global _next_replica
+    for _ in range(len(replica_sessions)):
+        index = _next_replica % len(replica_sessions)
+        _next_replica += 1
+        if replica_healthy[index]:
+            return replica_sessions[index]
+    return read_only_session
+
+async def _monitor_replicas():
+    interval = get_settings().REPLICA_CHECK_INTERVAL_SECONDS
+    while True:
+        await check_replicas()
+        await asyncio.sleep(interval)
+
+def start_replica_monitor():
+    global _replica_monitor_task
+    if _replica_monitor_task is None and replica_sessions:
+        _replica_monitor_task = asyncio.create_task(_monitor_replicas())
+
+async def stop_replica_monitor():
+    global _replica_monitor_task
+    if _replica_monitor_task is None:
+        return
+    _replica_monitor_task.cancel()
+    try:
+        await _replica_monitor_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    _replica_monitor_task = None
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for handlers that only read, such as token-to-user lookups.
+    Served by a replica when one is within REPLICA_MAX_LAG_SECONDS. It runs
+    in autocommit and never commits, so it must not be used for writes.
+    """
+    async with _read_only_scope(read_sessionmaker()) as session:
+        yield session
+
+def is_replica_session(session: AsyncSession) -> bool:
+    # Read-only views share the pool of the engine they were made from
+    return session.bind.sync_engine.pool is not engine.sync_engine.pool
 
 async def create_tables():
     try:
@@ -64,6 +286,8 @@ async def create_tables():
 async def close_db_connection():
     try:
         await engine.dispose()
+        for replica_engine in replica_engines:
+            await replica_engine.dispose()
         logger.info("Database connection closed")
     except Exception as e:
         logger.error(f"Error closing database connection: {str(e)}") 
\ No newline at end of file
@@ -1,15 +1,28 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from app.database import create_tables, close_db_connection
-from app.cache import init_redis_pool, close_redis_connection
-from app.routers import auth, web_service
-from app.middleware.error_handler import error_handler_middleware
-from app.middleware.logging import logging_middleware
-from app.middleware.security import rate_limit_middleware
+from app.database import (
+    create_tables,
+    close_db_connection,
+    init_replicas,
+    start_replica_monitor,
+    stop_replica_monitor
+)
+from app.cache import init_redis_pool, close_redis_connection, get_redis
+from app.utils.hashing import calibrate_hashing, init_hashing_pool, close_hashing_pool
+from app.repositories.user import start_user_cache_listener, stop_user_cache_listener
+from app.utils.rate_limit import start_rate_limit_sync, stop_rate_limit_sync
+from app.utils.access_log import start_access_log_writer, stop_access_log_writer
+from app.utils.revocation import start_revocation_listener, stop_revocation_listener
+from app.utils.keys import load_signing_keys
+from app.utils.http_client import init_http_client, close_http_client
+from app.utils.webhooks import start_webhook_workers, stop_webhook_workers
+from app.utils.notifications import start_notification_dispatcher, stop_notification_dispatcher
+from app.routers import auth, web_service, admin, metrics, well_known
+from app.middleware.stack import install_middleware
 from app.config import get_settings
+from app.metrics import mark_worker_dead
 import logging
 from fastapi.middleware.cors import CORSMiddleware
-from app.middleware.force_https import ForceHTTPSMiddleware
 import os
 
 # Configure logging
@@ -22,20 +35,44 @@ IS_DEVELOPMENT = os.getenv("ENVIRONMENT", "development") == "development"
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # Refuse to start with missing or broken signing keys
+    load_signing_keys()
+    start_access_log_writer()
+    await init_http_client()
     try:
         await create_tables()
+        init_replicas()
+        start_replica_monitor()
         await init_redis_pool()
+        start_user_cache_listener()
+        start_revocation_listener()
+        start_rate_limit_sync()
+        start_webhook_workers()
+        start_notification_dispatcher()
+        # Before the pool starts, so its workers get the shared cost
+        await calibrate_hashing(await get_redis())
+        init_hashing_pool()
         logger.info("Application startup completed")
     except Exception as e:
         logger.error(f"Application startup failed: {str(e)}")
     yield
     # Shutdown
     try:
+        await stop_user_cache_listener()
+        await stop_revocation_listener()
+        await stop_rate_limit_sync()
+        await stop_webhook_workers()
+        await stop_notification_dispatcher()
+        await stop_replica_monitor()
         await close_db_connection()
         await close_redis_connection()
+        close_hashing_pool()
         logger.info("Application shutdown completed")
     except Exception as e:
         logger.error(f"Application shutdown error: {str(e)}")
+    await close_http_client()
+    await stop_access_log_writer()
+    mark_worker_dead()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -53,14 +90,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add middleware
-app.middleware("http")(error_handler_middleware)
-app.middleware("http")(logging_middleware)
-app.middleware("http")(rate_limit_middleware)
-
-# Add the Force HTTPS middleware only in production
-if not IS_DEVELOPMENT:
-    app.add_middleware(ForceHTTPSMiddleware)
+# Add middleware; HTTPS is only forced in production
+install_middleware(app, force_https=not IS_DEVELOPMENT)
 
 # Include routers
 app.include_router(
@@ -71,6 +102,13 @@ app.include_router(
     web_service.router,
     prefix="/api/v1"
 )
+app.include_router(
+    admin.router,
+    prefix="/api/v1"
+)
+
+app.include_router(metrics.router)
+app.include_router(well_known.router)
 
 # Health check endpoint
 @app.get("/health")
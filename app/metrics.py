@@ -0,0 +1,167 @@
+import os
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+# Under several workers every process writes its samples to PROMETHEUS_MULTIPROC_DIR
+# and a scrape of any worker aggregates all of them. Gauges therefore declare how
+# per-process values are combined.
+IS_MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum"
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ["policy"]
+)
+
+# Database pool
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the SQLAlchemy pool",
+    multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections open beyond pool_size",
+    multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection, including connecting a new one",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "db_connections_opened_total",
+    "New database connections opened by the pool"
+)
+DB_CONNECTIONS_CLOSED = Counter(
+    "db_connections_closed_total",
+    "Database connections closed by the pool (recycled, invalidated or overflow)"
+)
+
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds",
+    "Replication lag of each read replica as last measured",
+    ["replica"],
+    multiprocess_mode="max"
+)
+DB_REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy",
+    "1 while a replica is reachable and within REPLICA_MAX_LAG_SECONDS",
+    ["replica"],
+    multiprocess_mode="min"
+)
+
+# Redis
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command round-trip time",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+# Password hashing
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hashing jobs submitted to the worker pool and not yet finished",
+    multiprocess_mode="livesum"
+)
+PASSWORD_HASH_QUEUE_WAIT_SECONDS = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time a hashing job waited for a free pool worker",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds",
+    "Time spent hashing or verifying a password, including queue wait",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hashing jobs rejected because the worker pool was saturated"
+)
+
+# Verified-token cache
+TOKEN_CACHE_HITS = Counter(
+    "token_cache_hits_total",
+    "get_current_user calls served from the in-process token cache"
+)
+TOKEN_CACHE_MISSES = Counter(
+    "token_cache_misses_total",
+    "get_current_user calls that had to decode the token and query the database"
+)
+
+# User repository
+USER_CACHE_LOOKUPS = Counter(
+    "user_cache_lookups_total",
+    "User lookups by the tier that served them",
+    ["tier"]
+)
+
+# Webhooks
+WEBHOOK_EVENTS = Counter(
+    "webhook_events_total",
+    "Webhook events by type and outcome (queued, duplicate, processed, failed, dead_lettered)",
+    ["event_type", "outcome"]
+)
+WEBHOOK_REJECTIONS = Counter(
+    "webhook_rejections_total",
+    "Webhooks rejected before queuing (unknown_integration, too_large, bad_signature, stale, invalid)",
+    ["reason"]
+)
+
+# Integration callbacks
+CALLBACK_REQUESTS = Counter(
+    "callback_requests_total",
+    "Integration callbacks by outcome (processed, busy, invalid, timeout, failed)",
+    ["integration", "outcome"]
+)
+
+# Notification outbox
+NOTIFICATIONS = Counter(
+    "notifications_total",
+    "Notifications by channel and outcome (queued, sent, retried, failed)",
+    ["channel", "outcome"]
+)
+NOTIFICATION_BATCHES = Counter(
+    "notification_batches_total",
+    "Batches handed to a notification provider",
+    ["channel"]
+)
+
+# Access logging
+ACCESS_LOG_DROPPED = Counter(
+    "access_log_dropped_total",
+    "Access log records dropped because the writer queue was full"
+)
+
+def render_metrics() -> bytes:
+    if not IS_MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+def mark_worker_dead():
+    # Drops this worker's live gauges from the aggregate once it exits
+    if IS_MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,19 +1,33 @@
-from fastapi import Request, Response
 from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
-from typing import Callable
 
 logger = logging.getLogger(__name__)
 
-async def error_handler_middleware(
-    request: Request,
-    call_next: Callable
-) -> Response:
-    try:
-        return await call_next(request)
-    except Exception as e:
-        logger.exception("Unhandled exception occurred")
-        return JSONResponse(
-            status_code=500,
-            content={"detail": "Internal server error"}
-        ) 
\ No newline at end of file
+def error_handler_middleware(app: ASGIApp) -> ASGIApp:
+    async def middleware(scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await app(scope, receive, send_wrapper)
+        except Exception:
+            logger.exception("Unhandled exception occurred")
+            # Too late to replace a response that is already on the wire
+            if response_started:
+                raise
+            response = JSONResponse(
+                status_code=500,
+                content={"detail": "Internal server error"}
+            )
+            await response(scope, receive, send)
+
+    return middleware
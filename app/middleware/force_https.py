@@ -1,14 +1,19 @@
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Response
+from starlette.datastructures import URL
+from starlette.types import ASGIApp, Receive, Scope, Send
 import os
 
-class ForceHTTPSMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip HTTPS redirect in test environment
-        if os.getenv("TESTING") == "true":
-            return await call_next(request)
-            
-        if request.url.scheme != "https":
-            url = request.url.replace(scheme="https", netloc=request.url.netloc)
-            return Response(status_code=301, headers={"Location": str(url)})
-        return await call_next(request) 
\ No newline at end of file
+def force_https_middleware(app: ASGIApp) -> ASGIApp:
+    # Skip HTTPS redirect in test environment
+    if os.getenv("TESTING") == "true":
+        return app
+
+    async def middleware(scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["scheme"] == "https":
+            return await app(scope, receive, send)
+
+        url = URL(scope=scope).replace(scheme="https")
+        response = Response(status_code=301, headers={"Location": str(url)})
+        await response(scope, receive, send)
+
+    return middleware
@@ -1,23 +1,34 @@
-from fastapi import Request, Response
-import logging
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
-from typing import Callable
+from ..utils.access_log import enqueue_access_record, should_log
 
-logger = logging.getLogger(__name__)
+def logging_middleware(app: ASGIApp) -> ASGIApp:
+    async def middleware(scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
 
-async def logging_middleware(
-    request: Request,
-    call_next: Callable
-) -> Response:
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    logger.info(
-        f"Path: {request.url.path} "
-        f"Method: {request.method} "
-        f"Status: {response.status_code} "
-        f"Duration: {process_time:.3f}s"
-    )
-    
-    return response 
\ No newline at end of file
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            if should_log(scope["path"], status_code):
+                # Serialisation and I/O happen on the writer thread
+                enqueue_access_record({
+                    "ts": time.time(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 3),
+                    "client": scope["client"][0] if scope.get("client") else None,
+                })
+
+    return middleware
@@ -1,30 +1,69 @@
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from typing import Callable
-import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from redis.exceptions import RedisError
+import logging
 from ..cache import get_redis
+from ..config import get_settings
+from ..metrics import RATE_LIMIT_REJECTIONS
+from ..utils.rate_limit import (
+    EXEMPT_PATHS,
+    hit,
+    hit_local,
+    policy_for_path,
+    rate_limit_headers
+)
 
-async def rate_limit_middleware(
-    request: Request,
-    call_next: Callable
-) -> JSONResponse:
-    redis = await get_redis()
-    client_ip = request.client.host
-    endpoint = request.url.path
-    
-    # Create a rate limit key for this IP and endpoint
-    rate_key = f"rate_limit:{client_ip}:{endpoint}"
-    
-    # Check if rate limit is exceeded
-    requests = await redis.incr(rate_key)
-    if requests == 1:
-        await redis.expire(rate_key, 60)  # Reset after 60 seconds
-        
-    if requests > 100:  # 100 requests per minute
-        return JSONResponse(
-            status_code=429,
-            content={"detail": "Too many requests"}
-        )
-        
-    response = await call_next(request)
-    return response 
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+def rate_limit_middleware(app: ASGIApp) -> ASGIApp:
+    async def middleware(scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or not get_settings().RATE_LIMIT_ENABLED:
+            return await app(scope, receive, send)
+
+        endpoint = scope["path"]
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        policy = policy_for_path(endpoint)
+        identity = f"{client_ip}:{endpoint}"
+
+        if get_settings().RATE_LIMIT_MODE == "approximate" and policy.can_approximate():
+            result = hit_local(policy, identity)
+        else:
+            try:
+                # One atomic script call per request for this IP and endpoint
+                redis = await get_redis()
+                result = await hit(redis, policy, identity)
+            except (RuntimeError, RedisError) as e:
+                logger.warning(f"Rate limiter unavailable for policy {policy.name}: {str(e)}")
+                if not policy.fail_open:
+                    response = JSONResponse(
+                        status_code=503,
+                        content={"detail": "Service temporarily unavailable"},
+                        headers={"Retry-After": "1"}
+                    )
+                    return await response(scope, receive, send)
+                result = None
+
+        headers = rate_limit_headers(policy, result)
+        if result is not None and not result.allowed:
+            RATE_LIMIT_REJECTIONS.labels(policy=policy.name).inc()
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers=headers
+            )
+            return await response(scope, receive, send)
+
+        if not headers:
+            return await app(scope, receive, send)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    response_headers[name] = value
+            await send(message)
+
+        await app(scope, receive, send_wrapper)
+
+    return middleware
@@ -0,0 +1,21 @@
+from fastapi import FastAPI
+from .error_handler import error_handler_middleware
+from .force_https import force_https_middleware
+from .logging import logging_middleware
+from .metrics import metrics_middleware
+from .security import rate_limit_middleware
+
+def install_middleware(app: FastAPI, force_https: bool = False):
+    """
+    Register the pure ASGI middlewares, listed from outermost to innermost.
+    Each one is a plain function taking the wrapped app, so a request pays for
+    a few nested calls instead of the extra task and stream BaseHTTPMiddleware
+    creates per layer.
+    """
+    stack = [metrics_middleware, rate_limit_middleware, logging_middleware, error_handler_middleware]
+    if force_https:
+        stack.insert(0, force_https_middleware)
+
+    # add_middleware() wraps whatever was added before it, so add innermost first
+    for middleware in reversed(stack):
+        app.add_middleware(middleware)
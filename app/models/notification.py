@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from ..database import Base
+
+class Notification(Base):
+    """
+    Outbox row written in the same transaction as the request that asked for
+    it; the dispatcher sends it afterwards and records the outcome here.
+    """
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    channel = Column(String, nullable=False)  # email or sms
+    recipient = Column(String, nullable=False)
+    template_id = Column(String, nullable=True)
+    data = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    # pending -> sent, or failed once the attempts run out
+    status = Column(String, nullable=False, server_default="pending")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Only the rows still to be sent, in the order the dispatcher claims them
+        Index(
+            "ix_notifications_due",
+            "channel",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
@@ -1,12 +1,32 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from sqlalchemy.sql import func
 from ..database import Base
 
+def normalize_email(email: str) -> str:
+    """The form every lookup and uniqueness check uses, so Foo@x.com and foo@x.com are one account."""
+    return email.strip().lower()
+
+def _normalized_email_default(context) -> str:
+    # Lets User(email=...) and inserts that only set email fill it in themselves
+    return normalize_email(context.get_current_parameters()["email"])
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True, nullable=False)
+    # As the user typed it, for display and token subjects
+    email = Column(String, nullable=False)
+    email_normalized = Column(String, nullable=False, default=_normalized_email_default)
     password_hash = Column(String, nullable=False)
     full_name = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Covers the id too, so existence checks are index-only scans
+        Index(
+            "ix_users_email_normalized",
+            "email_normalized",
+            unique=True,
+            postgresql_include=["id"]
+        ),
+    )
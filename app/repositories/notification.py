@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.notification import Notification
+
+async def queue_notification(
+    db: AsyncSession,
+    user_id: int,
+    channel: str,
+    recipient: str,
+    template_id: Optional[str],
+    data: Dict[str, Any]
+) -> int:
+    """
+    Add a notification to the outbox. It is written in the caller's
+    transaction, so it is only sent if that transaction commits.
+    """
+    statement = insert(Notification).values(
+        user_id=user_id,
+        channel=channel,
+        recipient=recipient,
+        template_id=template_id,
+        data=data
+    ).returning(Notification.id)
+    result = await db.execute(statement)
+    return result.scalar_one()
+
+async def claim_due(db: AsyncSession, channel: str, limit: int, lease_seconds: int) -> List[Notification]:
+    """
+    Take up to limit due notifications for one channel and lease them: the
+    attempt is counted and they stay hidden until the lease runs out, so a
+    dispatcher that dies mid-send leaves them to be retried. SKIP LOCKED
+    lets dispatchers in other workers claim disjoint batches concurrently.
+    """
+    due = (
+        select(Notification.id)
+        .where(
+            Notification.status == "pending",
+            Notification.channel == channel,
+            Notification.next_attempt_at <= func.now()
+        )
+        .order_by(Notification.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(Notification)
+        .where(Notification.id.in_(due.scalar_subquery()))
+        .values(
+            attempts=Notification.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=lease_seconds)
+        )
+        .returning(Notification)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.scalars(statement)
+    return list(result.all())
+
+async def record_results(
+    db: AsyncSession,
+    notifications: List[Notification],
+    errors: List[Optional[str]],
+    max_attempts: int,
+    retry_base_seconds: int
+) -> Dict[str, int]:
+    """
+    Store the outcome of a sent batch with one executemany UPDATE by primary
+    key. Failures are rescheduled with exponential backoff until max_attempts.
+    A row is only written while it still carries the attempt count this
+    dispatcher claimed it with: if the lease ran out and someone else claimed
+    it again, that claim owns the row now.
+    """
+    now = datetime.now(timezone.utc)
+    rows = []
+    outcomes = {"sent": 0, "retried": 0, "failed": 0}
+    for notification, error in zip(notifications, errors):
+        # Bind names must differ from the column names they set
+        row = {
+            "row_id": notification.id,
+            "claimed_attempts": notification.attempts,
+            "new_status": "pending",
+            "new_next_attempt_at": now,
+            "new_sent_at": None,
+            "new_last_error": error
+        }
+        if error is None:
+            row.update(new_status="sent", new_sent_at=now)
+            outcomes["sent"] += 1
+        elif notification.attempts >= max_attempts:
+            row.update(new_status="failed")
+            outcomes["failed"] += 1
+        else:
+            delay = retry_base_seconds * 2 ** (notification.attempts - 1)
+            row.update(new_next_attempt_at=now + timedelta(seconds=delay))
+            outcomes["retried"] += 1
+        rows.append(row)
+    if rows:
+        table = Notification.__table__
+        statement = (
+            update(table)
+            .where(
+                table.c.id == bindparam("row_id"),
+                table.c.attempts == bindparam("claimed_attempts"),
+                table.c.status == "pending"
+            )
+            .values(
+                status=bindparam("new_status"),
+                next_attempt_at=bindparam("new_next_attempt_at"),
+                sent_at=bindparam("new_sent_at"),
+                last_error=bindparam("new_last_error")
+            )
+        )
+        await db.execute(statement, rows)
+    return outcomes
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import get_redis
+from ..config import get_settings
+from ..metrics import USER_CACHE_LOOKUPS
+from ..models.user import User as UserModel, normalize_email
+from ..utils.token_cache import clear_token_cache, invalidate_user_tokens
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "user_cache:invalidate"
+# Stored for accounts created through social login; matches no password scheme
+UNUSABLE_PASSWORD = "!"
+LOCK_TIMEOUT_MS = 5000
+LOCK_POLL_INTERVAL = 0.05
+LOCK_POLL_ATTEMPTS = 20
+MAX_RECONNECT_DELAY = 30.0
+# Marks an email with no user, so concurrent misses don't all query the database
+MISSING_FIELD = "missing"
+
+# Only the worker that took the fill lock may release it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_lock_script = None
+
+# normalized email -> (expires_at, record)
+_local_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_inflight: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+_listener_task: Optional[asyncio.Task] = None
+
+def _redis_key(email: str) -> str:
+    return f"user:{email}"
+
+def to_record(user: UserModel) -> Dict[str, Any]:
+    # The password hash never enters either cache tier; login reads it from the database
+    return {
+        "id": user.id,
+        "email": user.email,
+        "full_name": user.full_name,
+    }
+
+def to_model(record: Dict[str, Any]) -> UserModel:
+    return UserModel(**record)
+
+def _get_local(email: str) -> Optional[Dict[str, Any]]:
+    entry = _local_cache.get(email)
+    if entry is None:
+        return None
+    expires_at, record = entry
+    if expires_at <= time.monotonic():
+        _local_cache.pop(email, None)
+        return None
+    _local_cache.move_to_end(email)
+    return record
+
+def _set_local(email: str, record: Dict[str, Any]):
+    settings = get_settings()
+    _local_cache[email] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL_SECONDS, record)
+    _local_cache.move_to_end(email)
+    while len(_local_cache) > settings.USER_CACHE_SIZE:
+        _local_cache.popitem(last=False)
+
+async def _get_shared(email: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """(found, record): found with no record means the email is known to have no user."""
+    redis = await get_redis()
+    data = await redis.hgetall(_redis_key(email))
+    if not data:
+        return False, None
+    if MISSING_FIELD in data:
+        return True, None
+    return True, dict(data, id=int(data["id"]))
+
+async def _set_shared(email: str, record: Dict[str, Any]):
+    redis = await get_redis()
+    key = _redis_key(email)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={k: str(v) for k, v in record.items()})
+        pipe.expire(key, get_settings().USER_CACHE_REDIS_TTL_SECONDS)
+        await pipe.execute()
+
+async def _set_shared_missing(email: str):
+    redis = await get_redis()
+    key = _redis_key(email)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, MISSING_FIELD, "1")
+        pipe.expire(key, get_settings().USER_CACHE_NEGATIVE_TTL_SECONDS)
+        await pipe.execute()
+
+async def _release_lock(lock_key: str, token: str):
+    global _release_lock_script
+    redis = await get_redis()
+    if _release_lock_script is None:
+        _release_lock_script = redis.register_script(RELEASE_LOCK_SCRIPT)
+    await _release_lock_script(keys=[lock_key], args=[token], client=redis)
+
+async def _query_database(db: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+    USER_CACHE_LOOKUPS.labels(tier="database").inc()
+    result = await db.execute(select(UserModel).where(UserModel.email_normalized == email))
+    user = result.scalars().first()
+    return to_record(user) if user else None
+
+async def _load_through_redis(db: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+    try:
+        found, record = await _get_shared(email)
+        if found:
+            USER_CACHE_LOOKUPS.labels(tier="redis").inc()
+            return record
+
+        # Only one worker in the cluster fills a cold key; the others wait for it
+        redis = await get_redis()
+        lock_key = f"{_redis_key(email)}:lock"
+        token = secrets.token_hex(16)
+        if not await redis.set(lock_key, token, nx=True, px=LOCK_TIMEOUT_MS):
+            for _ in range(LOCK_POLL_ATTEMPTS):
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                found, record = await _get_shared(email)
+                if found:
+                    USER_CACHE_LOOKUPS.labels(tier="redis").inc()
+                    return record
+            return await _query_database(db, email)
+
+        try:
+            record = await _query_database(db, email)
+            if record is not None:
+                await _set_shared(email, record)
+            else:
+                await _set_shared_missing(email)
+            return record
+        finally:
+            # The lock may have expired and been taken by another worker meanwhile
+            await _release_lock(lock_key, token)
+    except (RuntimeError, RedisError) as e:
+        # Redis is an optimisation here, never a hard dependency
+        logger.warning(f"User cache unavailable, reading from database: {str(e)}")
+        return await _query_database(db, email)
+
+async def get_user_record(db: AsyncSession, email: str) -> Optional[Dict[str, Any]]:
+    # Every cache tier and the query are keyed on the normalized address
+    email = normalize_email(email)
+    record = _get_local(email)
+    if record is not None:
+        USER_CACHE_LOOKUPS.labels(tier="local").inc()
+        return record
+
+    # Concurrent requests for the same cold key in this worker share one load
+    pending = _inflight.get(email)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[email] = future
+    try:
+        record = await _load_through_redis(db, email)
+        if record is not None:
+            _set_local(email, record)
+        future.set_result(record)
+        return record
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _inflight.pop(email, None)
+        if not future.done():
+            future.cancel()
+        elif not future.cancelled():
+            # Avoid "exception was never retrieved" when nobody else was waiting
+            future.exception()
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[UserModel]:
+    record = await get_user_record(db, email)
+    return to_model(record) if record else None
+
+async def get_user_for_login(db: AsyncSession, email: str) -> Optional[UserModel]:
+    """The user with its password hash, straight from the database, bypassing the cache."""
+    result = await db.execute(select(UserModel).where(UserModel.email_normalized == normalize_email(email)))
+    return result.scalars().first()
+
+async def email_exists(db: AsyncSession, email: str) -> bool:
+    result = await db.execute(
+        select(UserModel.id).where(UserModel.email_normalized == normalize_email(email)).limit(1)
+    )
+    return result.first() is not None
+
+async def create_user(db: AsyncSession, email: str, password_hash: str, full_name: str) -> Optional[int]:
+    """
+    Insert a user in one round trip. Returns the new id, or None when the
+    email is already taken, including by a concurrent registration.
+    """
+    statement = insert(UserModel).values(
+        email=email,
+        email_normalized=normalize_email(email),
+        password_hash=password_hash,
+        full_name=full_name
+    ).on_conflict_do_nothing(index_elements=[UserModel.email_normalized]).returning(UserModel.id)
+    result = await db.execute(statement)
+    return result.scalar_one_or_none()
+
+async def upsert_social_user(db: AsyncSession, email: str, full_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Create the user on first social login or match the existing social-only
+    row, in one INSERT ... ON CONFLICT (email_normalized) DO UPDATE ...
+    RETURNING statement. Returns None when the email belongs to an account
+    with a password: a provider login never takes over such an account.
+    """
+    statement = insert(UserModel).values(
+        email=email,
+        email_normalized=normalize_email(email),
+        full_name=full_name,
+        password_hash=UNUSABLE_PASSWORD
+    )
+    # A no-op update so RETURNING also yields the row when it already exists,
+    # keeping the address as it was first registered
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserModel.email_normalized],
+        set_={"email_normalized": statement.excluded.email_normalized},
+        where=UserModel.password_hash == UNUSABLE_PASSWORD
+    ).returning(UserModel.id, UserModel.email, UserModel.full_name, UserModel.password_hash)
+    result = await db.execute(statement)
+    row = result.mappings().one_or_none()
+    return dict(row) if row is not None else None
+
+async def invalidate_user(email: str):
+    """
+    Call after any change to a user row so every worker drops its copy and
+    the tokens it verified against the old row.
+    """
+    await invalidate_users([email])
+
+async def invalidate_users(emails: Iterable[str]):
+    """invalidate_user for many rows at once, in a single Redis round trip."""
+    emails = {normalize_email(email) for email in emails}
+    if not emails:
+        return
+    for email in emails:
+        _local_cache.pop(email, None)
+        invalidate_user_tokens(email)
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*(_redis_key(email) for email in emails))
+            for email in emails:
+                pipe.publish(INVALIDATION_CHANNEL, email)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to publish user cache invalidation: {str(e)}")
+
+async def _follow_invalidations():
+    redis = await get_redis()
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(INVALIDATION_CHANNEL)
+    # Invalidations published while this worker was not subscribed are lost,
+    # so nothing cached before now can be trusted
+    _local_cache.clear()
+    clear_token_cache()
+    try:
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                _local_cache.pop(message["data"], None)
+                invalidate_user_tokens(message["data"])
+    finally:
+        try:
+            await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+        except RedisError:
+            pass
+        await pubsub.aclose()
+
+async def _listen_for_invalidations():
+    delay = 1.0
+    while True:
+        started_at = time.monotonic()
+        try:
+            await _follow_invalidations()
+        except (RuntimeError, RedisError) as e:
+            logger.warning(f"User cache listener waiting for Redis: {str(e)}")
+        except Exception as e:
+            logger.exception(f"User cache listener failed, restarting: {str(e)}")
+        # Back off while Redis stays down, start over after a healthy stretch
+        delay = 1.0 if time.monotonic() - started_at > MAX_RECONNECT_DELAY else min(delay * 2, MAX_RECONNECT_DELAY)
+        await asyncio.sleep(delay)
+
+def start_user_cache_listener():
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_for_invalidations())
+
+async def stop_user_cache_listener():
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    _listener_task = None
+    _local_cache.clear()
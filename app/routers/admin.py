@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import List
+from ..config import get_settings
+from ..schemas.auth import ImportFailure, ImportSummary
+from ..utils.bulk_import import IMPORT_FORMATS, import_users, split_lines, verify_admin_client
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/api/admin/v1",
+    tags=["admin"],
+    dependencies=[Depends(verify_admin_client)]
+)
+
+@router.post(
+    "/users/import",
+    response_model=ImportSummary,
+    description="Bulk-create users from a CSV or JSON lines request body"
+)
+async def import_users_endpoint(
+    request: Request,
+    format: str = Query("csv", description="csv (with a header row) or jsonl"),
+    start_row: int = Query(0, ge=0, description="rows_processed of an interrupted import")
+) -> ImportSummary:
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {', '.join(IMPORT_FORMATS)}"
+        )
+
+    # The body is streamed, so only the first failures are kept for the response
+    max_failures = get_settings().IMPORT_MAX_REPORTED_FAILURES
+    failures: List[ImportFailure] = []
+
+    def collect(failure: ImportFailure):
+        if len(failures) < max_failures:
+            failures.append(failure)
+
+    committed = {"rows_processed": start_row}
+
+    def checkpoint(rows_processed: int):
+        committed["rows_processed"] = rows_processed
+
+    try:
+        totals = await import_users(
+            split_lines(request.stream()),
+            format,
+            start_row=start_row,
+            on_failure=collect,
+            on_checkpoint=checkpoint
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"User import failed after row {committed['rows_processed']}: {str(e)}")
+        # Everything up to the checkpoint is committed; retry from there
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"message": "Import interrupted", "rows_processed": committed["rows_processed"]}
+        )
+    return ImportSummary(
+        **totals,
+        failures=failures,
+        failures_truncated=totals["failed"] > len(failures)
+    )
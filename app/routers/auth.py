@@ -1,26 +1,43 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Response
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Dict
+from fastapi import APIRouter, HTTPException, status, Depends, Response, BackgroundTasks
+from fastapi.security import OAuth2PasswordRequestForm
+from typing import Dict, Optional
+import asyncio
 from ..schemas.auth import (
     UserRegister, 
     UserLogin, 
     Token, 
     UserResponse,
     PasswordResetRequest,
-    PasswordResetConfirm
+    PasswordResetConfirm,
+    RefreshRequest,
+    IntrospectionRequest,
+    IntrospectionResponse
 )
 from ..utils.auth import (
-    verify_password,
-    get_password_hash,
     create_access_token,
     verify_token,
-    get_current_user
+    get_current_user,
+    rehash_user_password,
+    oauth2_scheme
 )
-from ..database import get_db
+from ..utils.token_cache import invalidate_token, get_cached_token
+from ..utils.revocation import revoke_token
+from ..utils.introspection import introspect_tokens, verify_internal_client
+from ..utils.refresh_tokens import issue_refresh_token, rotate_refresh_token, revoke_refresh_token
+from ..repositories.user import get_user_for_login, upsert_social_user, email_exists, create_user, invalidate_user
+from ..utils.social_auth import (
+    start_authorization,
+    consume_authorization,
+    google_authorization_url,
+    facebook_authorization_url,
+    exchange_google_code,
+    exchange_facebook_code
+)
+from ..utils.hashing import hash_password_async, verify_password_async, needs_rehash
+from ..database import get_db, get_read_db, get_primary_read_db
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from ..models.user import User as UserModel
-from ..config import get_settings
 from ..cache import get_redis
 from redis.asyncio import Redis
 from pydantic import EmailStr
@@ -34,7 +51,10 @@ router = APIRouter(
     }
 )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/v1/login")
+async def issue_tokens(redis: Redis, email: str) -> Token:
+    access_token = create_access_token(data={"sub": email})
+    refresh_token = await issue_refresh_token(redis, email)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 @router.post(
     "/register",
@@ -46,31 +66,36 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/v1/login")
 )
 async def register(
     user_data: UserRegister,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ) -> UserResponse:
-    # Check if user exists
-    existing_user = await db.execute(
-        select(UserModel).where(UserModel.email == user_data.email)
-    )
-    if existing_user.scalars().first():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    new_user = UserModel(
-        email=user_data.email,
-        password_hash=hashed_password,
-        full_name=user_data.full_name
+    already_registered = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Email already registered"
     )
-    
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)  # Refresh to get the new user's ID
 
-    return UserResponse(id=new_user.id, email=new_user.email, full_name=new_user.full_name)
+    # Hash in the process pool while the cheap duplicate check runs
+    hash_task = asyncio.create_task(hash_password_async(user_data.password))
+    try:
+        if await email_exists(db, user_data.email):
+            raise already_registered
+        hashed_password = await hash_task
+    finally:
+        if not hash_task.done():
+            hash_task.cancel()
+
+    # ON CONFLICT DO NOTHING settles the race between concurrent signups
+    user_id = await create_user(db, user_data.email, hashed_password, user_data.full_name)
+    if user_id is None:
+        raise already_registered
+    # Committed before answering, so a login right after finds the account
+    try:
+        await db.commit()
+    except IntegrityError:
+        raise already_registered
+    # Only now: a lookup racing an earlier drop could re-cache "no such user"
+    await invalidate_user(user_data.email)
+
+    return UserResponse(id=user_id, email=user_data.email, full_name=user_data.full_name)
 
 @router.post(
     "/login",
@@ -80,76 +105,126 @@ async def register(
     }
 )
 async def login(
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_primary_read_db),
+    redis: Redis = Depends(get_redis)
 ) -> Token:
     # Verify user credentials
-    result = await db.execute(
-        select(UserModel).where(UserModel.email == form_data.username)
-    )
-    user = result.scalars().first()
+    user = await get_user_for_login(db, form_data.username)
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Upgrade stale hashes (old scheme or cost) after the response is sent
+    if needs_rehash(user.password_hash):
+        background_tasks.add_task(
+            rehash_user_password, user.id, user.email, form_data.password, user.password_hash
+        )
     
-    # Create access token
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await issue_tokens(redis, user.email)
+
+@router.post(
+    "/refresh",
+    response_model=Token,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "Invalid, expired or reused refresh token"}
+    }
+)
+async def refresh(
+    refresh_data: RefreshRequest,
+    redis: Redis = Depends(get_redis)
+) -> Token:
+    # One Redis script call, no database or password hashing
+    subject, refresh_token = await rotate_refresh_token(redis, refresh_data.refresh_token)
+    access_token = create_access_token(data={"sub": subject})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post(
+    "/introspect",
+    response_model=IntrospectionResponse,
+    dependencies=[Depends(verify_internal_client)],
+    description="Validate a batch of access tokens for internal services"
+)
+async def introspect(
+    request_data: IntrospectionRequest,
+    db: AsyncSession = Depends(get_read_db)
+) -> IntrospectionResponse:
+    results = await introspect_tokens(db, request_data.tokens)
+    return IntrospectionResponse(results=results)
 
 # Social Authentication Routes
+async def sign_in_social_user(db: AsyncSession, profile: Dict[str, str]) -> Dict:
+    user = await upsert_social_user(db, profile["email"], profile["full_name"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An account with this email already exists; sign in with its password"
+        )
+    # Committed before any token is issued for it, then a cached "no such user" is dropped
+    await db.commit()
+    await invalidate_user(user["email"])
+    return user
+
 @router.get(
     "/google/login",
     description="Initiate Google OAuth2 login flow"
 )
-async def google_login():
-    settings = get_settings()
-    return {
-        "url": f"https://accounts.google.com/o/oauth2/v2/auth?"
-        f"response_type=code&client_id={settings.GOOGLE_CLIENT_ID}&"
-        f"redirect_uri={settings.GOOGLE_REDIRECT_URI}&"
-        "scope=openid%20email%20profile"
-    }
+async def google_login(redis: Redis = Depends(get_redis)):
+    authorization = await start_authorization(redis, "google")
+    return {"url": google_authorization_url(authorization)}
 
 @router.get(
     "/google/callback",
     response_model=Token,
-    description="Handle Google OAuth2 callback"
+    description="Handle Google OAuth2 callback",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid state or failed authorization"},
+        status.HTTP_409_CONFLICT: {"description": "Email belongs to a password account"}
+    }
 )
 async def google_callback(
     code: str,
-    db: AsyncSession = Depends(get_db)
+    state: str,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    redis: Redis = Depends(get_redis)
 ) -> Token:
-    # Implementation for Google OAuth callback
-    pass
+    code_verifier = await consume_authorization(redis, "google", state)
+    profile = await exchange_google_code(code, code_verifier)
+    user = await sign_in_social_user(db, profile)
+    return await issue_tokens(redis, user["email"])
 
 @router.get(
     "/facebook/login",
     description="Initiate Facebook OAuth2 login flow"
 )
-async def facebook_login():
-    settings = get_settings()
-    return {
-        "url": f"https://www.facebook.com/v12.0/dialog/oauth?"
-        f"client_id={settings.FACEBOOK_CLIENT_ID}&"
-        f"redirect_uri={settings.FACEBOOK_REDIRECT_URI}&"
-        "scope=email"
-    }
+async def facebook_login(redis: Redis = Depends(get_redis)):
+    authorization = await start_authorization(redis, "facebook")
+    return {"url": facebook_authorization_url(authorization)}
 
 @router.get(
     "/facebook/callback",
     response_model=Token,
-    description="Handle Facebook OAuth2 callback"
+    description="Handle Facebook OAuth2 callback",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid state or failed authorization"},
+        status.HTTP_409_CONFLICT: {"description": "Email belongs to a password account"}
+    }
 )
 async def facebook_callback(
     code: str,
-    db: AsyncSession = Depends(get_db)
+    state: str,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    redis: Redis = Depends(get_redis)
 ) -> Token:
-    # Implementation for Facebook OAuth callback
-    pass
+    code_verifier = await consume_authorization(redis, "facebook", state)
+    profile = await exchange_facebook_code(code, code_verifier)
+    user = await sign_in_social_user(db, profile)
+    return await issue_tokens(redis, user["email"])
 
 @router.post(
     "/password-reset/request",
@@ -158,7 +233,7 @@ async def facebook_callback(
 )
 async def request_password_reset(
     email: EmailStr,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_primary_read_db)
 ):
     # Implement password reset request logic
     # 1. Verify email exists
@@ -175,12 +250,12 @@ async def request_password_reset(
 )
 async def confirm_password_reset(
     reset_data: PasswordResetConfirm,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     # Implement password reset confirmation logic
     # 1. Verify token
     # 2. Update password
-    await db.commit()
+    # 3. invalidate_user(email), which also drops the user's cached tokens on every worker
     return {"message": "Password successfully updated"}
 
 @router.post(
@@ -190,13 +265,21 @@ async def confirm_password_reset(
 )
 async def logout(
     response: Response,
+    refresh_data: Optional[RefreshRequest] = None,
+    token: str = Depends(oauth2_scheme),
     current_user: UserModel = Depends(get_current_user),
     redis: Redis = Depends(get_redis)
 ):
-    # Implement logout logic
-    # 1. Invalidate token in Redis
-    # 2. Clear cookie if using cookie auth
-    await redis.delete(f"user_session:{current_user.id}")
+    # Deny-list the token on every worker until it expires.
+    # get_current_user has just cached the verified claims for this token
+    cached = get_cached_token(token)
+    claims = cached[0] if cached else await verify_token(token)
+    if claims.get("jti") and claims.get("exp"):
+        await revoke_token(claims["jti"], claims["exp"])
+    invalidate_token(token)
+    # Without this the refresh token would keep minting access tokens
+    if refresh_data is not None:
+        await revoke_refresh_token(redis, refresh_data.refresh_token, current_user.email)
     response.delete_cookie(key="access_token")
     return {"message": "Successfully logged out"}
 
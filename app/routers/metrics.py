@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from ..metrics import render_metrics
+
+router = APIRouter(tags=["monitoring"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
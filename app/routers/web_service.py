@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request
-from typing import Dict, Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Request
+from typing import Optional
 from ..schemas.web_service import (
     WebhookPayload,
     WebhookResponse,
@@ -12,6 +12,21 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.user import User as UserModel
 from ..config import get_settings
 from ..cache import get_redis
+from ..utils.webhooks import enqueue_event
+from ..utils.callbacks import dispatch_callback
+from ..utils.notifications import NOTIFICATION_CHANNELS, recipient_allowed, wake_dispatcher
+from ..repositories.notification import queue_notification
+from ..utils.webhook_auth import (
+    DEFAULT_INTEGRATION,
+    check_replay_window,
+    read_body,
+    verify_signature,
+    webhook_key
+)
+from ..metrics import NOTIFICATIONS, WEBHOOK_REJECTIONS
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 import httpx
 import logging
 import json
@@ -22,79 +37,84 @@ router = APIRouter(
     tags=["web-service"],
 )
 
+@router.post(
+    "/webhook/{integration_id}",
+    response_model=WebhookResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {"content": {"application/json": {"schema": WebhookPayload.model_json_schema()}}}
+    }
+)
 @router.post(
     "/webhook",
     response_model=WebhookResponse,
-    status_code=status.HTTP_200_OK
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {"content": {"application/json": {"schema": WebhookPayload.model_json_schema()}}}
+    }
 )
 async def handle_webhook(
-    payload: WebhookPayload,
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    integration_id: str = DEFAULT_INTEGRATION,
+    redis: Redis = Depends(get_redis)
 ) -> WebhookResponse:
     """
-    Handle incoming webhooks from external services
+    Accept webhooks from external services. Events are queued after the
+    signature and idempotency checks and processed by the webhook workers.
     """
+    # Cheapest checks first: unknown integration, size, then the HMAC over
+    # the exact bytes that were sent, all before any JSON parsing
+    key = webhook_key(integration_id)
+    body = await read_body(request)
+    verify_signature(key, body, request.headers.get("X-Webhook-Signature"))
+
     try:
-        # Verify webhook signature if needed
-        signature = request.headers.get("X-Webhook-Signature")
-        
-        # Process the webhook payload
-        event_type = payload.event_type
-        
-        # Handle different event types
-        if event_type == "user.created":
-            # Handle user creation event
-            pass
-        elif event_type == "payment.succeeded":
-            # Handle payment success
-            pass
-        
-        return WebhookResponse(
-            status="success",
-            message="Webhook processed successfully"
+        payload = WebhookPayload.model_validate_json(body)
+    except ValidationError:
+        WEBHOOK_REJECTIONS.labels(reason="invalid").inc()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid webhook payload"
         )
-    except Exception as e:
-        logger.error(f"Webhook processing error: {str(e)}")
+    check_replay_window(payload.timestamp)
+    # Only the signed id counts; an unsigned header could give a replayed
+    # body a fresh idempotency key
+    event_id = payload.event_id
+    if not event_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to process webhook"
+            detail="Missing webhook event id"
         )
 
+    try:
+        queued = await enqueue_event(redis, integration_id, event_id, payload)
+    except RedisError as e:
+        logger.error(f"Failed to queue webhook {event_id}: {str(e)}")
+        # Senders retry on 5xx, so nothing is lost
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook queue unavailable",
+            headers={"Retry-After": "5"}
+        )
+
+    return WebhookResponse(
+        status="accepted" if queued else "duplicate",
+        message="Webhook queued for processing" if queued else "Webhook already received",
+        data={"event_id": event_id}
+    )
+
 @router.post(
     "/callback/{integration_id}",
     response_model=CallbackResponse
 )
 async def handle_callback(
     integration_id: str,
-    request: Request,
-    db: AsyncSession = Depends(get_db)
+    request: Request
 ) -> CallbackResponse:
     """
-    Handle callbacks from various integrations
+    Handle callbacks from the integrations registered in utils.callbacks
     """
-    try:
-        # Get callback data
-        callback_data = await request.json()
-        
-        # Process based on integration_id
-        if integration_id == "payment":
-            # Handle payment callback
-            return await process_payment_callback(callback_data, db)
-        elif integration_id == "oauth":
-            # Handle OAuth callback
-            return await process_oauth_callback(callback_data, db)
-            
-        return CallbackResponse(
-            success=True,
-            message="Callback processed successfully"
-        )
-    except Exception as e:
-        logger.error(f"Callback processing error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to process callback"
-        )
+    return await dispatch_callback(integration_id, request)
 
 @router.post(
     "/notify",
@@ -102,49 +122,36 @@ async def handle_callback(
 )
 async def send_notification(
     payload: NotificationPayload,
+    background_tasks: BackgroundTasks,
     current_user: UserModel = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db, scope="function")
 ):
     """
-    Send notifications to external services
+    Queue a notification in the outbox. It is committed before the response
+    and sent by the notification dispatcher in a batch with others.
     """
-    try:
-        # Process notification
-        notification_type = payload.notification_type
-        
-        # Send to appropriate service
-        if notification_type == "email":
-            await send_email_notification(payload, current_user)
-        elif notification_type == "sms":
-            await send_sms_notification(payload, current_user)
-        
-        return {"status": "notification queued"}
-    except Exception as e:
-        logger.error(f"Notification error: {str(e)}")
+    if payload.notification_type not in NOTIFICATION_CHANNELS:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send notification"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported notification type: {payload.notification_type}"
+        )
+    if not recipient_allowed(current_user, payload):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Notifications can only be sent to your own address"
         )
 
-# Helper functions
-async def process_payment_callback(data: Dict, db: AsyncSession) -> CallbackResponse:
-    # Implement payment callback processing
-    return CallbackResponse(
-        success=True,
-        message="Payment processed successfully"
-    )
-
-async def process_oauth_callback(data: Dict, db: AsyncSession) -> CallbackResponse:
-    # Implement OAuth callback processing
-    return CallbackResponse(
-        success=True,
-        message="OAuth callback processed successfully"
+    notification_id = await queue_notification(
+        db,
+        current_user.id,
+        payload.notification_type,
+        payload.recipient,
+        payload.template_id,
+        payload.data
     )
-
-async def send_email_notification(payload: NotificationPayload, user: UserModel):
-    # Implement email notification
-    pass
-
-async def send_sms_notification(payload: NotificationPayload, user: UserModel):
-    # Implement SMS notification
-    pass 
\ No newline at end of file
+    # The dispatcher only sees committed rows, so commit before waking it
+    await db.commit()
+    NOTIFICATIONS.labels(channel=payload.notification_type, outcome="queued").inc()
+    # Nudge the dispatcher once the response is out; it polls the outbox anyway
+    background_tasks.add_task(wake_dispatcher)
+    return {"status": "notification queued", "notification_id": notification_id}
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request, Response, status
+from ..utils.keys import jwks_document
+
+router = APIRouter(
+    prefix="/.well-known",
+    tags=["well-known"],
+)
+
+@router.get(
+    "/jwks.json",
+    description="Public keys for verifying access tokens offline"
+)
+async def jwks(request: Request) -> Response:
+    # Keys only change on restart, so the body and ETag are computed once
+    document = jwks_document()
+    headers = {
+        "ETag": document["etag"],
+        "Cache-Control": "public, max-age=300",
+    }
+    if request.headers.get("if-none-match") == document["etag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=document["body"], media_type="application/json", headers=headers)
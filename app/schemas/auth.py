@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import List, Optional
 
 class UserRegister(BaseModel):
     email: EmailStr
@@ -13,6 +13,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class UserResponse(BaseModel):
     id: int
@@ -24,4 +28,47 @@ class PasswordResetRequest(BaseModel):
 
 class PasswordResetConfirm(BaseModel):
     token: str
-    new_password: str = Field(..., min_length=8) 
\ No newline at end of file
+    new_password: str = Field(..., min_length=8) 
+
+class IntrospectionRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=100)
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    username: Optional[str] = None
+    user_id: Optional[int] = None
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+    jti: Optional[str] = None
+    token_type: Optional[str] = None
+
+class IntrospectionResponse(BaseModel):
+    results: List[TokenIntrospection]
+
+class UserImportRecord(BaseModel):
+    email: EmailStr
+    full_name: str = Field(..., min_length=2)
+    # Either a plain password to hash, or an existing bcrypt/argon2 hash
+    password: Optional[str] = Field(None, min_length=8)
+    password_hash: Optional[str] = None
+
+    @model_validator(mode="after")
+    def one_password_field(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("exactly one of password or password_hash is required")
+        return self
+
+class ImportFailure(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class ImportSummary(BaseModel):
+    # Rows consumed from the input, counting any skipped through start_row;
+    # pass it back as start_row to resume an interrupted import
+    rows_processed: int
+    imported: int
+    failed: int
+    failures: List[ImportFailure]
+    failures_truncated: bool = False
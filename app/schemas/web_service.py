@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field
 from typing import Dict, Optional, Any
 
 class WebhookPayload(BaseModel):
+    # Sender's unique event id, covered by the signature; used for idempotency
+    event_id: Optional[str] = None
     event_type: str
     data: Dict[str, Any]
     timestamp: Optional[str] = None
@@ -16,6 +18,17 @@ class CallbackResponse(BaseModel):
     message: str
     data: Optional[Dict[str, Any]] = None
 
+class PaymentCallback(BaseModel):
+    transaction_id: str
+    status: str
+    amount: Optional[int] = None  # minor units
+    currency: Optional[str] = None
+
+class OAuthCallback(BaseModel):
+    code: Optional[str] = None
+    state: Optional[str] = None
+    error: Optional[str] = None
+
 class NotificationPayload(BaseModel):
     notification_type: str = Field(..., description="Type of notification (email, sms, etc.)")
     recipient: str = Field(..., description="Recipient identifier (email, phone number, etc.)")
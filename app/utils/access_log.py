@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from ..config import get_settings
+from ..metrics import ACCESS_LOG_DROPPED
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+STOP_TIMEOUT_SECONDS = 5
+
+access_queue: "queue.Queue[Any]" = queue.Queue(maxsize=get_settings().ACCESS_LOG_QUEUE_SIZE)
+_writer_thread: Optional[threading.Thread] = None
+dropped_records: int = 0
+
+def should_log(path: str, status_code: int) -> bool:
+    settings = get_settings()
+    if status_code >= 300 or settings.ACCESS_LOG_SAMPLE_RATE >= 1.0:
+        return True
+    if settings.ACCESS_LOG_SAMPLE_PATHS and path not in settings.ACCESS_LOG_SAMPLE_PATHS:
+        return True
+    return random.random() < settings.ACCESS_LOG_SAMPLE_RATE
+
+def enqueue_access_record(record: Dict[str, Any]):
+    """Called on the request path; never blocks and never raises."""
+    global dropped_records
+    try:
+        access_queue.put_nowait(record)
+    except queue.Full:
+        dropped_records += 1
+        ACCESS_LOG_DROPPED.inc()
+
+def _build_handler() -> logging.Handler:
+    settings = get_settings()
+    if settings.ACCESS_LOG_FILE:
+        handler = RotatingFileHandler(
+            settings.ACCESS_LOG_FILE,
+            maxBytes=settings.ACCESS_LOG_MAX_BYTES,
+            backupCount=settings.ACCESS_LOG_BACKUP_COUNT
+        )
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+def _write_batch(handler: logging.Handler, batch: List[Dict[str, Any]]):
+    # One emit per batch: a single write, flush and rollover check for many lines
+    lines = "\n".join(json.dumps(record, separators=(",", ":")) for record in batch)
+    handler.handle(logging.makeLogRecord({"msg": lines, "levelno": logging.INFO}))
+
+def _writer_loop():
+    handler = _build_handler()
+    batch_size = get_settings().ACCESS_LOG_BATCH_SIZE
+    try:
+        while True:
+            record = access_queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            while len(batch) < batch_size:
+                try:
+                    record = access_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    _write_batch(handler, batch)
+                    return
+                batch.append(record)
+            try:
+                _write_batch(handler, batch)
+            except Exception as e:
+                logger.error(f"Access log write failed: {str(e)}")
+    finally:
+        handler.close()
+
+def start_access_log_writer():
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    _writer_thread = threading.Thread(target=_writer_loop, name="access-log-writer", daemon=True)
+    _writer_thread.start()
+
+def _stop_writer(thread: threading.Thread):
+    try:
+        # Waits for room, so the stop marker lands behind every queued record,
+        # but gives up on a writer that has stopped draining
+        access_queue.put(_STOP, timeout=STOP_TIMEOUT_SECONDS)
+    except queue.Full:
+        logger.warning("Access log writer is not draining; queued records are lost")
+        return
+    thread.join(timeout=STOP_TIMEOUT_SECONDS)
+
+async def stop_access_log_writer():
+    global _writer_thread
+    if _writer_thread is None:
+        return
+    thread, _writer_thread = _writer_thread, None
+    # Draining can take a while, so the wait happens off the event loop
+    await asyncio.to_thread(_stop_writer, thread)
@@ -1,39 +1,68 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
+from ..database import get_read_db, async_session, read_only_session, is_replica_session
 from ..models.user import User as UserModel
-from sqlalchemy import select
+from sqlalchemy import select, update
+import logging
+import uuid
+from . import hashing
+from .keys import signing_key, verification_key
+from ..config import get_settings
+from .token_cache import get_cached_token, cache_token
+from .revocation import is_revoked
+from ..repositories.user import get_user_by_email, invalidate_user
 
-# Constants
-SECRET_KEY = "your-secret-key"  # Move to environment variables
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+settings = get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/v1/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return hashing.pwd_context.hash(password)
+
+async def rehash_user_password(user_id: int, email: str, plain_password: str, old_hash: str):
+    """
+    Re-hash a password with the current scheme and cost. Runs as a background
+    task after login, so the response never waits for it.
+    """
+    try:
+        new_hash = await hashing.hash_password_async(plain_password)
+        async with async_session() as session:
+            # Only replace the hash we verified, in case the password changed meanwhile
+            await session.execute(
+                update(UserModel)
+                .where(UserModel.id == user_id, UserModel.password_hash == old_hash)
+                .values(password_hash=new_hash)
+            )
+            await session.commit()
+        await invalidate_user(email)
+    except Exception as e:
+        logger.warning(f"Password re-hash failed for user {user_id}: {str(e)}")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    key = signing_key()
+    return jwt.encode(to_encode, key["key"], algorithm=settings.ALGORITHM, headers=key["headers"])
+
+def decode_token(token: str) -> dict:
+    key = verification_key(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, key, algorithms=[settings.ALGORITHM])
 
 async def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return decode_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,9 +70,30 @@ async def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> UserModel:
+def user_snapshot(user: UserModel) -> dict:
+    # Only what the handlers read; the password hash never enters the cache
+    return {"id": user.id, "email": user.email, "full_name": user.full_name}
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)) -> UserModel:
+    cached = get_cached_token(token)
+    if cached is not None:
+        claims, user = cached
+        if await is_revoked(claims.get("jti")):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return UserModel(**user)
+
     try:
-        payload = verify_token(token)
+        payload = await verify_token(token)
+        if await is_revoked(payload.get("jti")):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         user_email = payload.get("sub")
         if user_email is None:
             raise HTTPException(
@@ -52,8 +102,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        result = await db.execute(select(UserModel).where(UserModel.email == user_email))
-        user = result.scalars().first()
+        user = await get_user_by_email(db, user_email)
+        if user is None and is_replica_session(db):
+            # A replica within the lag budget can still miss a brand-new account
+            async with read_only_session() as primary:
+                user = await get_user_by_email(primary, user_email)
         
         if user is None:
             raise HTTPException(
@@ -62,10 +115,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        cache_token(token, payload, user_snapshot(user))
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        )
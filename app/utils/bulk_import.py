@@ -0,0 +1,260 @@
+import asyncio
+import csv
+import hmac
+import json
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from fastapi import Header, HTTPException, status
+from pydantic import ValidationError
+from ..config import get_settings
+from ..database import engine
+from ..models.user import User as UserModel, normalize_email
+from ..repositories.user import invalidate_users
+from ..schemas.auth import ImportFailure, UserImportRecord
+from . import hashing
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# (row number, email, normalized email, password hash, full name), the
+# column order of the staging table
+StagedRow = Tuple[int, str, str, str, str]
+
+async def verify_admin_client(x_admin_token: Optional[str] = Header(None)):
+    secret = get_settings().ADMIN_API_TOKEN
+    # Disabled until a token is configured
+    if not secret:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, secret):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin credentials"
+        )
+
+async def split_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Turn a byte stream, such as a request body, into lines without buffering all of it."""
+    max_line_bytes = get_settings().IMPORT_MAX_LINE_BYTES
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > max_line_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Import records must be shorter than {max_line_bytes} bytes"
+            )
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+async def parse_records(
+    lines: AsyncIterator[str],
+    fmt: str
+) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Yield (row number, fields, parse error) per record. CSV input needs a
+    header row; records are one per line in both formats. Row numbers count
+    records only, so they stay stable for resuming.
+    """
+    header: Optional[List[str]] = None
+    row_number = 0
+    async for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        row_number += 1
+        try:
+            if fmt == "csv":
+                fields = dict(zip(header, next(csv.reader([line]))))
+            else:
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise ValueError("expected a JSON object")
+        except (ValueError, csv.Error) as e:
+            yield row_number, None, f"Unparseable record: {str(e)}"
+            continue
+        yield row_number, fields, None
+
+def validate_record(fields: Dict) -> UserImportRecord:
+    # Empty CSV cells mean "not given"
+    record = UserImportRecord(**{k: v for k, v in fields.items() if v not in ("", None)})
+    if record.password_hash is not None and not hashing.pwd_context.identify(record.password_hash):
+        raise ValueError("password_hash is not a bcrypt or argon2 hash")
+    return record
+
+async def _hash_slice(passwords: List[str]) -> List[str]:
+    while True:
+        try:
+            return await hashing.hash_passwords_async(passwords)
+        except HTTPException as e:
+            # The pool is shared with logins; wait for room instead of failing rows
+            if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+                raise
+            await asyncio.sleep(1)
+
+async def _hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash a chunk's passwords in small pool jobs, keeping at most half the
+    workers busy with them. Logins and registrations are admitted between
+    the jobs instead of waiting for the whole chunk.
+    """
+    if not passwords:
+        return []
+    settings = get_settings()
+    size = settings.IMPORT_HASH_BATCH_SIZE
+    slots = asyncio.Semaphore(max(1, settings.PASSWORD_HASH_WORKERS // 2))
+
+    async def hash_slice(passwords_slice: List[str]) -> List[str]:
+        async with slots:
+            return await _hash_slice(passwords_slice)
+
+    slices = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    hashed = await asyncio.gather(*(hash_slice(s) for s in slices))
+    return [password_hash for batch in hashed for password_hash in batch]
+
+async def prepare_chunk(
+    records: List[Tuple[int, Optional[Dict], Optional[str]]]
+) -> Tuple[List[StagedRow], List[ImportFailure]]:
+    """Validate a chunk and hash its plain passwords."""
+    failures: List[ImportFailure] = []
+    valid: List[Tuple[int, UserImportRecord]] = []
+    for row_number, fields, error in records:
+        if error is not None:
+            failures.append(ImportFailure(row=row_number, error=error))
+            continue
+        try:
+            valid.append((row_number, validate_record(fields)))
+        except (ValidationError, ValueError) as e:
+            email = fields.get("email") if isinstance(fields.get("email"), str) else None
+            failures.append(ImportFailure(row=row_number, email=email, error=str(e)))
+
+    to_hash = [record.password for _, record in valid if record.password_hash is None]
+    hashed = iter(await _hash_passwords(to_hash))
+
+    rows = [
+        (
+            row_number,
+            record.email,
+            normalize_email(record.email),
+            record.password_hash or next(hashed),
+            record.full_name
+        )
+        for row_number, record in valid
+    ]
+    return rows, failures
+
+async def copy_chunk(rows: List[StagedRow]) -> List[StagedRow]:
+    """
+    Load a chunk with COPY into a temporary staging table and move it into
+    users in the same transaction. Returns the rows that were skipped because
+    the email already exists, in the table or earlier in the chunk.
+    """
+    if not rows:
+        return []
+    async with engine.connect() as conn:
+        raw_connection = await conn.get_raw_connection()
+        pg = raw_connection.driver_connection
+        async with pg.transaction():
+            await pg.execute(
+                "CREATE TEMPORARY TABLE users_import "
+                "(row_number integer, email text, email_normalized text, password_hash text, full_name text) "
+                "ON COMMIT DROP"
+            )
+            await pg.copy_records_to_table(
+                "users_import",
+                records=rows,
+                columns=["row_number", "email", "email_normalized", "password_hash", "full_name"]
+            )
+            inserted = await pg.fetch(
+                f"INSERT INTO {UserModel.__tablename__} (email, email_normalized, password_hash, full_name) "
+                "SELECT DISTINCT ON (email_normalized) email, email_normalized, password_hash, full_name "
+                "FROM users_import ORDER BY email_normalized, row_number "
+                "ON CONFLICT (email_normalized) DO NOTHING RETURNING email_normalized"
+            )
+
+    # DISTINCT ON keeps the first row per email, so later repeats are duplicates
+    inserted_emails = {record["email_normalized"] for record in inserted}
+    skipped = []
+    for row in rows:
+        if row[2] in inserted_emails:
+            inserted_emails.discard(row[2])
+        else:
+            skipped.append(row)
+    return skipped
+
+async def import_users(
+    lines: AsyncIterator[str],
+    fmt: str,
+    start_row: int = 0,
+    on_failure: Optional[Callable[[ImportFailure], None]] = None,
+    on_checkpoint: Optional[Callable[[int], None]] = None
+) -> Dict[str, int]:
+    """
+    Stream records into the users table chunk by chunk. Each chunk commits
+    on its own, then on_checkpoint gets the number of rows consumed so far,
+    which is the start_row that resumes the import after an interruption.
+    The next chunk is validated and hashed while the previous one is being
+    copied, so at most two chunks are held in memory.
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    chunk_size = get_settings().IMPORT_CHUNK_SIZE
+    totals = {"rows_processed": start_row, "imported": 0, "failed": 0}
+    pending: Optional[Tuple[asyncio.Task, List[StagedRow], List[ImportFailure], int]] = None
+
+    def report(failure: ImportFailure):
+        totals["failed"] += 1
+        if on_failure:
+            on_failure(failure)
+
+    async def finish(task: asyncio.Task, rows: List[StagedRow], failures: List[ImportFailure], last_row: int):
+        skipped = await task
+        # The chunk is committed; drop cached "no such user" entries for the new rows
+        skipped_rows = {row[0] for row in skipped}
+        await invalidate_users(row[2] for row in rows if row[0] not in skipped_rows)
+        for row in skipped:
+            failures.append(ImportFailure(row=row[0], email=row[1], error="Email already registered"))
+        for failure in sorted(failures, key=lambda f: f.row):
+            report(failure)
+        totals["imported"] += len(rows) - len(skipped)
+        totals["rows_processed"] = last_row
+        if on_checkpoint:
+            on_checkpoint(last_row)
+
+    async def flush(chunk):
+        nonlocal pending
+        rows, failures = await prepare_chunk(chunk)
+        if pending is not None:
+            await finish(*pending)
+        pending = (asyncio.create_task(copy_chunk(rows)), rows, failures, chunk[-1][0])
+
+    chunk: List[Tuple[int, Optional[Dict], Optional[str]]] = []
+    try:
+        async for record in parse_records(lines, fmt):
+            if record[0] <= start_row:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+        if pending is not None:
+            await finish(*pending)
+            pending = None
+    finally:
+        if pending is not None and not pending[0].done():
+            pending[0].cancel()
+
+    logger.info(
+        f"User import finished at row {totals['rows_processed']}: "
+        f"{totals['imported']} imported, {totals['failed']} failed"
+    )
+    return totals
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Type
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import get_settings
+from ..database import write_session
+from ..metrics import CALLBACK_REQUESTS
+from ..schemas.web_service import CallbackResponse, OAuthCallback, PaymentCallback
+from .webhook_auth import read_capped_body
+
+logger = logging.getLogger(__name__)
+
+CallbackHandler = Callable[[BaseModel, AsyncSession], Awaitable[CallbackResponse]]
+
+class CallbackRegistration:
+    """
+    A callback handler with its own payload schema, timeout and concurrency
+    limit. The limit also caps the database connections the integration can
+    hold, because a session is only opened inside a slot.
+    """
+
+    def __init__(self, handler: CallbackHandler, schema: Type[BaseModel], max_concurrency: int, timeout_seconds: float):
+        self.handler = handler
+        self.schema = schema
+        self.timeout_seconds = timeout_seconds
+        self.slots = asyncio.Semaphore(max_concurrency)
+
+CALLBACK_HANDLERS: Dict[str, CallbackRegistration] = {}
+
+def callback_handler(
+    integration_id: str,
+    schema: Type[BaseModel],
+    max_concurrency: int = 10,
+    timeout_seconds: float = 5.0
+) -> Callable[[CallbackHandler], CallbackHandler]:
+    def register(handler: CallbackHandler) -> CallbackHandler:
+        CALLBACK_HANDLERS[integration_id] = CallbackRegistration(handler, schema, max_concurrency, timeout_seconds)
+        return handler
+    return register
+
+async def dispatch_callback(integration_id: str, request: Request) -> CallbackResponse:
+    registration = CALLBACK_HANDLERS.get(integration_id)
+    # Unknown integrations never get their body read
+    if registration is None:
+        CALLBACK_REQUESTS.labels(integration="unknown", outcome="invalid").inc()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown integration")
+
+    # Read and validate before taking a slot, so a slow or oversized upload
+    # never holds one; slots only guard the handler and its session
+    body = await read_capped_body(request, get_settings().CALLBACK_MAX_BODY_BYTES)
+    if body is None:
+        CALLBACK_REQUESTS.labels(integration=integration_id, outcome="invalid").inc()
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Callback body too large"
+        )
+    try:
+        data = registration.schema.model_validate_json(body)
+    except ValidationError:
+        CALLBACK_REQUESTS.labels(integration=integration_id, outcome="invalid").inc()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid callback payload"
+        )
+
+    # Shed load instead of queueing behind a slow integration
+    if registration.slots.locked():
+        CALLBACK_REQUESTS.labels(integration=integration_id, outcome="busy").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Integration busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    async with registration.slots:
+        try:
+            async with write_session() as db:
+                response = await asyncio.wait_for(
+                    registration.handler(data, db),
+                    registration.timeout_seconds
+                )
+        except asyncio.TimeoutError:
+            CALLBACK_REQUESTS.labels(integration=integration_id, outcome="timeout").inc()
+            logger.warning(f"Callback for {integration_id} timed out after {registration.timeout_seconds}s")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Callback processing timed out"
+            )
+        except Exception:
+            CALLBACK_REQUESTS.labels(integration=integration_id, outcome="failed").inc()
+            raise
+
+    CALLBACK_REQUESTS.labels(integration=integration_id, outcome="processed").inc()
+    return response
+
+# Callback handlers
+
+@callback_handler("payment", schema=PaymentCallback, max_concurrency=10, timeout_seconds=5.0)
+async def process_payment_callback(data: PaymentCallback, db: AsyncSession) -> CallbackResponse:
+    # Implement payment callback processing
+    return CallbackResponse(
+        success=True,
+        message="Payment processed successfully"
+    )
+
+@callback_handler("oauth", schema=OAuthCallback, max_concurrency=20, timeout_seconds=5.0)
+async def process_oauth_callback(data: OAuthCallback, db: AsyncSession) -> CallbackResponse:
+    # Implement OAuth callback processing
+    return CallbackResponse(
+        success=True,
+        message="OAuth callback processed successfully"
+    )
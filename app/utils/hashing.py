@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from ..config import get_settings
+from ..metrics import (
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_QUEUE_WAIT_SECONDS,
+    PASSWORD_HASH_SECONDS,
+    PASSWORD_HASH_REJECTED
+)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SCHEMES = ("argon2", "bcrypt")
+
+hash_executor: Optional[ProcessPoolExecutor] = None
+max_pending_jobs: int = 0
+pending_jobs: int = 0
+
+def get_hash_params() -> Dict[str, Any]:
+    settings = get_settings()
+    return {
+        "scheme": settings.PASSWORD_HASH_SCHEME,
+        "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+        "argon2_time_cost": settings.ARGON2_TIME_COST,
+        "argon2_memory_cost": settings.ARGON2_MEMORY_COST,
+        "argon2_parallelism": settings.ARGON2_PARALLELISM,
+    }
+
+def build_context(params: Dict[str, Any]) -> CryptContext:
+    scheme = params["scheme"]
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+
+    # The configured scheme signs new hashes; the other one still verifies
+    # existing hashes and flags them for re-hashing through needs_update()
+    schemes = [scheme] + [s for s in SUPPORTED_SCHEMES if s != scheme]
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__rounds=params["bcrypt_rounds"],
+        argon2__type="ID",
+        argon2__rounds=params["argon2_time_cost"],
+        argon2__memory_cost=params["argon2_memory_cost"],
+        argon2__parallelism=params["argon2_parallelism"],
+    )
+
+hash_params: Dict[str, Any] = get_hash_params()
+pwd_context = build_context(hash_params)
+
+def configure_hashing(params: Dict[str, Any]):
+    global hash_params, pwd_context
+    pwd_context = build_context(params)
+    hash_params = params
+
+def _time_hash(params: Dict[str, Any]) -> float:
+    context = build_context(params)
+    start_time = time.perf_counter()
+    context.hash("calibration-password")
+    return (time.perf_counter() - start_time) * 1000
+
+def calibrate_hash_params(target_ms: int, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Raise the cost of the configured scheme until a single hash takes at
+    least target_ms on this machine. Memory cost is kept as configured for
+    argon2 and only the time cost is increased.
+    """
+    params = dict(params or get_hash_params())
+    cost_key = "bcrypt_rounds" if params["scheme"] == "bcrypt" else "argon2_time_cost"
+    max_cost = 16 if params["scheme"] == "bcrypt" else 32
+    params[cost_key] = 10 if params["scheme"] == "bcrypt" else 1
+
+    elapsed_ms = _time_hash(params)
+    while elapsed_ms < target_ms and params[cost_key] < max_cost:
+        params[cost_key] += 1
+        elapsed_ms = _time_hash(params)
+
+    logger.info(
+        f"Calibrated {params['scheme']} with {cost_key}={params[cost_key]} "
+        f"({elapsed_ms:.0f}ms per hash, target {target_ms}ms)"
+    )
+    return params
+
+def _calibration_key(params: Dict[str, Any], target_ms: int) -> str:
+    # A config change that affects the result starts a new calibration
+    return f"password_hash:calibration:{params['scheme']}:{params['argon2_memory_cost']}:{target_ms}"
+
+async def calibrate_hashing(redis: Redis):
+    """
+    Calibrate once for the whole deployment. Workers that calibrated on
+    their own could settle on different costs, and each would then flag the
+    others' hashes through needs_update() and rehash them back and forth.
+    The first result stored in Redis wins and every worker adopts it; delete
+    the key to recalibrate.
+    """
+    settings = get_settings()
+    if not settings.PASSWORD_HASH_CALIBRATE:
+        return
+    target_ms = settings.PASSWORD_HASH_TARGET_MS
+    key = _calibration_key(get_hash_params(), target_ms)
+    try:
+        stored = await redis.get(key)
+        if stored is None:
+            params = await asyncio.to_thread(calibrate_hash_params, target_ms)
+            # Workers calibrating at the same time all adopt the first result
+            if not await redis.set(key, json.dumps(params), nx=True):
+                stored = await redis.get(key)
+        params = json.loads(stored) if stored is not None else params
+    except RedisError as e:
+        logger.warning(f"Shared hash calibration unavailable, calibrating locally: {str(e)}")
+        params = await asyncio.to_thread(calibrate_hash_params, target_ms)
+    configure_hashing(params)
+
+def needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+# Executed inside the worker processes, so they must stay module-level and picklable
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Social-login accounts store a marker that no scheme recognises
+    if not pwd_context.identify(hashed_password):
+        return False
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _timed_call(func: Callable[..., Any], *args: Any) -> Tuple[float, Any]:
+    # Wall-clock start time, so the parent can tell how long the job was queued
+    return time.time(), func(*args)
+
+def init_hashing_pool() -> ProcessPoolExecutor:
+    global hash_executor, max_pending_jobs
+    if hash_executor is not None:
+        return hash_executor
+
+    settings = get_settings()
+    workers = settings.PASSWORD_HASH_WORKERS
+    hash_executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=configure_hashing,
+        initargs=(hash_params,)
+    )
+    # Jobs running on every worker plus a bounded backlog waiting for one
+    max_pending_jobs = workers + settings.PASSWORD_HASH_QUEUE_SIZE
+    logger.info(
+        f"Password hashing pool started with {workers} workers "
+        f"and {settings.PASSWORD_HASH_QUEUE_SIZE} queue slots"
+    )
+    return hash_executor
+
+def close_hashing_pool():
+    global hash_executor
+    if hash_executor:
+        hash_executor.shutdown(wait=True, cancel_futures=True)
+        hash_executor = None
+        logger.info("Password hashing pool closed")
+
+def _release_slot():
+    global pending_jobs
+    pending_jobs -= 1
+    PASSWORD_HASH_QUEUE_DEPTH.dec()
+
+async def _run_in_pool(operation: str, func: Callable[..., Any], *args: Any) -> Any:
+    global pending_jobs
+    executor = init_hashing_pool()
+
+    if pending_jobs >= max_pending_jobs:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    pending_jobs += 1
+    PASSWORD_HASH_QUEUE_DEPTH.inc()
+    start_time = time.perf_counter()
+    submitted_at = time.time()
+    loop = asyncio.get_running_loop()
+    job = executor.submit(_timed_call, func, *args)
+    # A caller that stops waiting doesn't stop a job already running in the
+    # pool, so the slot is only given back once the pool is done with it.
+    # Registered before wrap_future's own callback, so it runs first and the
+    # slot is free by the time the await below returns.
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(_release_slot))
+    try:
+        started_at, result = await asyncio.wrap_future(job, loop=loop)
+        PASSWORD_HASH_QUEUE_WAIT_SECONDS.observe(max(started_at - submitted_at, 0))
+        return result
+    finally:
+        PASSWORD_HASH_SECONDS.labels(operation=operation).observe(
+            time.perf_counter() - start_time
+        )
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool("hash", _hash_password, password)
+
+async def hash_passwords_async(passwords: List[str]) -> List[str]:
+    """Hash a batch as a single pool job, for bulk callers such as imports."""
+    return await _run_in_pool("hash_batch", _hash_passwords, passwords)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool("verify", _verify_password, plain_password, hashed_password)
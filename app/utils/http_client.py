@@ -0,0 +1,38 @@
+import httpx
+from typing import Optional
+import logging
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+http_client: Optional[httpx.AsyncClient] = None
+
+async def init_http_client() -> httpx.AsyncClient:
+    """One pooled client per worker, so outbound calls reuse TLS connections."""
+    global http_client
+    if http_client is not None:
+        return http_client
+
+    settings = get_settings()
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT_SECONDS, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE
+        )
+    )
+    logger.info("HTTP client initialized")
+    return http_client
+
+async def get_http_client() -> httpx.AsyncClient:
+    if http_client is None:
+        raise RuntimeError("HTTP client is not initialized")
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client:
+        await http_client.aclose()
+        http_client = None
+        logger.info("HTTP client closed")
@@ -0,0 +1,64 @@
+import hmac
+from typing import Dict, List, Optional
+from fastapi import Header, HTTPException, status
+from jose import JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import get_settings
+from ..models.user import User as UserModel, normalize_email
+from ..schemas.auth import TokenIntrospection
+from .auth import decode_token
+from .revocation import revoked_jtis
+
+async def verify_internal_client(x_internal_token: Optional[str] = Header(None)):
+    secret = get_settings().INTROSPECTION_CLIENT_SECRET
+    # Disabled until a secret is configured
+    if not secret:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, secret):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal client credentials"
+        )
+
+async def introspect_tokens(db: AsyncSession, tokens: List[str]) -> List[TokenIntrospection]:
+    """
+    RFC 7662-style introspection for a batch of tokens: one decoding pass, one
+    deny-list MGET (only for Bloom filter hits) and one users query.
+    """
+    claims_list: List[Optional[Dict]] = []
+    for token in tokens:
+        try:
+            claims_list.append(decode_token(token))
+        except JWTError:
+            claims_list.append(None)
+
+    valid_claims = [claims for claims in claims_list if claims]
+    revoked = await revoked_jtis(claims.get("jti") for claims in valid_claims)
+
+    emails = {normalize_email(claims["sub"]) for claims in valid_claims if claims.get("sub")}
+    user_ids: Dict[str, int] = {}
+    if emails:
+        # Index-only: ix_users_email_normalized includes the id
+        result = await db.execute(
+            select(UserModel.id, UserModel.email_normalized).where(UserModel.email_normalized.in_(emails))
+        )
+        user_ids = {email: user_id for user_id, email in result.all()}
+
+    results = []
+    for claims in claims_list:
+        user_id = user_ids.get(normalize_email(claims["sub"])) if claims and claims.get("sub") else None
+        if user_id is None or claims.get("jti") in revoked:
+            results.append(TokenIntrospection(active=False))
+            continue
+        results.append(TokenIntrospection(
+            active=True,
+            sub=claims["sub"],
+            username=claims["sub"],
+            user_id=user_id,
+            exp=claims.get("exp"),
+            iat=claims.get("iat"),
+            jti=claims.get("jti"),
+            token_type="Bearer"
+        ))
+    return results
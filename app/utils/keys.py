@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+from jose import jwk
+from jose.backends.base import Key
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+
+# kid -> {"signing": Key, "verifying": Key}
+_keys: Dict[str, Dict[str, Key]] = {}
+_active_kid: Optional[str] = None
+_jwks_body: bytes = b'{"keys":[]}'
+_jwks_etag: str = f'"{hashlib.sha256(_jwks_body).hexdigest()[:16]}"'
+
+def is_asymmetric() -> bool:
+    return get_settings().ALGORITHM in ASYMMETRIC_ALGORITHMS
+
+def load_signing_keys():
+    """
+    Read every <kid>.pem private key from JWT_KEYS_DIR once. Tokens are signed
+    with JWT_ACTIVE_KID; the other keys only verify, so a rotated-out key keeps
+    accepting its tokens until they expire.
+    """
+    global _active_kid, _jwks_body, _jwks_etag
+    settings = get_settings()
+    if not is_asymmetric():
+        if not settings.SECRET_KEY:
+            raise ValueError(f"SECRET_KEY must be set for {settings.ALGORITHM}")
+        return
+    if _keys:
+        return
+
+    if not settings.JWT_KEYS_DIR or not os.path.isdir(settings.JWT_KEYS_DIR):
+        raise ValueError(f"JWT_KEYS_DIR must point to a directory of PEM keys for {settings.ALGORITHM}")
+
+    public_jwks = []
+    for filename in sorted(os.listdir(settings.JWT_KEYS_DIR)):
+        if not filename.endswith(".pem"):
+            continue
+        kid = filename[:-len(".pem")]
+        with open(os.path.join(settings.JWT_KEYS_DIR, filename)) as key_file:
+            private_key = jwk.construct(key_file.read(), settings.ALGORITHM)
+        public_key = private_key.public_key()
+        _keys[kid] = {"signing": private_key, "verifying": public_key}
+        public_jwks.append(dict(public_key.to_dict(), kid=kid, use="sig", alg=settings.ALGORITHM))
+
+    _active_kid = settings.JWT_ACTIVE_KID or (sorted(_keys)[-1] if _keys else None)
+    if _active_kid not in _keys:
+        raise ValueError(f"Active signing key {_active_kid!r} not found in {settings.JWT_KEYS_DIR}")
+
+    # Serialised once; the JWKS endpoint only ever returns these bytes
+    _jwks_body = json.dumps({"keys": public_jwks}, separators=(",", ":")).encode()
+    _jwks_etag = f'"{hashlib.sha256(_jwks_body).hexdigest()[:16]}"'
+    logger.info(f"Loaded {len(_keys)} JWT signing keys, active kid {_active_kid}")
+
+def signing_key() -> Dict[str, Any]:
+    """Key and headers for jwt.encode()."""
+    settings = get_settings()
+    if not is_asymmetric():
+        return {"key": settings.SECRET_KEY, "headers": None}
+    load_signing_keys()
+    return {"key": _keys[_active_kid]["signing"], "headers": {"kid": _active_kid}}
+
+def verification_key(kid: Optional[str]) -> Optional[Any]:
+    settings = get_settings()
+    if not is_asymmetric():
+        return settings.SECRET_KEY
+    load_signing_keys()
+    entry = _keys.get(kid) if kid else None
+    return entry["verifying"] if entry else None
+
+def jwks_document() -> Dict[str, Any]:
+    return {"body": _jwks_body, "etag": _jwks_etag}
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import math
+import smtplib
+import ssl
+import time
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple, Union
+import httpx
+from ..config import get_settings
+from ..database import write_session
+from ..metrics import NOTIFICATION_BATCHES, NOTIFICATIONS
+from ..models.notification import Notification
+from ..models.user import User as UserModel, normalize_email
+from ..repositories.notification import claim_due, record_results
+from ..schemas.web_service import NotificationPayload
+from .http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CHANNELS = ("email", "sms")
+
+_dispatcher_task: Optional[asyncio.Task] = None
+_wake: Optional[asyncio.Event] = None
+_senders: Dict[str, Union["SMTPSender", "SMSSender"]] = {}
+
+class TokenBucket:
+    """Refills at rate per second up to capacity; take() never waits."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self) -> int:
+        self._refill()
+        return int(self.tokens)
+
+    def take(self, count: int):
+        self._refill()
+        self.tokens -= count
+
+    def seconds_until_available(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+def recipient_allowed(user: UserModel, payload: NotificationPayload) -> bool:
+    """
+    Keep /notify from relaying to arbitrary people: a user's own email
+    address, or a recipient allow-listed for the template.
+    """
+    if payload.notification_type == "email" and normalize_email(payload.recipient) == normalize_email(user.email):
+        return True
+    allowed = get_settings().NOTIFICATION_ALLOWED_RECIPIENTS.get(payload.template_id or "", [])
+    return payload.recipient in allowed
+
+def render(notification: Notification) -> Tuple[str, str]:
+    """Subject and body of a notification, from its data or its template id."""
+    data = notification.data or {}
+    subject = str(data.get("subject") or notification.template_id or "Notification")
+    body = str(data.get("body") or data.get("message") or subject)
+    return subject, body
+
+class SMTPSender:
+    """
+    Sends email over one SMTP connection that is kept open between batches.
+    smtplib blocks, so each batch runs in a thread; the dispatcher sends one
+    batch at a time, so the connection is never shared.
+    """
+
+    def __init__(self):
+        self._connection: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._connection is None:
+            settings = get_settings()
+            connection = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
+            try:
+                if settings.SMTP_STARTTLS:
+                    connection.starttls(context=ssl.create_default_context())
+                if settings.SMTP_USERNAME:
+                    connection.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+            except Exception:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+
+    def _send_one(self, message: EmailMessage) -> Optional[str]:
+        error = None
+        # A second try on a fresh connection covers servers that closed an idle one
+        for _ in range(2):
+            try:
+                self._connect().send_message(message)
+                return None
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # The server answered, so the connection is still usable
+                return str(e)
+            except OSError as e:
+                self.close()
+                error = str(e) or type(e).__name__
+        return error
+
+    def _send_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        sender = get_settings().EMAIL_FROM
+        try:
+            self._connect()
+        except OSError as e:
+            # Unreachable server or bad credentials fail the whole batch at once
+            return [str(e) or type(e).__name__] * len(notifications)
+        errors = []
+        for notification in notifications:
+            subject, body = render(notification)
+            message = EmailMessage()
+            message["From"] = sender
+            message["To"] = notification.recipient
+            message["Subject"] = subject
+            message.set_content(body)
+            errors.append(self._send_one(message))
+        return errors
+
+    async def send(self, notifications: List[Notification]) -> List[Optional[str]]:
+        return await asyncio.to_thread(self._send_batch, notifications)
+
+    def max_send_seconds(self, count: int) -> float:
+        # Connecting, then every message on up to two connections timing out
+        timeout = get_settings().SMTP_TIMEOUT_SECONDS
+        return timeout + count * 2 * timeout
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except Exception:
+                self._connection.close()
+            self._connection = None
+
+class SMSSender:
+    """
+    Sends a batch as one POST of {"messages": [...]} over the shared HTTP
+    client. The provider may answer {"results": [{"error": ...}, ...]} in
+    message order; without it a 2xx means every message was accepted.
+    """
+
+    async def send(self, notifications: List[Notification]) -> List[Optional[str]]:
+        settings = get_settings()
+        messages = [
+            {"to": notification.recipient, "from": settings.SMS_FROM, "body": render(notification)[1]}
+            for notification in notifications
+        ]
+        try:
+            client = await get_http_client()
+            response = await client.post(
+                settings.SMS_API_URL,
+                json={"messages": messages},
+                headers={"Authorization": f"Bearer {settings.SMS_API_KEY}"}
+            )
+            response.raise_for_status()
+        except (httpx.HTTPError, RuntimeError) as e:
+            return [str(e) or type(e).__name__] * len(notifications)
+
+        try:
+            results = response.json().get("results")
+        except ValueError:
+            results = None
+        if not isinstance(results, list) or len(results) != len(notifications):
+            return [None] * len(notifications)
+        return [result.get("error") if isinstance(result, dict) else None for result in results]
+
+    def max_send_seconds(self, count: int) -> float:
+        # One request however large the batch
+        settings = get_settings()
+        return settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS + settings.HTTP_CLIENT_TIMEOUT_SECONDS
+
+    def close(self):
+        pass
+
+async def dispatch_batch(channel: str, bucket: TokenBucket) -> bool:
+    """
+    Claim, send and record one batch for a channel, as large as the batch
+    size and the channel's rate limit allow. True when the batch was full,
+    so more notifications may be due.
+    """
+    settings = get_settings()
+    limit = min(settings.NOTIFICATION_BATCH_SIZE, bucket.available())
+    if limit <= 0:
+        return False
+
+    # The lease has to outlast the slowest possible send, or another worker
+    # would claim the batch again while it is still going out
+    sender = _senders[channel]
+    lease_seconds = max(settings.NOTIFICATION_LEASE_SECONDS, math.ceil(2 * sender.max_send_seconds(limit)))
+
+    # Claimed and committed first, so no connection is held during the send
+    async with write_session() as db:
+        notifications = await claim_due(db, channel, limit, lease_seconds)
+    if not notifications:
+        return False
+
+    bucket.take(len(notifications))
+    NOTIFICATION_BATCHES.labels(channel=channel).inc()
+    errors = await sender.send(notifications)
+
+    async with write_session() as db:
+        outcomes = await record_results(
+            db,
+            notifications,
+            errors,
+            settings.NOTIFICATION_MAX_ATTEMPTS,
+            settings.NOTIFICATION_RETRY_BASE_SECONDS
+        )
+    for outcome, count in outcomes.items():
+        if count:
+            NOTIFICATIONS.labels(channel=channel, outcome=outcome).inc(count)
+    if outcomes["failed"]:
+        logger.error(f"{outcomes['failed']} {channel} notifications failed after {settings.NOTIFICATION_MAX_ATTEMPTS} attempts")
+    return len(notifications) == limit
+
+def _rate_limits() -> Dict[str, TokenBucket]:
+    settings = get_settings()
+    workers = max(1, settings.WEB_CONCURRENCY)
+    rates = {
+        "email": settings.NOTIFICATION_EMAIL_RATE_PER_SECOND / workers,
+        "sms": settings.NOTIFICATION_SMS_RATE_PER_SECOND / workers,
+    }
+    # Up to one second's worth in a single batch
+    return {channel: TokenBucket(rate, max(1.0, rate)) for channel, rate in rates.items()}
+
+async def _dispatch_loop():
+    settings = get_settings()
+    buckets = _rate_limits()
+    while True:
+        delay = settings.NOTIFICATION_POLL_SECONDS
+        try:
+            for channel in _senders:
+                bucket = buckets[channel]
+                if await dispatch_batch(channel, bucket):
+                    # There may be more; come back once the provider allows it
+                    delay = min(delay, bucket.seconds_until_available())
+        except Exception as e:
+            logger.warning(f"Notification dispatcher error: {str(e)}")
+
+        if delay > 0:
+            try:
+                await asyncio.wait_for(_wake.wait(), delay)
+                await asyncio.sleep(settings.NOTIFICATION_LINGER_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+        _wake.clear()
+        await asyncio.sleep(0)
+
+def wake_dispatcher():
+    """Have this worker's dispatcher look at the outbox now instead of at its next poll."""
+    if _wake is not None:
+        _wake.set()
+
+def start_notification_dispatcher():
+    global _dispatcher_task, _wake
+    if _dispatcher_task is not None:
+        return
+    settings = get_settings()
+    if settings.SMTP_HOST:
+        _senders["email"] = SMTPSender()
+    if settings.SMS_API_URL:
+        _senders["sms"] = SMSSender()
+    if not _senders:
+        logger.warning("No notification providers configured; notifications stay in the outbox")
+        return
+    _wake = asyncio.Event()
+    _dispatcher_task = asyncio.create_task(_dispatch_loop())
+
+async def stop_notification_dispatcher():
+    global _dispatcher_task, _wake
+    if _dispatcher_task is not None:
+        _dispatcher_task.cancel()
+        try:
+            await _dispatcher_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _dispatcher_task = None
+    for sender in _senders.values():
+        # The SMTP goodbye blocks, so it runs off the event loop
+        await asyncio.to_thread(sender.close)
+    _senders.clear()
+    _wake = None
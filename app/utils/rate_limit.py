@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from ..cache import get_redis
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Every script reads the clock from Redis itself, so all workers agree on time,
+# and returns {allowed, remaining, reset_ms, retry_after_ms}
+
+SLIDING_WINDOW_LOG = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, window, 0}
+end
+
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+local retry = tonumber(oldest[2]) + window - now
+return {0, 0, retry, retry}
+"""
+
+SLIDING_WINDOW_COUNTER = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+local current = math.floor(now / window)
+local elapsed = now % window
+local previous_count = tonumber(redis.call('HGET', key, current - 1) or '0')
+local current_count = tonumber(redis.call('HGET', key, current) or '0')
+local weighted = previous_count * (window - elapsed) / window + current_count
+
+if weighted + 1 > limit then
+    return {0, 0, window - elapsed, window - elapsed}
+end
+
+redis.call('HINCRBY', key, current, 1)
+redis.call('HDEL', key, current - 2)
+redis.call('PEXPIRE', key, window * 2)
+return {1, math.floor(limit - weighted - 1), window - elapsed, 0}
+"""
+
+TOKEN_BUCKET = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local rate = capacity / window
+
+local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+return {allowed, math.floor(tokens), math.ceil((capacity - tokens) / rate), retry}
+"""
+
+SCRIPTS = {
+    "sliding_window_log": SLIDING_WINDOW_LOG,
+    "sliding_window_counter": SLIDING_WINDOW_COUNTER,
+    "token_bucket": TOKEN_BUCKET,
+}
+
+class RateLimitPolicy(BaseModel):
+    name: str
+    algorithm: str = "sliding_window_counter"
+    limit: int
+    window_seconds: int = 60
+    # What to do when Redis cannot be reached: let requests through or reject them
+    fail_open: bool = True
+
+    def can_approximate(self) -> bool:
+        """
+        Whether approximate mode may decide this policy locally. The local
+        counter is a sliding window counter that keeps admitting while Redis
+        is down, so policies declaring another algorithm or fail_open=False
+        are always enforced exactly.
+        """
+        return self.algorithm == "sliding_window_counter" and self.fail_open
+
+class RateLimitResult(BaseModel):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after_seconds: int
+
+def default_policy() -> RateLimitPolicy:
+    settings = get_settings()
+    return RateLimitPolicy(
+        name="default",
+        algorithm=settings.RATE_LIMIT_ALGORITHM,
+        limit=settings.RATE_LIMIT_PER_MINUTE,
+        window_seconds=60
+    )
+
+# Matched against the end of the request path, so router prefixes don't matter
+ROUTE_POLICIES: Dict[str, RateLimitPolicy] = {
+    "/auth/v1/login": RateLimitPolicy(name="login", algorithm="token_bucket", limit=10),
+    "/auth/v1/register": RateLimitPolicy(name="register", algorithm="sliding_window_log", limit=5),
+    "/auth/v1/password-reset/request": RateLimitPolicy(
+        name="password_reset", algorithm="sliding_window_log", limit=3, window_seconds=300,
+        fail_open=False
+    ),
+    # Every accepted request ends up as an email or SMS to a real person
+    "/web-service/v1/notify": RateLimitPolicy(
+        name="notify", algorithm="sliding_window_log", limit=10, window_seconds=300,
+        fail_open=False
+    ),
+}
+
+EXEMPT_PATHS = {"/health", "/metrics"}
+
+@lru_cache(maxsize=1024)
+def policy_for_path(path: str) -> RateLimitPolicy:
+    for suffix, policy in ROUTE_POLICIES.items():
+        if path.endswith(suffix):
+            return policy
+    return default_policy()
+
+_registered_scripts: Dict[str, object] = {}
+
+def _get_script(redis: Redis, algorithm: str):
+    # register_script() keeps the SHA and retries with EVAL after a NOSCRIPT error
+    script = _registered_scripts.get(algorithm)
+    if script is None:
+        if algorithm not in SCRIPTS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        script = redis.register_script(SCRIPTS[algorithm])
+        _registered_scripts[algorithm] = script
+    return script
+
+def _ms_to_seconds(value: int) -> int:
+    return -(-int(value) // 1000)
+
+async def hit(redis: Redis, policy: RateLimitPolicy, identity: str) -> RateLimitResult:
+    """Record one request for identity and decide in a single atomic round trip."""
+    script = _get_script(redis, policy.algorithm)
+    key = f"rate_limit:{policy.name}:{identity}"
+    args = [policy.window_seconds * 1000, policy.limit]
+    if policy.algorithm == "sliding_window_log":
+        args.append(uuid.uuid4().hex)
+
+    allowed, remaining, reset_ms, retry_ms = await script(keys=[key], args=args, client=redis)
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=policy.limit,
+        remaining=max(int(remaining), 0),
+        reset_seconds=_ms_to_seconds(reset_ms),
+        retry_after_seconds=_ms_to_seconds(retry_ms)
+    )
+
+# Approximate mode: each worker decides locally from the last synced global count
+# plus its own unsynced hits, and pushes its deltas to Redis in batches.
+# A worker can over-admit by at most RATE_LIMIT_ERROR_BUDGET * limit per sync.
+# Only policies whose can_approximate() is true are decided this way.
+
+# counter key -> {"window", "window_ms", "count", "previous"}
+_local_counters: Dict[str, Dict[str, Any]] = {}
+# (counter key, window, window_ms) -> hits not yet pushed to Redis
+_pending: Dict[Tuple[str, int, int], int] = {}
+_flush_event: Optional[asyncio.Event] = None
+_sync_task: Optional[asyncio.Task] = None
+
+def hit_local(policy: RateLimitPolicy, identity: str) -> RateLimitResult:
+    """Same contract as hit(), decided without any network call."""
+    window_ms = policy.window_seconds * 1000
+    now_ms = time.time() * 1000
+    window = int(now_ms // window_ms)
+    elapsed = now_ms % window_ms
+    key = f"rate_limit:approx:{policy.name}:{identity}"
+
+    state = _local_counters.get(key)
+    if state is None or state["window"] != window:
+        previous = state["count"] if state and state["window"] == window - 1 else 0
+        state = {"window": window, "window_ms": window_ms, "count": 0, "previous": previous}
+        _local_counters[key] = state
+
+    weighted = state["previous"] * (window_ms - elapsed) / window_ms + state["count"]
+    reset_seconds = _ms_to_seconds(window_ms - elapsed)
+    if weighted + 1 > policy.limit:
+        return RateLimitResult(
+            allowed=False,
+            limit=policy.limit,
+            remaining=0,
+            reset_seconds=reset_seconds,
+            retry_after_seconds=reset_seconds
+        )
+
+    state["count"] += 1
+    pending_key = (key, window, window_ms)
+    _pending[pending_key] = _pending.get(pending_key, 0) + 1
+    budget = max(1, int(policy.limit * get_settings().RATE_LIMIT_ERROR_BUDGET))
+    if _pending[pending_key] >= budget and _flush_event is not None:
+        _flush_event.set()
+
+    return RateLimitResult(
+        allowed=True,
+        limit=policy.limit,
+        remaining=max(int(policy.limit - weighted - 1), 0),
+        reset_seconds=reset_seconds,
+        retry_after_seconds=0
+    )
+
+async def flush_local_counters():
+    global _pending
+    if not _pending:
+        return
+    batch, _pending = _pending, {}
+
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for (key, window, window_ms), delta in batch.items():
+                pipe.incrby(f"{key}:{window}", delta)
+                pipe.pexpire(f"{key}:{window}", window_ms * 2)
+            results = await pipe.execute()
+    except Exception as e:
+        # Keep enforcing locally; retry the deltas that still matter next time
+        logger.warning(f"Rate limit sync failed: {str(e)}")
+        for pending_key, delta in batch.items():
+            state = _local_counters.get(pending_key[0])
+            if state and state["window"] == pending_key[1]:
+                _pending[pending_key] = _pending.get(pending_key, 0) + delta
+        return
+
+    for index, (key, window, window_ms) in enumerate(batch):
+        state = _local_counters.get(key)
+        if state and state["window"] == window:
+            # Global total, plus whatever this worker admitted since the batch was taken
+            state["count"] = results[index * 2] + _pending.get((key, window, window_ms), 0)
+
+    now_ms = time.time() * 1000
+    for key in [k for k, v in _local_counters.items() if now_ms // v["window_ms"] > v["window"] + 1]:
+        del _local_counters[key]
+
+async def _sync_loop():
+    interval = get_settings().RATE_LIMIT_SYNC_INTERVAL_MS / 1000
+    while True:
+        try:
+            await asyncio.wait_for(_flush_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _flush_event.clear()
+        await flush_local_counters()
+
+def start_rate_limit_sync():
+    global _flush_event, _sync_task
+    if get_settings().RATE_LIMIT_MODE != "approximate" or _sync_task is not None:
+        return
+    _flush_event = asyncio.Event()
+    _sync_task = asyncio.create_task(_sync_loop())
+
+async def stop_rate_limit_sync():
+    global _sync_task
+    if _sync_task is None:
+        return
+    _sync_task.cancel()
+    try:
+        await _sync_task
+    except asyncio.CancelledError:
+        pass
+    _sync_task = None
+    await flush_local_counters()
+
+def rate_limit_headers(policy: RateLimitPolicy, result: Optional[RateLimitResult]) -> Dict[str, str]:
+    if result is None:
+        return {}
+    headers = {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(result.reset_seconds),
+        "RateLimit-Policy": f"{policy.limit};w={policy.window_seconds}",
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(result.retry_after_seconds, 1))
+    return headers
@@ -0,0 +1,91 @@
+import hashlib
+import secrets
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from ..config import get_settings
+
+# A refresh token is "<family id>.<secret>". Redis keeps one small hash per
+# family holding the digest of the only secret currently allowed and the
+# subject, so rotating never needs more than the family key.
+
+ROTATE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current then
+    return {0, false}
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {-1, false}
+end
+redis.call('HSET', KEYS[1], 'current', ARGV[2])
+return {1, redis.call('HGET', KEYS[1], 'sub')}
+"""
+
+_rotate_script = None
+
+def _family_key(family_id: str) -> str:
+    return f"refresh_family:{family_id}"
+
+def _digest(secret: str) -> str:
+    # 128 bits is plenty for a lookup that also needs the family id
+    return hashlib.sha256(secret.encode()).hexdigest()[:32]
+
+def _split(refresh_token: str) -> Optional[Tuple[str, str]]:
+    family_id, _, secret = refresh_token.partition(".")
+    if not family_id or not secret:
+        return None
+    return family_id, secret
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def issue_refresh_token(redis: Redis, subject: str) -> str:
+    """Start a new token family, e.g. at login."""
+    family_id = secrets.token_urlsafe(12)
+    secret = secrets.token_urlsafe(32)
+    key = _family_key(family_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"current": _digest(secret), "sub": subject})
+        pipe.expire(key, get_settings().REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+        await pipe.execute()
+    return f"{family_id}.{secret}"
+
+async def rotate_refresh_token(redis: Redis, refresh_token: str) -> Tuple[str, str]:
+    """
+    Swap a refresh token for the next one in its family in a single atomic
+    call. Presenting a token that was already rotated away revokes the whole
+    family, since either the client or an attacker holds a stolen copy.
+    Returns the token subject and the new refresh token.
+    """
+    global _rotate_script
+    parts = _split(refresh_token)
+    if parts is None:
+        raise _invalid_refresh_token()
+    family_id, secret = parts
+
+    if _rotate_script is None:
+        _rotate_script = redis.register_script(ROTATE_SCRIPT)
+
+    new_secret = secrets.token_urlsafe(32)
+    outcome, subject = await _rotate_script(
+        keys=[_family_key(family_id)],
+        args=[_digest(secret), _digest(new_secret)],
+        client=redis
+    )
+    if outcome != 1:
+        raise _invalid_refresh_token()
+    return subject, f"{family_id}.{new_secret}"
+
+async def revoke_refresh_token(redis: Redis, refresh_token: str, subject: str):
+    """End the token's whole family, e.g. at logout. Families of other subjects are left alone."""
+    parts = _split(refresh_token)
+    if parts is None:
+        return
+    key = _family_key(parts[0])
+    if await redis.hget(key, "sub") == subject:
+        await redis.delete(key)
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Iterable, Optional, Set
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from ..cache import get_redis
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = "token_revocations"
+KEY_PREFIX = "revoked_jti:"
+MAX_RECONNECT_DELAY = 30.0
+
+# Per-worker Bloom filter over revoked jtis. A miss proves the token was not
+# revoked, so the common path never talks to Redis; a hit is confirmed against
+# the deny-list because Bloom filters have false positives.
+_bits: bytearray = bytearray(max(get_settings().REVOCATION_BLOOM_BITS // 8, 1))
+_listener_task: Optional[asyncio.Task] = None
+
+def _positions(jti: str, size_bits: int):
+    settings = get_settings()
+    digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+    # Kirsch-Mitzenmacher: k positions from two independent 64-bit hashes
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % size_bits for i in range(settings.REVOCATION_BLOOM_HASHES)]
+
+def _add(bits: bytearray, jti: str):
+    for position in _positions(jti, len(bits) * 8):
+        bits[position >> 3] |= 1 << (position & 7)
+
+def might_be_revoked(jti: str) -> bool:
+    return all(_bits[p >> 3] & (1 << (p & 7)) for p in _positions(jti, len(_bits) * 8))
+
+def _deny_list_unavailable(e: Exception) -> HTTPException:
+    # Fail closed: a token the filter flags can't be let through unconfirmed
+    logger.error(f"Revocation deny-list unavailable: {str(e)}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Token revocation check unavailable",
+        headers={"Retry-After": "5"}
+    )
+
+async def is_revoked(jti: Optional[str]) -> bool:
+    if not jti or not might_be_revoked(jti):
+        return False
+    try:
+        redis = await get_redis()
+        return bool(await redis.exists(f"{KEY_PREFIX}{jti}"))
+    except (RuntimeError, RedisError) as e:
+        raise _deny_list_unavailable(e)
+
+async def revoked_jtis(jtis: Iterable[str]) -> Set[str]:
+    """Which of these jtis are deny-listed, in at most one MGET."""
+    candidates = [jti for jti in jtis if jti and might_be_revoked(jti)]
+    if not candidates:
+        return set()
+    try:
+        redis = await get_redis()
+        values = await redis.mget([f"{KEY_PREFIX}{jti}" for jti in candidates])
+    except (RuntimeError, RedisError) as e:
+        raise _deny_list_unavailable(e)
+    return {jti for jti, value in zip(candidates, values) if value is not None}
+
+async def revoke_token(jti: str, expires_at: float):
+    """Deny a token until it would have expired anyway, on every worker."""
+    ttl = int(expires_at - time.time()) + 1
+    if ttl <= 0:
+        return
+    _add(_bits, jti)
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(f"{KEY_PREFIX}{jti}", "1", ex=ttl)
+        pipe.publish(REVOCATION_CHANNEL, jti)
+        await pipe.execute()
+
+async def rebuild_filter(redis: Redis):
+    """
+    Reload the filter from the deny-list. Entries expire from Redis but can't
+    be removed from a Bloom filter, so a periodic rebuild keeps the false
+    positive rate from creeping up.
+    """
+    global _bits
+    bits = bytearray(len(_bits))
+    async for key in redis.scan_iter(match=f"{KEY_PREFIX}*", count=1000):
+        _add(bits, key[len(KEY_PREFIX):])
+    _bits = bits
+
+async def _follow_revocations():
+    redis = await get_redis()
+    pubsub = redis.pubsub()
+    # Subscribe before the first scan so no revocation falls in between
+    await pubsub.subscribe(REVOCATION_CHANNEL)
+    rebuild_interval = get_settings().REVOCATION_BLOOM_REBUILD_SECONDS
+    try:
+        await rebuild_filter(redis)
+        next_rebuild = time.monotonic() + rebuild_interval
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None and message["type"] == "message":
+                _add(_bits, message["data"])
+            if time.monotonic() >= next_rebuild:
+                await rebuild_filter(redis)
+                next_rebuild = time.monotonic() + rebuild_interval
+    finally:
+        try:
+            await pubsub.unsubscribe(REVOCATION_CHANNEL)
+        except RedisError:
+            pass
+        await pubsub.aclose()
+
+async def _sync_filter():
+    # Resubscribing rebuilds the filter, which picks up whatever was revoked
+    # while the connection was down
+    delay = 1.0
+    while True:
+        started_at = time.monotonic()
+        try:
+            await _follow_revocations()
+        except (RuntimeError, RedisError) as e:
+            logger.warning(f"Revocation listener waiting for Redis: {str(e)}")
+        except Exception as e:
+            logger.exception(f"Revocation listener failed, restarting: {str(e)}")
+        # Back off while Redis stays down, start over after a healthy stretch
+        delay = 1.0 if time.monotonic() - started_at > MAX_RECONNECT_DELAY else min(delay * 2, MAX_RECONNECT_DELAY)
+        await asyncio.sleep(delay)
+
+def start_revocation_listener():
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_sync_filter())
+
+async def stop_revocation_listener():
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except (asyncio.CancelledError, Exception):
+        pass
+    _listener_task = None
@@ -1,33 +1,218 @@
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import time
+from urllib.parse import urlencode
 import httpx
 from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from redis.asyncio import Redis
+from ..config import get_settings
+from .http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+OAUTH_STATE_TTL_SECONDS = 600
+# Don't hammer the JWKS endpoint when tokens arrive with an unknown kid
+MIN_JWKS_REFRESH_INTERVAL = 60
+
+# kid -> JWK, refreshed when the provider's Cache-Control max-age runs out
+google_jwks: Dict[str, Dict[str, Any]] = {}
+google_jwks_expires_at: float = 0.0
+google_jwks_fetched_at: float = 0.0
+_jwks_lock = asyncio.Lock()
+
+def _max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else 3600
+
+async def _refresh_google_jwks(force: bool = False):
+    global google_jwks, google_jwks_expires_at, google_jwks_fetched_at
+    async with _jwks_lock:
+        now = time.time()
+        # Another request may have refreshed while we waited for the lock
+        if not force and now < google_jwks_expires_at:
+            return
+        if force and now - google_jwks_fetched_at < MIN_JWKS_REFRESH_INTERVAL:
+            return
+
+        client = await get_http_client()
+        response = await client.get(get_settings().GOOGLE_JWKS_URL)
+        response.raise_for_status()
+        google_jwks = {key["kid"]: key for key in response.json()["keys"]}
+        google_jwks_fetched_at = now
+        google_jwks_expires_at = now + _max_age(response.headers.get("cache-control"))
+
+async def _google_key(kid: str) -> Optional[Dict[str, Any]]:
+    if time.time() >= google_jwks_expires_at:
+        await _refresh_google_jwks()
+    if kid not in google_jwks:
+        # Google rotates keys; pick up a new one without waiting for expiry
+        await _refresh_google_jwks(force=True)
+    return google_jwks.get(kid)
 
 async def verify_google_token(token: str) -> Optional[Dict]:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"https://oauth2.googleapis.com/tokeninfo?id_token={token}"
-            )
-            if response.status_code == 200:
-                return response.json()
+    """Validate a Google ID token locally against Google's published keys."""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = await _google_key(kid) if kid else None
+        if key is None:
             return None
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Failed to verify Google token"
-            )
+        return jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=get_settings().GOOGLE_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            options={"verify_at_hash": False}
+        )
+    except JWTError:
+        return None
+    except (httpx.HTTPError, RuntimeError, KeyError, ValueError) as e:
+        logger.error(f"Failed to fetch Google signing keys: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Failed to verify Google token"
+        )
 
 async def verify_facebook_token(token: str) -> Optional[Dict]:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"https://graph.facebook.com/me?access_token={token}"
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Failed to verify Facebook token"
-            ) 
\ No newline at end of file
+    try:
+        client = await get_http_client()
+        response = await client.get(
+            "https://graph.facebook.com/me",
+            params={"access_token": token, "fields": "id,name,email"}
+        )
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Failed to verify Facebook token"
+        )
+
+# Authorization code flow
+
+def _oauth_failed(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+async def start_authorization(redis: Redis, provider: str) -> Dict[str, str]:
+    """Create the state and PKCE pair for a login redirect."""
+    state = secrets.token_urlsafe(24)
+    code_verifier = secrets.token_urlsafe(48)
+    code_challenge = base64.urlsafe_b64encode(
+        hashlib.sha256(code_verifier.encode()).digest()
+    ).rstrip(b"=").decode()
+    await redis.set(f"oauth_state:{provider}:{state}", code_verifier, ex=OAUTH_STATE_TTL_SECONDS)
+    return {"state": state, "code_challenge": code_challenge}
+
+async def consume_authorization(redis: Redis, provider: str, state: str) -> str:
+    """Return the PKCE verifier for a callback; each state can be used once."""
+    code_verifier = await redis.getdel(f"oauth_state:{provider}:{state}")
+    if code_verifier is None:
+        raise _oauth_failed("Invalid or expired OAuth state")
+    return code_verifier
+
+def google_authorization_url(authorization: Dict[str, str]) -> str:
+    settings = get_settings()
+    return f"{settings.GOOGLE_AUTH_URL}?" + urlencode({
+        "response_type": "code",
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+        "scope": "openid email profile",
+        "state": authorization["state"],
+        "code_challenge": authorization["code_challenge"],
+        "code_challenge_method": "S256",
+    })
+
+def facebook_authorization_url(authorization: Dict[str, str]) -> str:
+    settings = get_settings()
+    return f"{settings.FACEBOOK_AUTH_URL}?" + urlencode({
+        "client_id": settings.FACEBOOK_CLIENT_ID,
+        "redirect_uri": settings.FACEBOOK_REDIRECT_URI,
+        "scope": "email",
+        "state": authorization["state"],
+        "code_challenge": authorization["code_challenge"],
+        "code_challenge_method": "S256",
+    })
+
+async def exchange_google_code(code: str, code_verifier: str) -> Dict[str, str]:
+    """
+    Trade the code for tokens and read the profile from the ID token. The ID
+    token is verified locally, so the exchange is the only provider call.
+    """
+    settings = get_settings()
+    client = await get_http_client()
+    try:
+        response = await client.post(settings.GOOGLE_TOKEN_URL, data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "code_verifier": code_verifier,
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+            "redirect_uri": settings.GOOGLE_REDIRECT_URI,
+        })
+    except httpx.HTTPError as e:
+        logger.error(f"Google code exchange failed: {str(e)}")
+        raise _oauth_failed("Google authorization failed")
+    if response.status_code != 200:
+        raise _oauth_failed("Google authorization failed")
+
+    claims = await verify_google_token(response.json().get("id_token", ""))
+    if not claims or not claims.get("email") or not claims.get("email_verified"):
+        raise _oauth_failed("Google account has no verified email")
+    return {"email": claims["email"], "full_name": claims.get("name") or claims["email"]}
+
+async def exchange_facebook_code(code: str, code_verifier: str) -> Dict[str, str]:
+    """
+    Trade the code for an access token, then fetch the profile and check the
+    token was issued to this app concurrently, since neither depends on the other.
+    """
+    settings = get_settings()
+    client = await get_http_client()
+    try:
+        response = await client.get(f"{settings.FACEBOOK_GRAPH_URL}/oauth/access_token", params={
+            "client_id": settings.FACEBOOK_CLIENT_ID,
+            "client_secret": settings.FACEBOOK_CLIENT_SECRET,
+            "redirect_uri": settings.FACEBOOK_REDIRECT_URI,
+            "code": code,
+            "code_verifier": code_verifier,
+        })
+        if response.status_code != 200:
+            raise _oauth_failed("Facebook authorization failed")
+        access_token = response.json()["access_token"]
+
+        appsecret_proof = hmac.new(
+            settings.FACEBOOK_CLIENT_SECRET.encode(), access_token.encode(), hashlib.sha256
+        ).hexdigest()
+        profile_response, debug_response = await asyncio.gather(
+            client.get(f"{settings.FACEBOOK_GRAPH_URL}/me", params={
+                "fields": "id,name,email,verified",
+                "access_token": access_token,
+                "appsecret_proof": appsecret_proof,
+            }),
+            client.get(f"{settings.FACEBOOK_GRAPH_URL}/debug_token", params={
+                "input_token": access_token,
+                "access_token": f"{settings.FACEBOOK_CLIENT_ID}|{settings.FACEBOOK_CLIENT_SECRET}",
+            })
+        )
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        logger.error(f"Facebook code exchange failed: {str(e)}")
+        raise _oauth_failed("Facebook authorization failed")
+
+    token_info = debug_response.json().get("data", {}) if debug_response.status_code == 200 else {}
+    if not token_info.get("is_valid") or str(token_info.get("app_id")) != settings.FACEBOOK_CLIENT_ID:
+        raise _oauth_failed("Facebook token was not issued to this app")
+
+    profile = profile_response.json() if profile_response.status_code == 200 else {}
+    # Facebook does not vouch for the address of an unverified account, and
+    # the email is what identifies the user here
+    if not profile.get("email") or profile.get("verified") is not True:
+        raise _oauth_failed("Facebook account has no verified email")
+    return {"email": profile["email"], "full_name": profile.get("name") or profile["email"]}
@@ -0,0 +1,70 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from ..config import get_settings
+from ..metrics import TOKEN_CACHE_HITS, TOKEN_CACHE_MISSES
+from ..models.user import normalize_email
+
+# token digest -> (expires_at, user generation, claims, user snapshot)
+CacheEntry = Tuple[float, int, Dict[str, Any], Dict[str, Any]]
+
+_entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+# normalized email -> generation. Bumping it turns every cached token of that
+# user into a miss without having to find them; only changed users are kept
+_generations: Dict[str, int] = {}
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _discard(digest: str):
+    _entries.pop(digest, None)
+
+def _generation(user: Dict[str, Any]) -> int:
+    return _generations.get(normalize_email(user["email"]), 0)
+
+def get_cached_token(token: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    digest = token_digest(token)
+    entry = _entries.get(digest)
+    if entry is None:
+        TOKEN_CACHE_MISSES.inc()
+        return None
+
+    expires_at, generation, claims, user = entry
+    if expires_at <= time.time() or generation != _generation(user):
+        _discard(digest)
+        TOKEN_CACHE_MISSES.inc()
+        return None
+
+    _entries.move_to_end(digest)
+    TOKEN_CACHE_HITS.inc()
+    return claims, user
+
+def cache_token(token: str, claims: Dict[str, Any], user: Dict[str, Any]):
+    settings = get_settings()
+    if settings.TOKEN_CACHE_SIZE <= 0:
+        return
+
+    # Never keep a token around longer than it is valid
+    expires_at = time.time() + settings.TOKEN_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        expires_at = min(expires_at, float(claims["exp"]))
+
+    digest = token_digest(token)
+    _discard(digest)
+    _entries[digest] = (expires_at, _generation(user), claims, user)
+
+    while len(_entries) > settings.TOKEN_CACHE_SIZE:
+        _discard(next(iter(_entries)))
+
+def invalidate_token(token: str):
+    _discard(token_digest(token))
+
+def invalidate_user_tokens(email: str):
+    """Drop every cached token for a user, e.g. after a password change."""
+    email = normalize_email(email)
+    _generations[email] = _generations.get(email, 0) + 1
+
+def clear_token_cache():
+    _entries.clear()
+    _generations.clear()
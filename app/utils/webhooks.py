@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+from ..cache import get_redis
+from ..config import get_settings
+from ..metrics import WEBHOOK_EVENTS
+from ..schemas.web_service import WebhookPayload
+
+logger = logging.getLogger(__name__)
+
+# Accepted events wait here until a consumer in the group acknowledges them.
+# Events that keep failing are moved to the dead-letter stream for inspection.
+WEBHOOK_STREAM = "webhooks:events"
+DEAD_LETTER_STREAM = "webhooks:dead_letter"
+CONSUMER_GROUP = "webhook-workers"
+
+# Only the first delivery of an event id is queued; one round trip either way
+ENQUEUE_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return false
+end
+return redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*',
+    'integration', ARGV[3], 'id', ARGV[4], 'type', ARGV[5], 'payload', ARGV[6])
+"""
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+EVENT_HANDLERS: Dict[str, EventHandler] = {}
+
+_enqueue_script = None
+_worker_tasks: List[asyncio.Task] = []
+
+def webhook_handler(event_type: str) -> Callable[[EventHandler], EventHandler]:
+    """Register the coroutine that processes one event type, given the event payload."""
+    def register(handler: EventHandler) -> EventHandler:
+        EVENT_HANDLERS[event_type] = handler
+        return handler
+    return register
+
+async def enqueue_event(redis: Redis, integration_id: str, event_id: str, payload: WebhookPayload) -> bool:
+    """Queue an event for the workers. False when this integration already sent this event id."""
+    global _enqueue_script
+    if _enqueue_script is None:
+        _enqueue_script = redis.register_script(ENQUEUE_SCRIPT)
+
+    settings = get_settings()
+    message_id = await _enqueue_script(
+        keys=[f"webhook_event:{integration_id}:{event_id}", WEBHOOK_STREAM],
+        args=[
+            settings.WEBHOOK_IDEMPOTENCY_TTL_SECONDS,
+            settings.WEBHOOK_STREAM_MAXLEN,
+            integration_id,
+            event_id,
+            payload.event_type,
+            payload.model_dump_json()
+        ],
+        client=redis
+    )
+    WEBHOOK_EVENTS.labels(
+        event_type=payload.event_type,
+        outcome="queued" if message_id else "duplicate"
+    ).inc()
+    return bool(message_id)
+
+async def handle_message(fields: Dict[str, str]) -> bool:
+    """Run the handler for one stream entry. True means it can be acknowledged."""
+    event_type = fields.get("type", "")
+    handler = EVENT_HANDLERS.get(event_type)
+    if handler is None:
+        logger.warning(f"No handler for webhook event type {event_type}, dropping event {fields.get('id')}")
+        return True
+    try:
+        payload = json.loads(fields["payload"])
+        await asyncio.wait_for(handler(payload), get_settings().WEBHOOK_HANDLER_TIMEOUT_SECONDS)
+    except Exception as e:
+        WEBHOOK_EVENTS.labels(event_type=event_type, outcome="failed").inc()
+        logger.warning(f"Webhook event {fields.get('id')} ({event_type}) failed: {str(e)}")
+        return False
+    WEBHOOK_EVENTS.labels(event_type=event_type, outcome="processed").inc()
+    return True
+
+async def _process_batch(redis: Redis, messages: List[Tuple[str, Optional[Dict[str, str]]]]):
+    # Entries trimmed from the stream come back without fields
+    messages = [(message_id, fields) for message_id, fields in messages if fields]
+    if not messages:
+        return
+    results = await asyncio.gather(*(handle_message(fields) for _, fields in messages))
+    # Failed entries stay pending and are picked up again by _retry_failed
+    done = [message_id for (message_id, _), ok in zip(messages, results) if ok]
+    if done:
+        await redis.xack(WEBHOOK_STREAM, CONSUMER_GROUP, *done)
+
+async def _retry_due(redis: Redis, consumer: str, pending: List[Dict[str, Any]]):
+    """Run again the entries of one page whose backoff has elapsed; dead-letter the ones out of attempts."""
+    settings = get_settings()
+    base_ms = int(settings.WEBHOOK_RETRY_BASE_SECONDS * 1000)
+    due = [
+        entry for entry in pending
+        if entry["time_since_delivered"] >= base_ms * 2 ** (entry["times_delivered"] - 1)
+        or entry["times_delivered"] >= settings.WEBHOOK_MAX_ATTEMPTS
+    ]
+    exhausted = [e["message_id"] for e in due if e["times_delivered"] >= settings.WEBHOOK_MAX_ATTEMPTS]
+    retry = [e["message_id"] for e in due if e["times_delivered"] < settings.WEBHOOK_MAX_ATTEMPTS]
+
+    if exhausted:
+        # Claiming first means only one worker moves each entry
+        claimed = await redis.xclaim(WEBHOOK_STREAM, CONSUMER_GROUP, consumer, base_ms, exhausted)
+        if claimed:
+            async with redis.pipeline(transaction=True) as pipe:
+                for message_id, fields in claimed:
+                    if fields:
+                        pipe.xadd(
+                            DEAD_LETTER_STREAM,
+                            dict(fields, stream_id=message_id),
+                            maxlen=settings.WEBHOOK_STREAM_MAXLEN,
+                            approximate=True
+                        )
+                        WEBHOOK_EVENTS.labels(event_type=fields.get("type", ""), outcome="dead_lettered").inc()
+                        logger.error(f"Webhook event {fields.get('id')} moved to {DEAD_LETTER_STREAM}")
+                pipe.xack(WEBHOOK_STREAM, CONSUMER_GROUP, *[message_id for message_id, _ in claimed])
+                await pipe.execute()
+
+    if retry:
+        claimed = await redis.xclaim(WEBHOOK_STREAM, CONSUMER_GROUP, consumer, base_ms, retry)
+        await _process_batch(redis, claimed)
+
+async def _retry_failed(redis: Redis, consumer: str):
+    """
+    Walk the whole pending list a page at a time, so entries still backing
+    off at its head don't hide due ones behind them, and retry what is due
+    from this or any dead consumer.
+    """
+    settings = get_settings()
+    base_ms = int(settings.WEBHOOK_RETRY_BASE_SECONDS * 1000)
+    start = "-"
+    while True:
+        pending = await redis.xpending_range(
+            WEBHOOK_STREAM, CONSUMER_GROUP, min=start, max="+",
+            count=settings.WEBHOOK_BATCH_SIZE, idle=base_ms
+        )
+        if not pending:
+            return
+        await _retry_due(redis, consumer, pending)
+        if len(pending) < settings.WEBHOOK_BATCH_SIZE:
+            return
+        # Exclusive start: the next page begins after the last entry seen
+        start = f"({pending[-1]['message_id']}"
+
+async def ensure_consumer_group(redis: Redis):
+    try:
+        await redis.xgroup_create(WEBHOOK_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        # Another worker got there first
+        if "BUSYGROUP" not in str(e):
+            raise
+
+async def _consume(consumer: str):
+    settings = get_settings()
+    retry_interval = settings.WEBHOOK_RETRY_BASE_SECONDS / 2
+    group_ready = False
+    next_retry = 0.0
+    while True:
+        try:
+            redis = await get_redis()
+            if not group_ready:
+                await ensure_consumer_group(redis)
+                group_ready = True
+            if time.monotonic() >= next_retry:
+                await _retry_failed(redis, consumer)
+                next_retry = time.monotonic() + retry_interval
+            response = await redis.xreadgroup(
+                CONSUMER_GROUP,
+                consumer,
+                {WEBHOOK_STREAM: ">"},
+                count=settings.WEBHOOK_BATCH_SIZE,
+                block=settings.WEBHOOK_BLOCK_MS
+            )
+            for _, messages in response or []:
+                await _process_batch(redis, messages)
+        except (RuntimeError, RedisError) as e:
+            logger.warning(f"Webhook consumer {consumer} waiting for Redis: {str(e)}")
+            await asyncio.sleep(1)
+        except Exception as e:
+            # Anything else would end the task and leave this consumer's entries unprocessed
+            logger.exception(f"Webhook consumer {consumer} error: {str(e)}")
+            await asyncio.sleep(1)
+
+def start_webhook_workers():
+    if _worker_tasks:
+        return
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    for index in range(get_settings().WEBHOOK_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_consume(f"{prefix}-{index}")))
+
+async def stop_webhook_workers():
+    for task in _worker_tasks:
+        task.cancel()
+    for task in _worker_tasks:
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+    _worker_tasks.clear()
+
+# Event handlers
+
+@webhook_handler("user.created")
+async def on_user_created(payload: Dict[str, Any]):
+    # Implement user creation event handling
+    logger.info(f"user.created for {payload['data'].get('user_id')}")
+
+@webhook_handler("payment.succeeded")
+async def on_payment_succeeded(payload: Dict[str, Any]):
+    # Implement payment success handling
+    logger.info(f"payment.succeeded for {payload['data'].get('transaction_id')}")
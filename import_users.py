@@ -0,0 +1,76 @@
+"""
+Bulk-create users from a CSV (with a header row) or JSON lines file:
+
+    python import_users.py users.csv
+    python import_users.py users.jsonl --format jsonl
+
+Records need email and full_name, plus either password or an existing
+bcrypt/argon2 password_hash. Rows that fail are appended to <input>.errors.jsonl.
+Progress is checkpointed to <input>.checkpoint after every committed chunk,
+and running the same command again resumes from there.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator
+from app.database import close_db_connection
+from app.schemas.auth import ImportFailure
+from app.utils.bulk_import import IMPORT_FORMATS, import_users
+from app.utils.hashing import close_hashing_pool, init_hashing_pool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def read_lines(path: str) -> AsyncIterator[str]:
+    with open(path, encoding="utf-8", newline="") as source:
+        for line in source:
+            yield line
+
+def read_checkpoint(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint_file:
+        return int(checkpoint_file.read().strip() or 0)
+
+def write_checkpoint(path: str, rows_processed: int):
+    # Replace atomically so a crash never leaves a truncated checkpoint
+    with open(f"{path}.tmp", "w") as checkpoint_file:
+        checkpoint_file.write(str(rows_processed))
+    os.replace(f"{path}.tmp", path)
+
+async def main(args: argparse.Namespace):
+    checkpoint_path = args.checkpoint or f"{args.input}.checkpoint"
+    start_row = 0 if args.restart else read_checkpoint(checkpoint_path)
+    if start_row:
+        logger.info(f"Resuming {args.input} after row {start_row}")
+
+    init_hashing_pool()
+    try:
+        with open(args.errors or f"{args.input}.errors.jsonl", "a") as errors_file:
+            def record_failure(failure: ImportFailure):
+                errors_file.write(failure.model_dump_json() + "\n")
+
+            totals = await import_users(
+                read_lines(args.input),
+                args.format,
+                start_row=start_row,
+                on_failure=record_failure,
+                on_checkpoint=lambda rows: write_checkpoint(checkpoint_path, rows)
+            )
+    finally:
+        close_hashing_pool()
+        await close_db_connection()
+    print(json.dumps(totals))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-create users with COPY")
+    parser.add_argument("input", help="CSV or JSON lines file")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="defaults to the file extension")
+    parser.add_argument("--checkpoint", help="progress file, default <input>.checkpoint")
+    parser.add_argument("--errors", help="failed rows as JSON lines, default <input>.errors.jsonl")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+    args.format = args.format or ("jsonl" if args.input.endswith((".jsonl", ".ndjson")) else "csv")
+    asyncio.run(main(args))
@@ -50,8 +50,8 @@ app = FastAPI(
 )
 
 # Add middleware
-app.middleware("http")(error_handler_middleware)
-app.middleware("http")(logging_middleware)
+app.add_middleware(error_handler_middleware)
+app.add_middleware(logging_middleware)
 
 # Include routers
 app.include_router(auth.router)
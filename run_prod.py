@@ -1,10 +1,23 @@
 import uvicorn
 import os
 import multiprocessing
+import shutil
+import tempfile
 
 if __name__ == "__main__":
     workers = multiprocessing.cpu_count() * 2 + 1
     os.environ["ENVIRONMENT"] = "production"
+    # Lets each worker size its database pool to its share of the connections
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    # Shared by all workers so /metrics aggregates them; stale files from a
+    # previous run would be summed in too, so start from an empty directory
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), "auth-api-metrics")
+    )
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
     
     uvicorn.run(
         "app.main:app",
@@ -14,4 +27,4 @@ if __name__ == "__main__":
         proxy_headers=True,
         forwarded_allow_ips="*",
         log_level="info"
-    ) 
\ No newline at end of file
+    )
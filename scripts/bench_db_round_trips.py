@@ -0,0 +1,136 @@
+"""
+Database round trips and latency per request for the session dependencies.
+
+    DATABASE_URL=postgresql://... python -m scripts.bench_db_round_trips user@example.com [requests]
+
+Connections go through a local proxy that counts the server's ReadyForQuery
+messages, one per round trip, so the numbers are what Postgres actually saw.
+Each scenario runs the dependency around the query its endpoint makes:
+
+  legacy get_db          the old dependency: BEGIN, SELECT, COMMIT
+  get_primary_read_db    login: one autocommit SELECT
+  get_read_db            /me and get_current_user: the same, replica-capable
+  get_db (write)         a single-statement write: BEGIN, UPDATE, COMMIT
+
+Pool pre-ping adds one round trip per checkout to every scenario.
+"""
+import asyncio
+import sys
+import time
+from typing import AsyncGenerator
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app import database
+from app.models.user import User as UserModel, normalize_email
+
+class RoundTripCounter:
+    """TCP proxy that counts ReadyForQuery ('Z') messages from the server."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.round_trips = 0
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    async def _count_server_messages(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        buffer = b""
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+            buffer += data
+            # Every backend message is a type byte and an int32 length
+            while len(buffer) >= 5:
+                length = int.from_bytes(buffer[1:5], "big")
+                if len(buffer) < 1 + length:
+                    break
+                if buffer[:1] == b"Z":
+                    self.round_trips += 1
+                buffer = buffer[1 + length:]
+        writer.close()
+
+    async def handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        server_reader, server_writer = await asyncio.open_connection(self.host, self.port)
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer),
+            self._count_server_messages(server_reader, client_writer),
+            return_exceptions=True
+        )
+
+async def legacy_get_db(session_factory: sessionmaker) -> AsyncGenerator[AsyncSession, None]:
+    # get_db as it was before the read-only/read-write split
+    async with session_factory() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise HTTPException(status_code=500, detail="Database error")
+        finally:
+            await session.close()
+
+async def run_dependency(dependency: AsyncGenerator, work):
+    session = await dependency.__anext__()
+    await work(session)
+    try:
+        await dependency.__anext__()
+    except StopAsyncIteration:
+        pass
+
+async def main(email: str, requests: int):
+    url = make_url(database.DATABASE_URL)
+    counter = RoundTripCounter(url.host or "127.0.0.1", url.port or 5432)
+    proxy = await asyncio.start_server(counter.handle, "127.0.0.1", 0)
+    proxy_port = proxy.sockets[0].getsockname()[1]
+
+    # The proxy parses the plain protocol, so TLS is off on the proxied leg
+    proxied_url = url.set(host="127.0.0.1", port=proxy_port, query=dict(url.query, ssl="disable"))
+    bench_engine = database.build_engine(proxied_url.render_as_string(hide_password=False))
+    write_sessions = sessionmaker(bench_engine, class_=AsyncSession, expire_on_commit=False)
+    read_sessions = sessionmaker(database.read_only(bench_engine), class_=AsyncSession, expire_on_commit=False)
+    database.async_session = write_sessions
+    database.read_only_session = read_sessions
+
+    async def lookup(session: AsyncSession):
+        result = await session.execute(
+            select(UserModel).where(UserModel.email_normalized == normalize_email(email))
+        )
+        if result.scalars().first() is None:
+            raise SystemExit(f"{email} is not a registered user")
+
+    async def write(session: AsyncSession):
+        # Touches nothing, but still needs a transaction and a commit
+        await session.execute(update(UserModel).where(UserModel.id == -1).values(full_name="unchanged"))
+
+    scenarios = {
+        "legacy get_db": (lambda: legacy_get_db(write_sessions), lookup),
+        "get_primary_read_db": (database.get_primary_read_db, lookup),
+        "get_read_db": (database.get_read_db, lookup),
+        "get_db (write)": (database.get_db, write),
+    }
+
+    try:
+        print(f"{'scenario':<22} {'round trips':>12} {'ms/request':>11}")
+        for name, (dependency, work) in scenarios.items():
+            # Warm up: pool connection, prepared statement cache
+            await run_dependency(dependency(), work)
+            counter.round_trips = 0
+            start_time = time.perf_counter()
+            for _ in range(requests):
+                await run_dependency(dependency(), work)
+            elapsed = time.perf_counter() - start_time
+            print(f"{name:<22} {counter.round_trips / requests:>12.2f} {elapsed / requests * 1000:>11.3f}")
+    finally:
+        await bench_engine.dispose()
+        proxy.close()
+        await proxy.wait_closed()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000))
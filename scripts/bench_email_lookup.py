@@ -0,0 +1,77 @@
+"""
+Email lookup cost on a 1M-row users table, before and after email_normalized.
+
+    DATABASE_URL=postgresql://... python -m scripts.bench_email_lookup [rows] [lookups]
+
+Builds a temporary copy of the users table (nothing real is touched) and
+times random lookups three ways:
+
+  raw      email = $1                    the old case-sensitive query
+  lower    lower(email) = lower($1)      case-insensitive without an index
+  index    email_normalized = $1         the new indexed column
+
+and prints each plan, so index-only scans and seq scans are easy to spot.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+import asyncpg
+
+SETUP = """
+CREATE TEMPORARY TABLE users_bench (
+    id serial PRIMARY KEY,
+    email text NOT NULL,
+    email_normalized text NOT NULL,
+    password_hash text NOT NULL,
+    full_name text NOT NULL
+);
+INSERT INTO users_bench (email, email_normalized, password_hash, full_name)
+SELECT 'User' || i || '@Example.com', 'user' || i || '@example.com', '!', 'User ' || i
+FROM generate_series(1, $ROWS) AS i;
+CREATE UNIQUE INDEX ON users_bench (email);
+CREATE UNIQUE INDEX ON users_bench (email_normalized) INCLUDE (id);
+"""
+
+QUERIES = {
+    "raw": "SELECT id FROM users_bench WHERE email = $1",
+    "lower": "SELECT id FROM users_bench WHERE lower(email) = lower($1)",
+    "index": "SELECT id FROM users_bench WHERE email_normalized = $1",
+}
+
+async def main(rows: int, lookups: int):
+    url = os.environ["DATABASE_URL"].replace("postgresql+asyncpg://", "postgresql://", 1)
+    conn = await asyncpg.connect(url)
+    try:
+        start_time = time.perf_counter()
+        await conn.execute(SETUP.replace("$ROWS", str(int(rows))))
+        # Sets the visibility map, which index-only scans depend on
+        await conn.execute("VACUUM ANALYZE users_bench")
+        print(f"loaded {rows} rows in {time.perf_counter() - start_time:.1f}s\n")
+
+        samples = [random.randint(1, rows) for _ in range(lookups)]
+        for name, query in QUERIES.items():
+            email = "user1@example.com" if name == "index" else "User1@Example.com"
+            plan = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query}", email)
+            print(f"[{name}] {query}")
+            for line in plan:
+                print(f"    {line[0]}")
+
+            statement = await conn.prepare(query)
+            # The unindexed query scans the whole table, so sample it less
+            count = lookups if name != "lower" else max(lookups // 100, 5)
+            start_time = time.perf_counter()
+            for i in samples[:count]:
+                email = f"user{i}@example.com" if name == "index" else f"User{i}@Example.com"
+                await statement.fetchval(email)
+            elapsed = time.perf_counter() - start_time
+            print(f"    {count} lookups: {elapsed / count * 1000:.3f} ms each\n")
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    ))
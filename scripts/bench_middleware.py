@@ -0,0 +1,116 @@
+"""
+Per-request overhead of the middleware stack, before and after the move to
+pure ASGI middleware.
+
+    python -m scripts.bench_middleware [requests]
+
+Both stacks wrap the same no-op route and are driven with raw ASGI calls, so
+the numbers only contain middleware and routing cost. Rate limiting runs in
+approximate mode to keep Redis out of the measurement.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("RATE_LIMIT_MODE", "approximate")
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.middleware.stack import install_middleware
+from app.utils.rate_limit import hit_local, policy_for_path, rate_limit_headers
+
+# The function-style middlewares as they were registered with app.middleware("http")
+async def legacy_error_handler(request: Request, call_next):
+    try:
+        return await call_next(request)
+    except Exception:
+        return JSONResponse(status_code=500, content={"detail": "Internal server error"})
+
+async def legacy_logging(request: Request, call_next):
+    start_time = time.time()
+    response = await call_next(request)
+    process_time = time.time() - start_time
+    logging.getLogger("bench").info(
+        f"Path: {request.url.path} Method: {request.method} "
+        f"Status: {response.status_code} Duration: {process_time:.3f}s"
+    )
+    return response
+
+async def legacy_rate_limit(request: Request, call_next):
+    policy = policy_for_path(request.url.path)
+    result = hit_local(policy, f"{request.client.host}:{request.url.path}")
+    if not result.allowed:
+        return JSONResponse(status_code=429, content={"detail": "Too many requests"})
+    response = await call_next(request)
+    response.headers.update(rate_limit_headers(policy, result))
+    return response
+
+def build_app(legacy: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if legacy:
+        app.middleware("http")(legacy_error_handler)
+        app.middleware("http")(legacy_logging)
+        app.middleware("http")(legacy_rate_limit)
+    else:
+        install_middleware(app)
+    return app
+
+async def call(app: FastAPI):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+async def measure(app: FastAPI, requests: int) -> float:
+    for _ in range(min(requests, 1000)):
+        await call(app)
+    start_time = time.perf_counter()
+    for _ in range(requests):
+        await call(app)
+    return (time.perf_counter() - start_time) / requests * 1_000_000
+
+async def main(requests: int):
+    logging.basicConfig(level=logging.WARNING)
+    plain_app = FastAPI()
+
+    @plain_app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    baseline = await measure(plain_app, requests)
+    legacy = await measure(build_app(legacy=True), requests)
+    asgi = await measure(build_app(legacy=False), requests)
+
+    print(f"requests per stack: {requests}")
+    print(f"no middleware:      {baseline:8.1f} us/request")
+    print(f"function-style:     {legacy:8.1f} us/request (+{legacy - baseline:.1f})")
+    print(f"pure ASGI:          {asgi:8.1f} us/request (+{asgi - baseline:.1f})")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
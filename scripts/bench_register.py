@@ -0,0 +1,66 @@
+"""
+Concurrent signup load test against a running API.
+
+    python -m scripts.bench_register http://127.0.0.1:8000 [signups] [concurrency]
+
+Every signup uses a fresh email, and a tenth of them retry an email that was
+already taken, to exercise the duplicate path. Run it against the old and the
+new build with the same arguments and compare signups/s and latency.
+
+All requests come from one IP, so start the server with RATE_LIMIT_ENABLED=false;
+otherwise the register limit answers nearly everything with 429.
+"""
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+import httpx
+
+REGISTER_PATH = "/api/v1/api/auth/v1/register"
+
+async def signup(client: httpx.AsyncClient, email: str, latencies: list, statuses: dict):
+    start_time = time.perf_counter()
+    response = await client.post(REGISTER_PATH, json={
+        "email": email,
+        "password": "benchmark-password",
+        "full_name": "Load Test"
+    })
+    latencies.append(time.perf_counter() - start_time)
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+async def main(base_url: str, signups: int, concurrency: int):
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"bench-{run_id}-{i}@example.com" for i in range(signups)]
+    # Re-use some addresses so duplicates race with their originals
+    emails += emails[:signups // 10]
+
+    latencies: list = []
+    statuses: dict = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(email: str):
+        async with semaphore:
+            await signup(client, email, latencies, statuses)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(limited(email) for email in emails))
+        elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    print(f"requests:    {len(emails)} at concurrency {concurrency}")
+    print(f"throughput:  {len(emails) / elapsed:.1f} signups/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"latency p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"statuses:    {dict(sorted(statuses.items()))}")
+    if statuses.get(429):
+        print("warning: rate limited; the numbers above are meaningless (see RATE_LIMIT_ENABLED)")
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else 500,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    ))
@@ -59,7 +59,7 @@ def test_client():
 async def authenticated_user(test_client):
     # Create a test user and get authentication token
     response = test_client.post(
-        "/api/v1/auth/register",
+        "/api/v1/api/auth/v1/register",
         json={
             "email": "test@example.com",
             "password": "testpassword",
@@ -69,7 +69,7 @@ async def authenticated_user(test_client):
     assert response.status_code == 201
     
     login_response = test_client.post(
-        "/api/v1/auth/login",
+        "/api/v1/api/auth/v1/login",
         data={
             "username": "test@example.com",
             "password": "testpassword"
@@ -0,0 +1,41 @@
+import json
+import pytest
+from app.utils import access_log
+
+def test_full_queue_drops_records(monkeypatch):
+    monkeypatch.setattr(access_log, "access_queue", access_log.queue.Queue(maxsize=1))
+    dropped = access_log.dropped_records
+    access_log.enqueue_access_record({"path": "/a"})
+    access_log.enqueue_access_record({"path": "/b"})
+    assert access_log.dropped_records == dropped + 1
+
+def test_batch_is_written_as_json_lines(tmp_path, monkeypatch):
+    log_file = tmp_path / "access.log"
+    monkeypatch.setattr(access_log.get_settings(), "ACCESS_LOG_FILE", str(log_file))
+    handler = access_log._build_handler()
+    access_log._write_batch(handler, [{"path": "/a", "status": 200}, {"path": "/b", "status": 404}])
+    handler.close()
+
+    lines = log_file.read_text().splitlines()
+    assert [json.loads(line)["path"] for line in lines] == ["/a", "/b"]
+
+def test_errors_are_never_sampled_out(monkeypatch):
+    monkeypatch.setattr(access_log.get_settings(), "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    assert access_log.should_log("/health", 500) is True
+    assert access_log.should_log("/health", 200) is False
+
+@pytest.mark.asyncio
+async def test_stop_gives_up_on_a_stuck_writer(monkeypatch):
+    monkeypatch.setattr(access_log, "access_queue", access_log.queue.Queue(maxsize=1))
+    monkeypatch.setattr(access_log, "STOP_TIMEOUT_SECONDS", 0.05)
+    access_log.access_queue.put_nowait({"path": "/a"})
+    # A writer that will never take anything off the queue
+    stuck = access_log.threading.Event()
+    thread = access_log.threading.Thread(target=stuck.wait, daemon=True)
+    thread.start()
+    monkeypatch.setattr(access_log, "_writer_thread", thread)
+
+    await access_log.stop_access_log_writer()
+
+    assert access_log._writer_thread is None
+    stuck.set()
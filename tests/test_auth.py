@@ -40,7 +40,7 @@ def setup_database():
 
 def test_register_user(test_client):
     response = test_client.post(
-        "/api/v1/auth/register",
+        "/api/v1/api/auth/v1/register",
         json={
             "email": "new_user@example.com",
             "password": "testpassword",
@@ -52,7 +52,7 @@ def test_register_user(test_client):
 
 def test_login_user(test_client):
     response = test_client.post(
-        "/api/v1/auth/login",
+        "/api/v1/api/auth/v1/login",
         data={
             "username": "new_user@example.com",
             "password": "testpassword"
@@ -61,9 +61,69 @@ def test_login_user(test_client):
     assert response.status_code == 200
     assert "access_token" in response.json()
 
+def test_login_ignores_email_case(test_client):
+    response = test_client.post(
+        "/api/v1/api/auth/v1/login",
+        data={
+            "username": "New_User@Example.com",
+            "password": "testpassword"
+        }
+    )
+    assert response.status_code == 200
+
+def login(test_client, email="new_user@example.com", password="testpassword"):
+    response = test_client.post("/api/v1/api/auth/v1/login", data={"username": email, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+def test_refresh_rotates_token(test_client):
+    tokens = login(test_client)
+    response = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    response = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 200
+
+def test_refresh_token_reuse_revokes_family(test_client):
+    tokens = login(test_client)
+    rotated = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    # The old token again means a copy leaked; neither copy works afterwards
+    response = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    response = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 401
+
+def test_logout_revokes_access_and_refresh_tokens(test_client):
+    tokens = login(test_client)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = test_client.post(
+        "/api/v1/api/auth/v1/logout",
+        json={"refresh_token": tokens["refresh_token"]},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    assert test_client.get("/api/v1/api/auth/v1/me", headers=headers).status_code == 401
+    response = test_client.post("/api/v1/api/auth/v1/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+def test_register_rejects_email_differing_only_by_case(test_client):
+    response = test_client.post(
+        "/api/v1/api/auth/v1/register",
+        json={
+            "email": "NEW_USER@example.com",
+            "password": "testpassword",
+            "full_name": "Duplicate User"
+        }
+    )
+    assert response.status_code == 400
+
 def test_login_invalid_user(test_client):
     response = test_client.post(
-        "/api/v1/auth/login",
+        "/api/v1/api/auth/v1/login",
         data={
             "username": "invalid@example.com",
             "password": "wrongpassword"
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from app.utils import bulk_import, hashing
+
+BCRYPT_HASH = hashing.build_context(dict(hashing.hash_params, scheme="bcrypt", bcrypt_rounds=4)).hash("testpassword")
+
+async def lines_of(*lines):
+    for line in lines:
+        yield line
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+async def chunks_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+@pytest.mark.asyncio
+async def test_request_body_is_split_into_lines():
+    lines = await collect(bulk_import.split_lines(chunks_of(b"email,full", b"_name\na@example.com,A", b" B\n")))
+    assert lines == ["email,full_name", "a@example.com,A B"]
+
+@pytest.mark.asyncio
+async def test_csv_rows_are_numbered_after_the_header():
+    records = await collect(bulk_import.parse_records(
+        lines_of("email,full_name,password_hash\n", "\n", "a@example.com,Alice,x\n", "b@example.com,Bob,y\n"),
+        "csv"
+    ))
+    assert [(row, fields["email"]) for row, fields, _ in records] == [(1, "a@example.com"), (2, "b@example.com")]
+
+@pytest.mark.asyncio
+async def test_bad_rows_are_reported_not_raised():
+    rows, failures = await bulk_import.prepare_chunk([
+        (1, {"email": "ok@example.com", "full_name": "Okay", "password_hash": BCRYPT_HASH}, None),
+        (2, {"email": "not-an-email", "full_name": "Nope", "password_hash": BCRYPT_HASH}, None),
+        (3, {"email": "plain@example.com", "full_name": "Plain", "password_hash": "plaintext"}, None),
+        (4, None, "Unparseable record: bad json"),
+    ])
+    assert rows == [(1, "ok@example.com", "ok@example.com", BCRYPT_HASH, "Okay")]
+    assert [failure.row for failure in failures] == [2, 3, 4]
+
+@pytest.mark.asyncio
+async def test_import_resumes_and_checkpoints_each_chunk(monkeypatch):
+    monkeypatch.setattr(bulk_import.get_settings(), "IMPORT_CHUNK_SIZE", 2)
+    copied = []
+
+    async def fake_copy(rows):
+        copied.extend(row[0] for row in rows)
+        # The second row repeats an existing email
+        return [row for row in rows if row[0] == 4]
+
+    monkeypatch.setattr(bulk_import, "copy_chunk", fake_copy)
+    lines = [f'{{"email": "user{i}@example.com", "full_name": "User {i}", "password_hash": "{BCRYPT_HASH}"}}' for i in range(1, 6)]
+    checkpoints, failures = [], []
+
+    totals = await bulk_import.import_users(
+        lines_of(*lines), "jsonl", start_row=1,
+        on_failure=failures.append, on_checkpoint=checkpoints.append
+    )
+
+    assert copied == [2, 3, 4, 5]
+    assert checkpoints == [3, 5]
+    assert [failure.row for failure in failures] == [4]
+    assert totals == {"rows_processed": 5, "imported": 3, "failed": 1}
+
+@pytest.mark.asyncio
+async def test_imported_emails_are_invalidated_after_each_chunk(monkeypatch):
+    monkeypatch.setattr(bulk_import.get_settings(), "IMPORT_CHUNK_SIZE", 2)
+    events = []
+
+    async def fake_copy(rows):
+        events.append(("copied", [row[0] for row in rows]))
+        # Row 2 repeats row 1's email and loses to it
+        return [row for row in rows if row[0] == 2]
+
+    async def record_invalidation(emails):
+        events.append(("invalidated", sorted(emails)))
+
+    monkeypatch.setattr(bulk_import, "copy_chunk", fake_copy)
+    monkeypatch.setattr(bulk_import, "invalidate_users", record_invalidation)
+    emails = ["a@example.com", "A@example.com", "b@example.com"]
+    lines = [f'{{"email": "{email}", "full_name": "User", "password_hash": "{BCRYPT_HASH}"}}' for email in emails]
+
+    await bulk_import.import_users(lines_of(*lines), "jsonl")
+
+    assert events == [
+        ("copied", [1, 2]),
+        ("invalidated", ["a@example.com"]),
+        ("copied", [3]),
+        ("invalidated", ["b@example.com"]),
+    ]
+
+@pytest.mark.asyncio
+async def test_emails_are_staged_normalized():
+    rows, _ = await bulk_import.prepare_chunk([
+        (1, {"email": "Mixed.Case@Example.com", "full_name": "Mixed", "password_hash": BCRYPT_HASH}, None),
+    ])
+    assert rows[0][1:3] == ("Mixed.Case@example.com", "mixed.case@example.com")
+
+@pytest.mark.asyncio
+async def test_passwords_are_hashed_in_small_jobs_on_part_of_the_pool(monkeypatch):
+    monkeypatch.setattr(bulk_import.get_settings(), "IMPORT_HASH_BATCH_SIZE", 3)
+    monkeypatch.setattr(bulk_import.get_settings(), "PASSWORD_HASH_WORKERS", 4)
+    jobs, running, peak = [], 0, 0
+
+    async def hash_passwords_async(passwords):
+        nonlocal running, peak
+        jobs.append(len(passwords))
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [f"hash:{password}" for password in passwords]
+
+    monkeypatch.setattr(hashing, "hash_passwords_async", hash_passwords_async)
+    passwords = [f"password{i}" for i in range(10)]
+
+    assert await bulk_import._hash_passwords(passwords) == [f"hash:{p}" for p in passwords]
+    assert jobs == [3, 3, 3, 1]
+    assert peak == 2
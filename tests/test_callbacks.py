@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from app.schemas.web_service import CallbackResponse
+from app.utils import callbacks
+
+class ShipmentCallback(BaseModel):
+    tracking_id: str
+
+def callback_request(payload: dict, reads: list) -> Request:
+    async def receive():
+        reads.append(True)
+        return {"type": "http.request", "body": json.dumps(payload).encode(), "more_body": False}
+    return Request({"type": "http", "headers": []}, receive)
+
+@pytest.fixture
+def registry(monkeypatch):
+    handlers = {}
+    monkeypatch.setattr(callbacks, "CALLBACK_HANDLERS", handlers)
+    return handlers
+
+@pytest.mark.asyncio
+async def test_callback_is_validated_and_dispatched(registry):
+    @callbacks.callback_handler("shipping", schema=ShipmentCallback)
+    async def on_shipment(data, db):
+        return CallbackResponse(success=True, message=data.tracking_id)
+
+    response = await callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T1"}, []))
+    assert response.message == "T1"
+
+@pytest.mark.asyncio
+async def test_unknown_integration_is_rejected_before_reading_body(registry):
+    reads = []
+    with pytest.raises(HTTPException) as exc_info:
+        await callbacks.dispatch_callback("shipping", callback_request({}, reads))
+    assert exc_info.value.status_code == 404
+    assert reads == []
+
+@pytest.mark.asyncio
+async def test_invalid_payload_is_rejected(registry):
+    callbacks.callback_handler("shipping", schema=ShipmentCallback)(None)
+    with pytest.raises(HTTPException) as exc_info:
+        await callbacks.dispatch_callback("shipping", callback_request({"wrong": "field"}, []))
+    assert exc_info.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_saturated_integration_sheds_load(registry):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    @callbacks.callback_handler("shipping", schema=ShipmentCallback, max_concurrency=1)
+    async def on_shipment(data, db):
+        started.set()
+        await release.wait()
+        return CallbackResponse(success=True, message="done")
+
+    first = asyncio.create_task(callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T1"}, [])))
+    await started.wait()
+    with pytest.raises(HTTPException) as exc_info:
+        await callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T2"}, []))
+    assert exc_info.value.status_code == 503
+
+    release.set()
+    assert (await first).success is True
+
+@pytest.mark.asyncio
+async def test_slow_handler_times_out(registry):
+    @callbacks.callback_handler("shipping", schema=ShipmentCallback, timeout_seconds=0.01)
+    async def on_shipment(data, db):
+        await asyncio.sleep(1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T1"}, []))
+    assert exc_info.value.status_code == 504
+
+@pytest.mark.asyncio
+async def test_slow_upload_does_not_hold_a_slot(registry):
+    @callbacks.callback_handler("shipping", schema=ShipmentCallback, max_concurrency=1)
+    async def on_shipment(data, db):
+        return CallbackResponse(success=True, message=data.tracking_id)
+
+    body_arrives = asyncio.Event()
+
+    async def slow_receive():
+        await body_arrives.wait()
+        return {"type": "http.request", "body": b'{"tracking_id": "T1"}', "more_body": False}
+
+    slow = asyncio.create_task(callbacks.dispatch_callback("shipping", Request({"type": "http", "headers": []}, slow_receive)))
+    await asyncio.sleep(0.01)
+    response = await callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T2"}, []))
+    assert response.message == "T2"
+
+    body_arrives.set()
+    assert (await slow).message == "T1"
+
+@pytest.mark.asyncio
+async def test_oversized_body_is_rejected(registry, monkeypatch):
+    monkeypatch.setattr(callbacks.get_settings(), "CALLBACK_MAX_BODY_BYTES", 32)
+    callbacks.callback_handler("shipping", schema=ShipmentCallback)(None)
+    with pytest.raises(HTTPException) as exc_info:
+        await callbacks.dispatch_callback("shipping", callback_request({"tracking_id": "T" * 64}, []))
+    assert exc_info.value.status_code == 413
@@ -1,6 +1,12 @@
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import OperationalError
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app import database
 from app.database import get_db, create_tables
+from app.main import app
+from app.routers import auth as auth_router
 from app.models.user import User
 from sqlalchemy import select
 
@@ -41,4 +47,78 @@ async def test_user_exists(db: AsyncSession):
         select(User).where(User.email == "db_test@example.com")
     )
     user = result.scalars().first()
-    assert user is not None 
\ No newline at end of file
+    assert user is not None
+
+@pytest.mark.asyncio
+async def test_get_db_lets_http_exceptions_through():
+    dependency = get_db()
+    await dependency.__anext__()
+    with pytest.raises(HTTPException) as exc_info:
+        await dependency.athrow(HTTPException(status_code=401, detail="User not found"))
+    assert exc_info.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_get_db_skips_commit_when_nothing_ran(monkeypatch):
+    commits = []
+
+    async def commit(self):
+        commits.append(self)
+
+    monkeypatch.setattr(AsyncSession, "commit", commit)
+    dependency = get_db()
+    await dependency.__anext__()
+    with pytest.raises(StopAsyncIteration):
+        await dependency.__anext__()
+    assert commits == []
+
+class InsertContext:
+    def __init__(self, **parameters):
+        self.parameters = parameters
+
+    def get_current_parameters(self):
+        return self.parameters
+
+def test_email_normalized_defaults_from_email():
+    default = User.__table__.c.email_normalized.default
+    assert default.arg(InsertContext(email=" DB_Test@Example.com")) == "db_test@example.com"
+
+class FailingCommitSession:
+    """A session whose COMMIT fails, as when the connection drops at the last moment."""
+
+    def __init__(self):
+        self.rolled_back = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def in_transaction(self):
+        return True
+
+    async def commit(self):
+        raise OperationalError("COMMIT", {}, Exception("server closed the connection unexpectedly"))
+
+    async def rollback(self):
+        self.rolled_back = True
+
+def test_failed_commit_reaches_the_client_as_500(monkeypatch):
+    session = FailingCommitSession()
+
+    async def email_exists(db, email):
+        return False
+
+    async def create_user(db, email, password_hash, full_name):
+        return 1
+
+    monkeypatch.setattr(database, "async_session", lambda: session)
+    monkeypatch.setattr(auth_router, "email_exists", email_exists)
+    monkeypatch.setattr(auth_router, "create_user", create_user)
+
+    response = TestClient(app).post(
+        "/api/v1/api/auth/v1/register",
+        json={"email": "commit_fails@example.com", "password": "testpassword", "full_name": "Commit Fails"}
+    )
+    assert response.status_code == 500
+    assert session.rolled_back
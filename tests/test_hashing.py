@@ -0,0 +1,73 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from app.utils import hashing
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_password():
+    hashed = await hashing.hash_password_async("testpassword")
+    assert await hashing.verify_password_async("testpassword", hashed) is True
+    assert await hashing.verify_password_async("wrongpassword", hashed) is False
+
+@pytest.mark.asyncio
+async def test_saturated_pool_returns_503(monkeypatch):
+    hashing.init_hashing_pool()
+    monkeypatch.setattr(hashing, "pending_jobs", hashing.max_pending_jobs)
+    with pytest.raises(HTTPException) as exc_info:
+        await hashing.hash_password_async("testpassword")
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+@pytest.mark.asyncio
+async def test_cancelled_job_keeps_its_slot_until_done():
+    hashing.init_hashing_pool()
+    before = hashing.pending_jobs
+    task = asyncio.create_task(hashing._run_in_pool("hash", time.sleep, 0.5))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # The sleep is still running in the pool
+    assert hashing.pending_jobs == before + 1
+    for _ in range(40):
+        if hashing.pending_jobs == before:
+            break
+        await asyncio.sleep(0.05)
+    assert hashing.pending_jobs == before
+
+def test_stale_scheme_needs_rehash():
+    params = dict(hashing.hash_params, scheme="bcrypt", bcrypt_rounds=4)
+    old_hash = hashing.build_context(params).hash("testpassword")
+
+    current = hashing.build_context(dict(params, scheme="argon2"))
+    assert current.verify("testpassword", old_hash)
+    assert current.needs_update(old_hash)
+
+def test_calibration_stops_once_target_is_met():
+    params = dict(hashing.hash_params, scheme="bcrypt")
+    calibrated = hashing.calibrate_hash_params(0, params)
+    assert calibrated["bcrypt_rounds"] == 10
+
+@pytest.mark.asyncio
+async def test_workers_share_one_calibration(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(hashing.get_settings(), "PASSWORD_HASH_CALIBRATE", True)
+    monkeypatch.setattr(hashing, "hash_params", hashing.hash_params)
+    monkeypatch.setattr(hashing, "pwd_context", hashing.pwd_context)
+    # Each "worker" would settle on a different cost if left to itself
+    costs = iter([5, 6])
+    monkeypatch.setattr(
+        hashing, "calibrate_hash_params",
+        lambda target_ms: dict(hashing.get_hash_params(), scheme="bcrypt", bcrypt_rounds=next(costs))
+    )
+
+    await hashing.calibrate_hashing(redis)
+    first = hashing.hash_params["bcrypt_rounds"]
+    await hashing.calibrate_hashing(redis)
+
+    assert first == 5
+    assert hashing.hash_params["bcrypt_rounds"] == 5
+    await redis.aclose()
@@ -0,0 +1,90 @@
+from datetime import timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.database import get_read_db
+from app.main import app
+from app.utils import introspection
+from app.utils.auth import create_access_token, decode_token
+
+INTROSPECT_PATH = "/api/v1/api/auth/v1/introspect"
+HEADERS = {"X-Internal-Token": "internal-secret"}
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+class FakeUsers:
+    """Answers the users query with every known (id, email_normalized) row."""
+
+    def __init__(self, users):
+        self.users = users
+
+    async def execute(self, statement):
+        return FakeResult([(user_id, email) for email, user_id in self.users.items()])
+
+@pytest.fixture
+def revoked(monkeypatch):
+    jtis = set()
+
+    async def revoked_jtis(candidates):
+        return {jti for jti in candidates if jti in jtis}
+
+    monkeypatch.setattr(introspection, "revoked_jtis", revoked_jtis)
+    return jtis
+
+@pytest.fixture
+def client(monkeypatch, revoked):
+    monkeypatch.setattr(introspection.get_settings(), "INTROSPECTION_CLIENT_SECRET", "internal-secret")
+
+    async def get_fake_db():
+        yield FakeUsers({"test@example.com": 1})
+
+    app.dependency_overrides[get_read_db] = get_fake_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_read_db, None)
+
+def introspect(client, *tokens, headers=HEADERS):
+    return client.post(INTROSPECT_PATH, json={"tokens": list(tokens)}, headers=headers)
+
+def test_unauthenticated_caller_is_rejected(client):
+    token = create_access_token({"sub": "test@example.com"})
+    assert introspect(client, token, headers={}).status_code == 401
+    assert introspect(client, token, headers={"X-Internal-Token": "wrong"}).status_code == 401
+
+def test_endpoint_is_hidden_without_a_secret(client, monkeypatch):
+    monkeypatch.setattr(introspection.get_settings(), "INTROSPECTION_CLIENT_SECRET", "")
+    token = create_access_token({"sub": "test@example.com"})
+    assert introspect(client, token).status_code == 404
+
+def test_active_token(client):
+    token = create_access_token({"sub": "test@example.com"})
+    response = introspect(client, token)
+
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert result["active"] is True
+    assert result["sub"] == "test@example.com"
+    assert result["user_id"] == 1
+    assert result["jti"] == decode_token(token)["jti"]
+
+def test_expired_and_revoked_tokens_are_inactive(client, revoked):
+    expired = create_access_token({"sub": "test@example.com"}, timedelta(seconds=-1))
+    revoked_token = create_access_token({"sub": "test@example.com"})
+    revoked.add(decode_token(revoked_token)["jti"])
+
+    results = introspect(client, expired, revoked_token).json()["results"]
+    assert [result["active"] for result in results] == [False, False]
+
+def test_mixed_batch_keeps_request_order(client, revoked):
+    active = create_access_token({"sub": "test@example.com"})
+    expired = create_access_token({"sub": "test@example.com"}, timedelta(seconds=-1))
+    revoked_token = create_access_token({"sub": "test@example.com"})
+    revoked.add(decode_token(revoked_token)["jti"])
+    unknown_user = create_access_token({"sub": "nobody@example.com"})
+
+    results = introspect(client, expired, active, "not-a-jwt", revoked_token, unknown_user).json()["results"]
+    assert [result["active"] for result in results] == [False, True, False, False, False]
+    assert results[1]["user_id"] == 1
@@ -0,0 +1,65 @@
+import json
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import JWTError, jwt
+from app.utils import keys
+from app.utils.auth import create_access_token, decode_token
+
+def write_rsa_key(path):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    path.write_text(pem)
+    return pem
+
+@pytest.fixture
+def rotated_keys(tmp_path, monkeypatch):
+    """Two keys on disk: 2024-01 was rotated out, 2024-06 signs."""
+    pems = {kid: write_rsa_key(tmp_path / f"{kid}.pem") for kid in ("2024-01", "2024-06")}
+    settings = keys.get_settings()
+    monkeypatch.setattr(settings, "ALGORITHM", "RS256")
+    monkeypatch.setattr(settings, "JWT_KEYS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", "2024-06")
+    monkeypatch.setattr(keys, "_keys", {})
+    monkeypatch.setattr(keys, "_active_kid", None)
+    monkeypatch.setattr(keys, "_jwks_body", keys._jwks_body)
+    monkeypatch.setattr(keys, "_jwks_etag", keys._jwks_etag)
+    keys.load_signing_keys()
+    return pems
+
+def test_tokens_are_signed_with_the_active_key(rotated_keys):
+    token = create_access_token({"sub": "test@example.com"})
+    assert jwt.get_unverified_header(token)["kid"] == "2024-06"
+    assert decode_token(token)["sub"] == "test@example.com"
+
+def test_token_signed_with_previous_key_still_verifies(rotated_keys):
+    token = jwt.encode(
+        {"sub": "test@example.com"}, rotated_keys["2024-01"], algorithm="RS256", headers={"kid": "2024-01"}
+    )
+    assert decode_token(token)["sub"] == "test@example.com"
+
+def test_unknown_kid_is_rejected(rotated_keys):
+    token = jwt.encode(
+        {"sub": "test@example.com"}, rotated_keys["2024-06"], algorithm="RS256", headers={"kid": "2023-12"}
+    )
+    with pytest.raises(JWTError):
+        decode_token(token)
+
+def test_jwks_publishes_every_key(rotated_keys):
+    document = json.loads(keys.jwks_document()["body"])
+    assert sorted(key["kid"] for key in document["keys"]) == ["2024-01", "2024-06"]
+
+def test_jwks_is_served_from_precomputed_bytes(test_client):
+    response = test_client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "keys" in json.loads(response.content)
+    assert response.headers["ETag"] == keys.jwks_document()["etag"]
+
+def test_jwks_not_modified(test_client):
+    etag = keys.jwks_document()["etag"]
+    response = test_client.get("/.well-known/jwks.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
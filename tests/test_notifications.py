@@ -0,0 +1,327 @@
+import email
+import json
+import socket
+import socketserver
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from sqlalchemy import delete, select
+from app.config import get_settings
+from app.database import create_tables, write_session
+from app.models.notification import Notification
+from app.models.user import User
+from app.repositories.notification import claim_due, queue_notification, record_results
+from app.repositories.user import create_user
+from app.schemas.web_service import NotificationPayload
+from app.utils import http_client
+from app.utils import notifications as dispatcher
+from app.utils.notifications import SMSSender, SMTPSender, TokenBucket, recipient_allowed
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP for smtplib; recipients containing "reject" are refused."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.sockets = []
+
+    def drop_connections(self):
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.sockets.clear()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.server.sockets.append(self.request)
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "RCPT" and "reject" in command:
+                self.reply("550 No such user")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    data += line
+                self.server.messages.append(email.message_from_bytes(data))
+                self.reply("250 Queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = get_settings()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", server.server_address[1])
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "SMTP_USERNAME", "")
+    monkeypatch.setattr(settings, "EMAIL_FROM", "noreply@example.com")
+    yield server
+    server.drop_connections()
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+async def sms_server(monkeypatch):
+    """Bulk SMS API stand-in; numbers ending in 000 are rejected per message."""
+    state = {"requests": [], "status": 200}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            state["requests"].append({"body": body, "authorization": self.headers.get("Authorization")})
+            results = [
+                {"error": "invalid number"} if message["to"].endswith("000") else {"id": str(index)}
+                for index, message in enumerate(body["messages"])
+            ]
+            response = json.dumps({"results": results}).encode()
+            self.send_response(state["status"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = get_settings()
+    monkeypatch.setattr(settings, "SMS_API_URL", f"http://127.0.0.1:{server.server_port}/messages")
+    monkeypatch.setattr(settings, "SMS_API_KEY", "sms-key")
+    monkeypatch.setattr(settings, "SMS_FROM", "+15550100")
+    await http_client.init_http_client()
+    yield state
+    await http_client.close_http_client()
+    server.shutdown()
+    server.server_close()
+
+def notifications(channel: str, recipients, attempts: int = 1):
+    return [
+        Notification(
+            id=index,
+            user_id=1,
+            channel=channel,
+            recipient=recipient,
+            data={"subject": "Hello", "body": f"Message {index}"},
+            attempts=attempts
+        )
+        for index, recipient in enumerate(recipients, start=1)
+    ]
+
+@pytest.mark.asyncio
+async def test_email_batches_share_one_smtp_connection(smtp_server):
+    sender = SMTPSender()
+    try:
+        errors = await sender.send(notifications("email", ["a@example.com", "b@example.com", "c@example.com"]))
+        assert errors == [None, None, None]
+        errors = await sender.send(notifications("email", ["d@example.com", "e@example.com"]))
+        assert errors == [None, None]
+    finally:
+        sender.close()
+
+    assert smtp_server.connections == 1
+    assert [message["To"] for message in smtp_server.messages] == [
+        "a@example.com", "b@example.com", "c@example.com", "d@example.com", "e@example.com"
+    ]
+    assert smtp_server.messages[0]["Subject"] == "Hello"
+
+@pytest.mark.asyncio
+async def test_email_sender_reconnects_after_server_drops_connection(smtp_server):
+    sender = SMTPSender()
+    try:
+        assert await sender.send(notifications("email", ["a@example.com"])) == [None]
+        smtp_server.drop_connections()
+        assert await sender.send(notifications("email", ["b@example.com"])) == [None]
+    finally:
+        sender.close()
+
+    assert smtp_server.connections == 2
+    assert [message["To"] for message in smtp_server.messages] == ["a@example.com", "b@example.com"]
+
+@pytest.mark.asyncio
+async def test_refused_recipient_fails_only_its_message(smtp_server):
+    sender = SMTPSender()
+    try:
+        errors = await sender.send(notifications("email", ["a@example.com", "reject@example.com", "c@example.com"]))
+    finally:
+        sender.close()
+
+    assert errors[0] is None and errors[2] is None
+    assert "reject@example.com" in errors[1]
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 2
+
+@pytest.mark.asyncio
+async def test_sms_batch_is_one_request(sms_server):
+    errors = await SMSSender().send(notifications("sms", ["+15550001", "+15550000", "+15550002"]))
+
+    assert errors == [None, "invalid number", None]
+    assert len(sms_server["requests"]) == 1
+    request = sms_server["requests"][0]
+    assert request["authorization"] == "Bearer sms-key"
+    assert [message["to"] for message in request["body"]["messages"]] == ["+15550001", "+15550000", "+15550002"]
+
+@pytest.mark.asyncio
+async def test_sms_provider_error_fails_the_batch(sms_server):
+    sms_server["status"] = 503
+    errors = await SMSSender().send(notifications("sms", ["+15550001", "+15550002"]))
+    assert len(errors) == 2 and all(errors)
+
+class RecordingSession:
+    def __init__(self):
+        self.rows = []
+
+    async def execute(self, statement, params=None):
+        self.rows.extend(params or [])
+
+@pytest.mark.asyncio
+async def test_failures_back_off_until_attempts_run_out():
+    db = RecordingSession()
+    batch = notifications("email", ["a@example.com", "b@example.com"], attempts=2)
+    batch += notifications("email", ["c@example.com"], attempts=5)
+    batch[2].id = 3
+
+    outcomes = await record_results(db, batch, [None, "timeout", "timeout"], max_attempts=5, retry_base_seconds=30)
+
+    assert outcomes == {"sent": 1, "retried": 1, "failed": 1}
+    sent, retried, failed = db.rows
+    assert sent["new_status"] == "sent" and sent["new_sent_at"] is not None
+    # Second attempt failed: next one after 2 x base
+    assert retried["new_status"] == "pending"
+    assert (retried["new_next_attempt_at"] - sent["new_sent_at"]).total_seconds() == pytest.approx(60)
+    assert failed["new_status"] == "failed" and failed["new_last_error"] == "timeout"
+    # Each row is fenced by the attempt count it was claimed with
+    assert [row["claimed_attempts"] for row in db.rows] == [2, 2, 5]
+
+# The outbox itself, on the application database
+
+@pytest.fixture
+async def outbox_user():
+    await create_tables()
+    async with write_session() as db:
+        await db.execute(delete(Notification))
+        user_id = await create_user(db, f"outbox_{uuid.uuid4().hex}@example.com", "hash", "Outbox User")
+    return user_id
+
+async def queue(user_id: int, channel: str, recipients):
+    async with write_session() as db:
+        return [await queue_notification(db, user_id, channel, recipient, None, {"body": "Hi"}) for recipient in recipients]
+
+async def stored(ids):
+    async with write_session() as db:
+        result = await db.scalars(select(Notification).where(Notification.id.in_(ids)))
+        return {notification.id: notification for notification in result.all()}
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_take_disjoint_batches(outbox_user):
+    ids = await queue(outbox_user, "email", ["a@example.com", "b@example.com", "c@example.com"])
+
+    async with write_session() as first:
+        claimed = await claim_due(first, "email", 2, 60)
+        # The first claim still holds its row locks; the second skips them
+        async with write_session() as second:
+            others = await claim_due(second, "email", 10, 60)
+
+    assert len(claimed) == 2 and len(others) == 1
+    assert {n.id for n in claimed} | {n.id for n in others} == set(ids)
+    assert all(n.attempts == 1 for n in claimed + others)
+
+    # Everything is leased now
+    async with write_session() as db:
+        assert await claim_due(db, "email", 10, 60) == []
+
+@pytest.mark.asyncio
+async def test_results_from_an_expired_lease_are_discarded(outbox_user):
+    [notification_id] = await queue(outbox_user, "email", ["a@example.com"])
+    async with write_session() as db:
+        stale = await claim_due(db, "email", 1, 0)
+    # The lease ran out, so another dispatcher claims the row again
+    async with write_session() as db:
+        fresh = await claim_due(db, "email", 1, 60)
+    assert [n.id for n in fresh] == [notification_id]
+
+    async with write_session() as db:
+        await record_results(db, stale, ["timeout"], max_attempts=5, retry_base_seconds=30)
+    row = (await stored([notification_id]))[notification_id]
+    assert row.attempts == 2 and row.last_error is None
+
+    async with write_session() as db:
+        await record_results(db, fresh, [None], max_attempts=5, retry_base_seconds=30)
+    assert (await stored([notification_id]))[notification_id].status == "sent"
+
+@pytest.mark.asyncio
+async def test_dispatch_sends_a_burst_as_one_batch(outbox_user, smtp_server, monkeypatch):
+    ids = await queue(outbox_user, "email", [f"user{i}@example.com" for i in range(5)])
+    sender = SMTPSender()
+    monkeypatch.setattr(dispatcher, "_senders", {"email": sender})
+    try:
+        more = await dispatcher.dispatch_batch("email", TokenBucket(rate=100, capacity=100))
+    finally:
+        sender.close()
+
+    assert more is False
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 5
+    rows = await stored(ids)
+    assert {row.status for row in rows.values()} == {"sent"}
+
+@pytest.mark.asyncio
+async def test_dispatch_batch_respects_the_rate_limit(outbox_user, smtp_server, monkeypatch):
+    ids = await queue(outbox_user, "email", [f"user{i}@example.com" for i in range(5)])
+    sender = SMTPSender()
+    monkeypatch.setattr(dispatcher, "_senders", {"email": sender})
+    try:
+        more = await dispatcher.dispatch_batch("email", TokenBucket(rate=2, capacity=2))
+    finally:
+        sender.close()
+
+    assert more is True
+    rows = await stored(ids)
+    assert sorted(row.status for row in rows.values()) == ["pending"] * 3 + ["sent"] * 2
+
+def test_token_bucket_limits_batch_size():
+    bucket = TokenBucket(rate=10, capacity=10)
+    assert bucket.available() == 10
+    bucket.take(10)
+    assert bucket.available() == 0
+    assert 0 < bucket.seconds_until_available() <= 0.1
+
+def test_users_can_only_notify_themselves_or_allow_listed_recipients(monkeypatch):
+    monkeypatch.setattr(get_settings(), "NOTIFICATION_ALLOWED_RECIPIENTS", {"order_shipped": ["+15550100"]})
+    user = User(id=1, email="Someone@Example.com")
+
+    def payload(channel, recipient, template_id=None):
+        return NotificationPayload(notification_type=channel, recipient=recipient, template_id=template_id)
+
+    assert recipient_allowed(user, payload("email", "someone@example.com"))
+    assert not recipient_allowed(user, payload("email", "victim@example.com"))
+    assert not recipient_allowed(user, payload("sms", "+15550100"))
+    assert recipient_allowed(user, payload("sms", "+15550100", "order_shipped"))
+    assert not recipient_allowed(user, payload("sms", "+15550199", "order_shipped"))
@@ -0,0 +1,117 @@
+import pytest
+from app.utils import rate_limit
+from app.utils.rate_limit import (
+    RateLimitPolicy,
+    RateLimitResult,
+    hit,
+    hit_local,
+    policy_for_path,
+    rate_limit_headers
+)
+
+def test_route_policy_matches_path_suffix():
+    assert policy_for_path("/api/v1/api/auth/v1/login").name == "login"
+    assert policy_for_path("/health").name == "default"
+    assert policy_for_path("/api/v1/api/web-service/v1/notify").fail_open is False
+
+def test_headers_for_rejected_request():
+    policy = policy_for_path("/api/v1/api/auth/v1/login")
+    result = RateLimitResult(
+        allowed=False,
+        limit=policy.limit,
+        remaining=0,
+        reset_seconds=6,
+        retry_after_seconds=6
+    )
+    headers = rate_limit_headers(policy, result)
+    assert headers["RateLimit-Limit"] == str(policy.limit)
+    assert headers["RateLimit-Remaining"] == "0"
+    assert headers["Retry-After"] == "6"
+    assert headers["RateLimit-Policy"] == f"{policy.limit};w=60"
+
+def test_local_limiter_enforces_limit_without_redis():
+    policy = RateLimitPolicy(name="local_test", limit=3)
+    results = [hit_local(policy, "127.0.0.1:/test") for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[-1].retry_after_seconds > 0
+
+def test_approximate_mode_only_covers_fail_open_counters():
+    assert policy_for_path("/health").can_approximate()
+    # Token bucket login and fail-closed password reset stay exact
+    assert not policy_for_path("/api/v1/api/auth/v1/login").can_approximate()
+    assert not policy_for_path("/api/v1/api/auth/v1/password-reset/request").can_approximate()
+
+# The Lua scripts, run by fakeredis' embedded Lua
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(rate_limit, "_registered_scripts", {})
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield redis
+    await redis.aclose()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["sliding_window_log", "sliding_window_counter", "token_bucket"])
+async def test_script_allows_up_to_limit_then_denies(fake_redis, algorithm):
+    policy = RateLimitPolicy(name=f"lua_{algorithm}", algorithm=algorithm, limit=3, window_seconds=60)
+    results = [await hit(fake_redis, policy, "127.0.0.1:/test") for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert 0 < results[-1].retry_after_seconds <= 60
+    # Other identities have their own budget
+    assert (await hit(fake_redis, policy, "10.0.0.1:/test")).allowed
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm, max_ttl_ms", [
+    ("sliding_window_log", 60_000),
+    ("sliding_window_counter", 120_000),
+    ("token_bucket", 60_000),
+])
+async def test_script_keys_expire(fake_redis, algorithm, max_ttl_ms):
+    policy = RateLimitPolicy(name=f"ttl_{algorithm}", algorithm=algorithm, limit=3, window_seconds=60)
+    await hit(fake_redis, policy, "127.0.0.1:/test")
+
+    ttl = await fake_redis.pttl(f"rate_limit:{policy.name}:127.0.0.1:/test")
+    assert 0 < ttl <= max_ttl_ms
+
+@pytest.fixture
+def local_counters(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_local_counters", {})
+    monkeypatch.setattr(rate_limit, "_pending", {})
+
+@pytest.mark.asyncio
+async def test_flush_pushes_local_counts_and_resets_the_buffer(fake_redis, local_counters, monkeypatch):
+    async def get_fake_redis():
+        return fake_redis
+
+    monkeypatch.setattr(rate_limit, "get_redis", get_fake_redis)
+    policy = RateLimitPolicy(name="flush_test", limit=100, window_seconds=3600)
+    for _ in range(3):
+        hit_local(policy, "127.0.0.1:/test")
+    [(key, window, _)] = rate_limit._pending
+    # Another worker has already pushed its own hits for the same window
+    await fake_redis.incrby(f"{key}:{window}", 5)
+
+    await rate_limit.flush_local_counters()
+
+    assert rate_limit._pending == {}
+    assert int(await fake_redis.get(f"{key}:{window}")) == 8
+    assert 0 < await fake_redis.pttl(f"{key}:{window}") <= 2 * 3600 * 1000
+    # Local decisions now start from the global total
+    assert rate_limit._local_counters[key]["count"] == 8
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_the_counts_for_the_next_one(local_counters, monkeypatch):
+    async def redis_down():
+        raise RuntimeError("Redis client is not initialized")
+
+    monkeypatch.setattr(rate_limit, "get_redis", redis_down)
+    policy = RateLimitPolicy(name="flush_retry_test", limit=100, window_seconds=3600)
+    for _ in range(3):
+        hit_local(policy, "127.0.0.1:/test")
+
+    await rate_limit.flush_local_counters()
+
+    assert list(rate_limit._pending.values()) == [3]
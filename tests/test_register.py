@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+from app import database
+from app.main import app
+from app.routers import auth as auth_router
+
+REGISTER_PATH = "/api/v1/api/auth/v1/register"
+NEW_USER = {"email": "new_user@example.com", "password": "testpassword", "full_name": "New User"}
+
+class RecordingSession:
+    """Stands in for the write session and records when it commits."""
+
+    def __init__(self, events, commit_error=None):
+        self.events = events
+        self.commit_error = commit_error
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def in_transaction(self):
+        return not self.committed
+
+    async def commit(self):
+        if self.commit_error is not None:
+            raise self.commit_error
+        self.committed = True
+        self.events.append("commit")
+
+    async def rollback(self):
+        self.events.append("rollback")
+
+@pytest.fixture
+def events(monkeypatch):
+    events = []
+
+    async def email_exists(db, email):
+        return False
+
+    async def create_user(db, email, password_hash, full_name):
+        events.append("insert")
+        return 1
+
+    async def invalidate_user(email):
+        events.append("invalidate")
+
+    monkeypatch.setattr(auth_router, "email_exists", email_exists)
+    monkeypatch.setattr(auth_router, "create_user", create_user)
+    monkeypatch.setattr(auth_router, "invalidate_user", invalidate_user)
+    return events
+
+def test_user_is_committed_before_cache_drop_and_response(events, monkeypatch):
+    monkeypatch.setattr(database, "async_session", lambda: RecordingSession(events))
+
+    response = TestClient(app).post(REGISTER_PATH, json=NEW_USER)
+
+    assert response.status_code == 201
+    assert events == ["insert", "commit", "invalidate"]
+
+def test_conflict_at_commit_is_reported_as_already_registered(events, monkeypatch):
+    error = IntegrityError("COMMIT", {}, Exception("duplicate key value violates unique constraint"))
+    monkeypatch.setattr(database, "async_session", lambda: RecordingSession(events, error))
+
+    response = TestClient(app).post(REGISTER_PATH, json=NEW_USER)
+
+    assert response.status_code == 400
+    assert events == ["insert", "rollback"]
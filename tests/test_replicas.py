@@ -0,0 +1,48 @@
+import pytest
+from app import database
+
+# SQLite files stand in for the replicas; lag is only measurable on Postgres
+pytest.importorskip("aiosqlite")
+
+@pytest.fixture
+async def replicas(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "replica_engines", [])
+    monkeypatch.setattr(database, "replica_sessions", [])
+    monkeypatch.setattr(database, "replica_healthy", [])
+    database.init_replicas([f"sqlite+aiosqlite:///{tmp_path}/replica{i}.db" for i in range(2)])
+    yield database.replica_sessions
+    for replica_engine in database.replica_engines:
+        await replica_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_reads_stay_on_primary_until_replicas_are_checked(replicas):
+    assert database.read_sessionmaker() is database.read_only_session
+
+    await database.check_replicas()
+    assert {database.read_sessionmaker() for _ in range(4)} == set(replicas)
+
+@pytest.mark.asyncio
+async def test_lagging_replica_leaves_rotation(replicas, monkeypatch):
+    async def replication_lag(replica_engine):
+        return 30.0 if replica_engine is database.replica_engines[0] else 0.0
+
+    monkeypatch.setattr(database, "replication_lag", replication_lag)
+    await database.check_replicas()
+    assert {database.read_sessionmaker() for _ in range(4)} == {replicas[1]}
+
+@pytest.mark.asyncio
+async def test_unreachable_replicas_fall_back_to_primary(replicas, monkeypatch):
+    async def replication_lag(replica_engine):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(database, "replication_lag", replication_lag)
+    await database.check_replicas()
+    assert database.read_sessionmaker() is database.read_only_session
+
+@pytest.mark.asyncio
+async def test_replica_sessions_are_recognised(replicas):
+    await database.check_replicas()
+    async for session in database.get_read_db():
+        assert database.is_replica_session(session)
+    async with database.async_session() as session:
+        assert not database.is_replica_session(session)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import uuid
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from app.utils import revocation
+
+def test_revoked_jti_is_always_found():
+    bits = bytearray(1024)
+    jtis = [uuid.uuid4().hex for _ in range(100)]
+    for jti in jtis:
+        revocation._add(bits, jti)
+
+    for jti in jtis:
+        positions = revocation._positions(jti, len(bits) * 8)
+        assert all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+def test_empty_filter_skips_redis():
+    assert revocation.might_be_revoked(uuid.uuid4().hex) is False
+
+class UnavailableRedis:
+    async def exists(self, *keys):
+        raise RedisError("connection refused")
+
+    async def mget(self, keys):
+        raise RedisError("connection refused")
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    async def get_redis():
+        return UnavailableRedis()
+    monkeypatch.setattr(revocation, "get_redis", get_redis)
+    monkeypatch.setattr(revocation, "_bits", bytearray(len(revocation._bits)))
+
+@pytest.mark.asyncio
+async def test_flagged_token_fails_closed_when_redis_is_down(redis_down):
+    jti = uuid.uuid4().hex
+    revocation._add(revocation._bits, jti)
+
+    with pytest.raises(HTTPException) as error:
+        await revocation.is_revoked(jti)
+    assert error.value.status_code == 503
+    with pytest.raises(HTTPException) as error:
+        await revocation.revoked_jtis([jti])
+    assert error.value.status_code == 503
+
+    # Tokens the filter has never seen still need no Redis at all
+    assert await revocation.is_revoked(uuid.uuid4().hex) is False
+
+@pytest.mark.asyncio
+async def test_listener_reconnects_after_redis_error(monkeypatch):
+    attempts = []
+    reconnected = asyncio.Event()
+
+    async def follow_revocations():
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RedisError("connection reset")
+        reconnected.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(revocation, "_follow_revocations", follow_revocations)
+    monkeypatch.setattr(revocation, "MAX_RECONNECT_DELAY", 0.01)
+    task = asyncio.create_task(revocation._sync_filter())
+    try:
+        await asyncio.wait_for(reconnected.wait(), 5)
+    finally:
+        task.cancel()
+    assert len(attempts) == 3
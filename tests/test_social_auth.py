@@ -0,0 +1,237 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from jose import jwk, jwt
+from app.config import get_settings
+from app.main import app
+from app.routers import auth as auth_router
+from app.utils import http_client, social_auth
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+FACEBOOK_APP_ID = "1234"
+
+@pytest.fixture(scope="module")
+def signing_key():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+@pytest.fixture(scope="module")
+def mock_provider(signing_key):
+    """Local stand-in for the Google and Facebook endpoints the app calls."""
+    public_jwk = dict(jwk.construct(signing_key, "RS256").public_key().to_dict(), kid="test-kid")
+    requests = []
+    profiles = {}
+
+    def respond(handler, payload, cache_control=None):
+        body = json.dumps(payload).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        if cache_control:
+            handler.send_header("Cache-Control", cache_control)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            path = urlparse(self.path).path
+            if path == "/certs":
+                respond(self, {"keys": [public_jwk]}, "public, max-age=3600")
+            elif path == "/oauth/access_token":
+                respond(self, {"access_token": "fb-access-token", "token_type": "bearer"})
+            elif path == "/me":
+                respond(self, dict({"id": "42"}, **profiles["facebook"]))
+            elif path == "/debug_token":
+                respond(self, {"data": {"is_valid": True, "app_id": FACEBOOK_APP_ID}})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            requests.append(self.path)
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            id_token = make_id_token(signing_key, email_verified=True, **profiles["google"])
+            respond(self, {"access_token": "google-access-token", "id_token": id_token})
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    yield {"url": f"{base_url}/certs", "base_url": base_url, "requests": requests, "profiles": profiles}
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def provider_profiles(mock_provider):
+    """The accounts the stand-in provider signs in; tests may change them."""
+    mock_provider["profiles"].update(
+        google={"email": "google_user@example.com", "name": "Google User"},
+        facebook={"email": "fb_user@example.com", "name": "Facebook User", "verified": True}
+    )
+    return mock_provider["profiles"]
+
+def configure_providers(mock_provider, monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "GOOGLE_JWKS_URL", mock_provider["url"])
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(settings, "GOOGLE_TOKEN_URL", f"{mock_provider['base_url']}/token")
+    monkeypatch.setattr(settings, "FACEBOOK_GRAPH_URL", mock_provider["base_url"])
+    monkeypatch.setattr(settings, "FACEBOOK_CLIENT_ID", FACEBOOK_APP_ID)
+    monkeypatch.setattr(settings, "FACEBOOK_CLIENT_SECRET", "facebook-secret")
+    monkeypatch.setattr(social_auth, "google_jwks", {})
+    monkeypatch.setattr(social_auth, "google_jwks_expires_at", 0.0)
+    monkeypatch.setattr(social_auth, "google_jwks_fetched_at", 0.0)
+
+@pytest.fixture
+async def provider_settings(mock_provider, monkeypatch):
+    configure_providers(mock_provider, monkeypatch)
+    await http_client.init_http_client()
+    yield
+    await http_client.close_http_client()
+
+def make_id_token(signing_key, **overrides):
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "google_user@example.com",
+        "exp": int(time.time()) + 300,
+        "iat": int(time.time()),
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, signing_key, algorithm="RS256", headers={"kid": "test-kid"})
+
+@pytest.mark.asyncio
+async def test_google_token_verified_locally(provider_settings, signing_key, mock_provider):
+    claims = await social_auth.verify_google_token(make_id_token(signing_key))
+    assert claims["email"] == "google_user@example.com"
+
+    # The second token is checked against the cached keys
+    fetched = len(mock_provider["requests"])
+    await social_auth.verify_google_token(make_id_token(signing_key))
+    assert len(mock_provider["requests"]) == fetched
+
+@pytest.mark.asyncio
+async def test_google_token_for_other_audience_is_rejected(provider_settings, signing_key):
+    token = make_id_token(signing_key, aud="someone-else")
+    assert await social_auth.verify_google_token(token) is None
+
+@pytest.mark.asyncio
+async def test_google_code_exchange(provider_settings):
+    profile = await social_auth.exchange_google_code("auth-code", "verifier")
+    assert profile == {"email": "google_user@example.com", "full_name": "Google User"}
+
+@pytest.mark.asyncio
+async def test_facebook_code_exchange_fetches_profile_and_token_info(provider_settings, mock_provider):
+    profile = await social_auth.exchange_facebook_code("auth-code", "verifier")
+    assert profile == {"email": "fb_user@example.com", "full_name": "Facebook User"}
+    paths = [urlparse(path).path for path in mock_provider["requests"]]
+    assert "/me" in paths and "/debug_token" in paths
+
+@pytest.mark.asyncio
+async def test_facebook_account_without_verified_email_is_rejected(provider_settings, provider_profiles):
+    provider_profiles["facebook"]["verified"] = False
+    with pytest.raises(HTTPException) as error:
+        await social_auth.exchange_facebook_code("auth-code", "verifier")
+    assert error.value.status_code == 400
+
+# Signing in commits the user before any token is issued for it
+
+class CommitRecorder:
+    def __init__(self, events):
+        self.events = events
+
+    async def commit(self):
+        self.events.append("commit")
+
+@pytest.fixture
+def sign_in_events(monkeypatch):
+    events = []
+
+    async def upsert_social_user(db, email, full_name):
+        events.append("upsert")
+        return {"id": 1, "email": email, "full_name": full_name, "password_hash": "!"}
+
+    async def invalidate_user(email):
+        events.append("invalidate")
+
+    monkeypatch.setattr(auth_router, "upsert_social_user", upsert_social_user)
+    monkeypatch.setattr(auth_router, "invalidate_user", invalidate_user)
+    return events
+
+@pytest.mark.asyncio
+async def test_social_user_is_committed_before_sign_in_returns(sign_in_events):
+    profile = {"email": "social@example.com", "full_name": "Social User"}
+    user = await auth_router.sign_in_social_user(CommitRecorder(sign_in_events), profile)
+
+    assert user["email"] == "social@example.com"
+    assert sign_in_events == ["upsert", "commit", "invalidate"]
+
+# Callback endpoints, through the app with the stand-in provider
+
+@pytest.fixture
+def social_client(mock_provider, monkeypatch):
+    configure_providers(mock_provider, monkeypatch)
+    with TestClient(app) as client:
+        yield client
+
+def start_login(client: TestClient, provider: str) -> str:
+    response = client.get(f"/api/v1/api/auth/v1/{provider}/login")
+    assert response.status_code == 200
+    return parse_qs(urlparse(response.json()["url"]).query)["state"][0]
+
+@pytest.mark.parametrize("provider", ["google", "facebook"])
+def test_callback_with_unknown_state_is_rejected(social_client, provider):
+    response = social_client.get(f"/api/v1/api/auth/v1/{provider}/callback", params={"code": "auth-code", "state": "forged"})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("provider", ["google", "facebook"])
+def test_callback_state_is_single_use(social_client, provider_profiles, provider):
+    provider_profiles[provider]["email"] = f"{provider}_{uuid.uuid4().hex}@example.com"
+    state = start_login(social_client, provider)
+    params = {"code": "auth-code", "state": state}
+    assert social_client.get(f"/api/v1/api/auth/v1/{provider}/callback", params=params).status_code == 200
+    # The PKCE verifier went with the first use
+    assert social_client.get(f"/api/v1/api/auth/v1/{provider}/callback", params=params).status_code == 400
+
+@pytest.mark.parametrize("provider", ["google", "facebook"])
+def test_callback_creates_then_signs_in_social_user(social_client, provider_profiles, provider):
+    email = f"{provider}_{uuid.uuid4().hex}@example.com"
+    provider_profiles[provider]["email"] = email
+    for _ in range(2):
+        state = start_login(social_client, provider)
+        response = social_client.get(f"/api/v1/api/auth/v1/{provider}/callback", params={"code": "auth-code", "state": state})
+        assert response.status_code == 200
+        me = social_client.get(
+            "/api/v1/api/auth/v1/me",
+            headers={"Authorization": f"Bearer {response.json()['access_token']}"}
+        )
+        assert me.json()["email"] == email
+
+@pytest.mark.parametrize("provider", ["google", "facebook"])
+def test_callback_does_not_take_over_password_account(social_client, provider_profiles, provider):
+    email = f"{provider}_{uuid.uuid4().hex}@example.com"
+    response = social_client.post(
+        "/api/v1/api/auth/v1/register",
+        json={"email": email, "password": "testpassword", "full_name": "Password User"}
+    )
+    assert response.status_code == 201
+
+    provider_profiles[provider]["email"] = email.upper()
+    state = start_login(social_client, provider)
+    response = social_client.get(f"/api/v1/api/auth/v1/{provider}/callback", params={"code": "auth-code", "state": state})
+    assert response.status_code == 409
+    assert "access_token" not in response.json()
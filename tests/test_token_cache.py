@@ -0,0 +1,39 @@
+import time
+from app.utils import token_cache
+
+USER = {"id": 1, "email": "test@example.com", "full_name": "Test User"}
+
+def setup_function():
+    token_cache.clear_token_cache()
+
+def test_cached_token_is_returned():
+    token_cache.cache_token("token-a", {"sub": USER["email"]}, USER)
+    claims, user = token_cache.get_cached_token("token-a")
+    assert claims["sub"] == USER["email"]
+    assert user == USER
+
+def test_entry_never_outlives_token_exp():
+    token_cache.cache_token("token-a", {"sub": USER["email"], "exp": time.time() - 1}, USER)
+    assert token_cache.get_cached_token("token-a") is None
+
+def test_invalidate_token():
+    token_cache.cache_token("token-a", {"sub": USER["email"]}, USER)
+    token_cache.cache_token("token-b", {"sub": USER["email"]}, USER)
+    token_cache.invalidate_token("token-a")
+    assert token_cache.get_cached_token("token-a") is None
+    assert token_cache.get_cached_token("token-b") is not None
+
+def test_invalidate_user_tokens():
+    other = {"id": 2, "email": "other@example.com", "full_name": "Other User"}
+    token_cache.cache_token("token-a", {"sub": USER["email"]}, USER)
+    token_cache.cache_token("token-b", {"sub": USER["email"]}, USER)
+    token_cache.cache_token("token-c", {"sub": other["email"]}, other)
+
+    token_cache.invalidate_user_tokens("Test@Example.com")
+
+    assert token_cache.get_cached_token("token-a") is None
+    assert token_cache.get_cached_token("token-b") is None
+    assert token_cache.get_cached_token("token-c") is not None
+    # Tokens verified after the change are cached again
+    token_cache.cache_token("token-d", {"sub": USER["email"]}, USER)
+    assert token_cache.get_cached_token("token-d") is not None
@@ -0,0 +1,170 @@
+import asyncio
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.repositories import user as user_repo
+from app.utils import token_cache
+
+pytestmark = pytest.mark.asyncio
+
+RECORD = {"id": 1, "email": "test@example.com", "full_name": "Test User"}
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def get_fake_redis():
+        return redis
+
+    monkeypatch.setattr(user_repo, "get_redis", get_fake_redis)
+    monkeypatch.setattr(user_repo, "_release_lock_script", None)
+    user_repo._local_cache.clear()
+    yield redis
+    user_repo._local_cache.clear()
+    await redis.aclose()
+
+@pytest.fixture
+def database(monkeypatch):
+    """Stands in for the users table; counts the queries that reach it."""
+    users = {}
+    queries = []
+
+    async def query_database(db, email):
+        queries.append(email)
+        return users.get(email)
+
+    monkeypatch.setattr(user_repo, "_query_database", query_database)
+    return users, queries
+
+async def test_cached_record_has_no_password_hash(fake_redis, database):
+    users, _ = database
+    users[RECORD["email"]] = dict(RECORD)
+
+    assert await user_repo.get_user_record(None, RECORD["email"]) == RECORD
+    stored = await fake_redis.hgetall(user_repo._redis_key(RECORD["email"]))
+    assert "password_hash" not in stored
+    assert "password_hash" not in user_repo.to_record(user_repo.UserModel(password_hash="secret", **RECORD))
+
+async def test_unknown_email_is_negatively_cached(fake_redis, database):
+    _, queries = database
+
+    assert await user_repo.get_user_record(None, "nobody@example.com") is None
+    assert await user_repo.get_user_record(None, "nobody@example.com") is None
+
+    assert queries == ["nobody@example.com"]
+    assert 0 < await fake_redis.ttl(user_repo._redis_key("nobody@example.com")) <= 5
+
+async def test_waiter_sees_negative_entry_instead_of_querying(fake_redis, database, monkeypatch):
+    _, queries = database
+    monkeypatch.setattr(user_repo, "LOCK_POLL_INTERVAL", 0.01)
+    key = user_repo._redis_key("nobody@example.com")
+    # Another worker holds the fill lock and has already recorded the miss
+    await fake_redis.set(f"{key}:lock", "other-worker")
+    await fake_redis.hset(key, user_repo.MISSING_FIELD, "1")
+
+    assert await user_repo.get_user_record(None, "nobody@example.com") is None
+    assert queries == []
+
+async def test_lock_of_another_worker_is_not_released(fake_redis, database, monkeypatch):
+    users, _ = database
+    users[RECORD["email"]] = dict(RECORD)
+    lock_key = f"{user_repo._redis_key(RECORD['email'])}:lock"
+
+    async def slow_query(db, email):
+        # Our lock expires mid-query and another worker takes it
+        await fake_redis.set(lock_key, "other-worker")
+        return users.get(email)
+
+    monkeypatch.setattr(user_repo, "_query_database", slow_query)
+    await user_repo.get_user_record(None, RECORD["email"])
+
+    assert await fake_redis.get(lock_key) == "other-worker"
+
+class ScriptedPubSub:
+    """A subscription that delivers what the test puts on its queue; exceptions are raised."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.subscribed = asyncio.Event()
+
+    async def subscribe(self, channel):
+        self.subscribed.set()
+
+    async def listen(self):
+        while True:
+            item = await self.queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield {"type": "message", "data": item}
+
+    async def unsubscribe(self, channel):
+        pass
+
+    async def aclose(self):
+        pass
+
+async def wait_until(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+async def test_invalidation_resumes_after_connection_drop(monkeypatch):
+    subscriptions = []
+
+    class ScriptedRedis:
+        def pubsub(self):
+            subscriptions.append(ScriptedPubSub())
+            return subscriptions[-1]
+
+    async def get_scripted_redis():
+        return ScriptedRedis()
+
+    monkeypatch.setattr(user_repo, "get_redis", get_scripted_redis)
+    monkeypatch.setattr(user_repo, "MAX_RECONNECT_DELAY", 0.01)
+    user_repo._local_cache.clear()
+    task = asyncio.create_task(user_repo._listen_for_invalidations())
+    try:
+        await wait_until(lambda: subscriptions and subscriptions[0].subscribed.is_set())
+        user_repo._set_local("a@example.com", dict(RECORD, email="a@example.com"))
+        user_repo._set_local("b@example.com", dict(RECORD, email="b@example.com"))
+        subscriptions[0].queue.put_nowait("a@example.com")
+        await wait_until(lambda: "a@example.com" not in user_repo._local_cache)
+
+        # The connection drops; whatever was published meanwhile is lost
+        subscriptions[0].queue.put_nowait(RedisConnectionError("Connection reset by peer"))
+        await wait_until(lambda: len(subscriptions) == 2 and subscriptions[1].subscribed.is_set())
+        await wait_until(lambda: "b@example.com" not in user_repo._local_cache)
+
+        user_repo._set_local("c@example.com", dict(RECORD, email="c@example.com"))
+        subscriptions[1].queue.put_nowait("c@example.com")
+        await wait_until(lambda: "c@example.com" not in user_repo._local_cache)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        user_repo._local_cache.clear()
+
+async def test_invalidating_a_user_drops_its_cached_tokens(fake_redis):
+    token_cache.clear_token_cache()
+    token_cache.cache_token("token-a", {"sub": RECORD["email"]}, RECORD)
+
+    await user_repo.invalidate_user(RECORD["email"])
+
+    assert token_cache.get_cached_token("token-a") is None
+
+async def test_bulk_invalidation_clears_negative_entries(fake_redis, database):
+    users, queries = database
+    emails = ["new1@example.com", "new2@example.com"]
+    for email in emails:
+        assert await user_repo.get_user_record(None, email) is None
+    # Rows appear behind the cache's back, as with a COPY import
+    for i, email in enumerate(emails, 1):
+        users[email] = {"id": i, "email": email, "full_name": "New"}
+
+    await user_repo.invalidate_users(["New1@Example.com", "new2@example.com"])
+
+    for email in emails:
+        assert (await user_repo.get_user_record(None, email))["email"] == email
+    assert queries == emails * 2
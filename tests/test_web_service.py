@@ -1,20 +1,73 @@
+import hashlib
+import hmac
+import json
+import time
+import uuid
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from app import database
+from app.config import get_settings
+from app.main import app
+from app.models.user import User as UserModel
+from app.routers import web_service
+from app.utils.auth import get_current_user
+from app.utils.webhook_auth import webhook_keys
 
-def test_webhook_endpoint(test_client):
-    response = test_client.post(
-        "/api/v1/web-service/webhook",
-        json={
-            "event_type": "user.created",
-            "data": {"user_id": "123", "email": "test@example.com"}
-        }
-    )
-    assert response.status_code == 200
-    assert response.json()["status"] == "success"
+WEBHOOK_SECRET = "test-webhook-secret"
+
+def signed(body: bytes) -> dict:
+    digest = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return {"X-Webhook-Signature": f"sha256={digest}", "Content-Type": "application/json"}
+
+@pytest.fixture
+def webhook_secret(monkeypatch):
+    monkeypatch.setattr(get_settings(), "WEBHOOK_SECRET", WEBHOOK_SECRET)
+    webhook_keys.cache_clear()
+    yield
+    webhook_keys.cache_clear()
+
+def test_webhook_endpoint(test_client, webhook_secret):
+    body = json.dumps({
+        "event_id": f"evt_{uuid.uuid4().hex}",
+        "event_type": "user.created",
+        "data": {"user_id": "123", "email": "test@example.com"},
+        "timestamp": str(int(time.time()))
+    }).encode()
+    response = test_client.post("/api/v1/api/web-service/v1/webhook", content=body, headers=signed(body))
+    assert response.status_code == 202
+    assert response.json()["status"] == "accepted"
+
+    # A redelivery of the same event is acknowledged but not queued again
+    response = test_client.post("/api/v1/api/web-service/v1/webhook", content=body, headers=signed(body))
+    assert response.status_code == 202
+    assert response.json()["status"] == "duplicate"
+
+def test_webhook_replayed_with_new_id_header_is_duplicate(test_client, webhook_secret):
+    body = json.dumps({
+        "event_id": f"evt_{uuid.uuid4().hex}",
+        "event_type": "user.created",
+        "data": {"user_id": "123"},
+        "timestamp": str(int(time.time()))
+    }).encode()
+    response = test_client.post("/api/v1/api/web-service/v1/webhook", content=body, headers=signed(body))
+    assert response.json()["status"] == "accepted"
+
+    # The header is not signed, so it cannot make a captured body look new
+    headers = dict(signed(body), **{"X-Webhook-Id": f"evt_{uuid.uuid4().hex}"})
+    response = test_client.post("/api/v1/api/web-service/v1/webhook", content=body, headers=headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "duplicate"
+
+def test_webhook_with_bad_signature_is_rejected(test_client, webhook_secret):
+    body = json.dumps({"event_id": "evt_1", "event_type": "user.created", "data": {}}).encode()
+    headers = dict(signed(body), **{"X-Webhook-Signature": "sha256=" + "0" * 64})
+    response = test_client.post("/api/v1/api/web-service/v1/webhook", content=body, headers=headers)
+    assert response.status_code == 401
 
 def test_callback_endpoint(test_client):
     response = test_client.post(
-        "/api/v1/web-service/callback/payment",
+        "/api/v1/api/web-service/v1/callback/payment",
         json={
             "transaction_id": "tx_123",
             "status": "success"
@@ -26,12 +79,95 @@ def test_callback_endpoint(test_client):
 @pytest.mark.asyncio
 async def test_notification_endpoint(test_client, authenticated_user):
     response = test_client.post(
-        "/api/v1/web-service/notify",
+        "/api/v1/api/web-service/v1/notify",
         json={
             "notification_type": "email",
-            "recipient": "user@example.com",
+            "recipient": "test@example.com",
             "data": {"subject": "Test", "body": "Test message"}
         },
         headers={"Authorization": f"Bearer {authenticated_user['access_token']}"}
     )
-    assert response.status_code == 202 
\ No newline at end of file
+    assert response.status_code == 202
+    assert isinstance(response.json()["notification_id"], int)
+
+@pytest.mark.asyncio
+async def test_notification_to_someone_else_is_forbidden(test_client, authenticated_user):
+    response = test_client.post(
+        "/api/v1/api/web-service/v1/notify",
+        json={"notification_type": "email", "recipient": "victim@example.com", "data": {"body": "Buy now"}},
+        headers={"Authorization": f"Bearer {authenticated_user['access_token']}"}
+    )
+    assert response.status_code == 403
+
+@pytest.mark.asyncio
+async def test_notification_with_unknown_type_is_rejected(test_client, authenticated_user):
+    response = test_client.post(
+        "/api/v1/api/web-service/v1/notify",
+        json={"notification_type": "pigeon", "recipient": "test@example.com"},
+        headers={"Authorization": f"Bearer {authenticated_user['access_token']}"}
+    )
+    assert response.status_code == 400
+
+# The outbox row is committed before the dispatcher is woken
+
+class OutboxSession:
+    def __init__(self, events, commit_error=None):
+        self.events = events
+        self.commit_error = commit_error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def in_transaction(self):
+        return False
+
+    async def commit(self):
+        if self.commit_error is not None:
+            raise self.commit_error
+        self.events.append("commit")
+
+    async def rollback(self):
+        self.events.append("rollback")
+
+@pytest.fixture
+def outbox_events(monkeypatch):
+    events = []
+
+    async def queue_notification(db, user_id, channel, recipient, template_id, data):
+        events.append("insert")
+        return 7
+
+    monkeypatch.setattr(web_service, "queue_notification", queue_notification)
+    monkeypatch.setattr(web_service, "wake_dispatcher", lambda: events.append("wake"))
+    # The notify policy fails closed without Redis
+    monkeypatch.setattr(get_settings(), "RATE_LIMIT_ENABLED", False)
+    app.dependency_overrides[get_current_user] = lambda: UserModel(id=1, email="test@example.com", full_name="Test User")
+    yield events
+    app.dependency_overrides.pop(get_current_user, None)
+
+def notify(client):
+    return client.post(
+        "/api/v1/api/web-service/v1/notify",
+        json={"notification_type": "email", "recipient": "test@example.com", "data": {"body": "Hello"}}
+    )
+
+def test_notification_is_committed_before_the_dispatcher_wakes(outbox_events, monkeypatch):
+    monkeypatch.setattr(database, "async_session", lambda: OutboxSession(outbox_events))
+
+    response = notify(TestClient(app))
+
+    assert response.status_code == 202
+    assert response.json()["notification_id"] == 7
+    assert outbox_events == ["insert", "commit", "wake"]
+
+def test_failed_outbox_commit_is_not_acknowledged(outbox_events, monkeypatch):
+    error = OperationalError("COMMIT", {}, Exception("server closed the connection unexpectedly"))
+    monkeypatch.setattr(database, "async_session", lambda: OutboxSession(outbox_events, error))
+
+    response = notify(TestClient(app))
+
+    assert response.status_code == 500
+    assert "wake" not in outbox_events
@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import time
+import pytest
+from fastapi import HTTPException, Request
+from app.utils import webhook_auth
+
+SECRETS = {"payments": "payments-secret"}
+
+@pytest.fixture
+def keys(monkeypatch):
+    settings = webhook_auth.get_settings()
+    monkeypatch.setattr(settings, "WEBHOOK_SECRETS", SECRETS)
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", "")
+    webhook_auth.webhook_keys.cache_clear()
+    yield
+    webhook_auth.webhook_keys.cache_clear()
+
+def signature(body: bytes, secret: str = SECRETS["payments"]) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def test_valid_signature_over_raw_body(keys):
+    body = b'{"event_type": "payment.succeeded",  "data": {}}'
+    webhook_auth.verify_signature(webhook_auth.webhook_key("payments"), body, signature(body))
+
+    # The cached key is reused, not consumed, by each verification
+    webhook_auth.verify_signature(webhook_auth.webhook_key("payments"), body, signature(body))
+
+@pytest.mark.parametrize("header", [
+    None,
+    "sha256=not-hex",
+    "sha1=" + "0" * 40,
+    signature(b"{}", secret="other-secret"),
+])
+def test_bad_signatures_are_rejected(keys, header):
+    with pytest.raises(HTTPException) as exc_info:
+        webhook_auth.verify_signature(webhook_auth.webhook_key("payments"), b"{}", header)
+    assert exc_info.value.status_code == 401
+
+def test_unknown_integration_is_not_found(keys):
+    with pytest.raises(HTTPException) as exc_info:
+        webhook_auth.webhook_key("default")
+    assert exc_info.value.status_code == 404
+
+@pytest.mark.parametrize("timestamp", [
+    str(int(time.time())),
+    time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+])
+def test_fresh_timestamps_pass(timestamp):
+    webhook_auth.check_replay_window(timestamp)
+
+@pytest.mark.parametrize("timestamp", [None, "yesterday", str(int(time.time()) - 3600)])
+def test_stale_or_missing_timestamps_are_rejected(timestamp):
+    with pytest.raises(HTTPException) as exc_info:
+        webhook_auth.check_replay_window(timestamp)
+    assert exc_info.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_oversized_body_is_refused_while_streaming(monkeypatch):
+    monkeypatch.setattr(webhook_auth.get_settings(), "WEBHOOK_MAX_BODY_BYTES", 10)
+    chunks = [b"0123456", b"789abc", b"never read"]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    # Chunked upload: no Content-Length to refuse it up front
+    request = Request({"type": "http", "headers": []}, receive)
+    with pytest.raises(HTTPException) as exc_info:
+        await webhook_auth.read_body(request)
+    assert exc_info.value.status_code == 413
+    assert chunks == [b"never read"]
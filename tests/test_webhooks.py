@@ -0,0 +1,172 @@
+import asyncio
+import json
+import pytest
+from app.utils import webhooks
+
+def message(event_type: str, **data) -> dict:
+    payload = {"event_id": "evt_1", "event_type": event_type, "data": data}
+    return {"id": "evt_1", "type": event_type, "payload": json.dumps(payload)}
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(webhooks, "EVENT_HANDLERS", registry)
+    return registry
+
+@pytest.mark.asyncio
+async def test_events_are_dispatched_by_type(handlers):
+    received = []
+
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        received.append(payload["data"]["invoice"])
+
+    assert await webhooks.handle_message(message("invoice.paid", invoice="in_1")) is True
+    assert received == ["in_1"]
+
+@pytest.mark.asyncio
+async def test_failed_handler_leaves_event_unacknowledged(handlers):
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        raise RuntimeError("downstream unavailable")
+
+    assert await webhooks.handle_message(message("invoice.paid")) is False
+
+@pytest.mark.asyncio
+async def test_slow_handler_times_out(handlers, monkeypatch):
+    monkeypatch.setattr(webhooks.get_settings(), "WEBHOOK_HANDLER_TIMEOUT_SECONDS", 0.01)
+
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        await asyncio.sleep(1)
+
+    assert await webhooks.handle_message(message("invoice.paid")) is False
+
+@pytest.mark.asyncio
+async def test_unknown_event_types_are_acknowledged(handlers):
+    assert await webhooks.handle_message(message("something.else")) is True
+
+# Retries and dead-lettering, against fakeredis streams
+
+@pytest.fixture
+async def stream(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    settings = webhooks.get_settings()
+    monkeypatch.setattr(settings, "WEBHOOK_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "WEBHOOK_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "WEBHOOK_BATCH_SIZE", 2)
+    await webhooks.ensure_consumer_group(redis)
+    yield redis
+    await redis.aclose()
+
+async def deliver(redis, *events) -> list:
+    """Queue events and have a consumer read them once, as _consume would."""
+    for event in events:
+        await redis.xadd(webhooks.WEBHOOK_STREAM, event)
+    response = await redis.xreadgroup(
+        webhooks.CONSUMER_GROUP, "worker-1", {webhooks.WEBHOOK_STREAM: ">"}, count=10
+    )
+    return response[0][1]
+
+async def pending_ids(redis) -> list:
+    pending = await redis.xpending_range(webhooks.WEBHOOK_STREAM, webhooks.CONSUMER_GROUP, min="-", max="+", count=100)
+    return [entry["message_id"] for entry in pending]
+
+@pytest.mark.asyncio
+async def test_failed_event_is_retried_after_backoff(handlers, stream):
+    calls = []
+
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        calls.append(payload["event_id"])
+        if len(calls) == 1:
+            raise RuntimeError("downstream unavailable")
+
+    await webhooks._process_batch(stream, await deliver(stream, message("invoice.paid")))
+    assert len(await pending_ids(stream)) == 1
+
+    await asyncio.sleep(0.02)
+    await webhooks._retry_failed(stream, "worker-2")
+
+    assert calls == ["evt_1", "evt_1"]
+    assert await pending_ids(stream) == []
+
+@pytest.mark.asyncio
+async def test_retry_waits_for_backoff(handlers, stream):
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        raise RuntimeError("downstream unavailable")
+
+    await webhooks._process_batch(stream, await deliver(stream, message("invoice.paid")))
+    await asyncio.sleep(0.02)
+    await webhooks._retry_failed(stream, "worker-2")
+    # Delivered twice now, so the next try waits twice the base delay
+    await webhooks._retry_failed(stream, "worker-2")
+
+    pending = await stream.xpending_range(webhooks.WEBHOOK_STREAM, webhooks.CONSUMER_GROUP, min="-", max="+", count=10)
+    assert pending[0]["times_delivered"] == 2
+
+@pytest.mark.asyncio
+async def test_exhausted_event_is_dead_lettered(handlers, stream):
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        raise RuntimeError("downstream unavailable")
+
+    messages = await deliver(stream, message("invoice.paid"))
+    await webhooks._process_batch(stream, messages)
+    for _ in range(3):
+        await asyncio.sleep(0.05)
+        await webhooks._retry_failed(stream, "worker-2")
+
+    assert await pending_ids(stream) == []
+    dead = await stream.xrange(webhooks.DEAD_LETTER_STREAM)
+    assert len(dead) == 1
+    assert dead[0][1]["id"] == "evt_1"
+    assert dead[0][1]["stream_id"] == messages[0][0]
+
+@pytest.mark.asyncio
+async def test_due_entries_behind_a_full_page_are_retried(handlers, stream, monkeypatch):
+    monkeypatch.setattr(webhooks.get_settings(), "WEBHOOK_MAX_ATTEMPTS", 10)
+    retried = []
+
+    @webhooks.webhook_handler("invoice.paid")
+    async def on_invoice_paid(payload):
+        raise RuntimeError("downstream unavailable")
+
+    @webhooks.webhook_handler("invoice.voided")
+    async def on_invoice_voided(payload):
+        retried.append(payload["event_type"])
+
+    # A page worth of entries still backing off at the head of the pending list
+    head = await deliver(stream, message("invoice.paid"), message("invoice.paid"))
+    await stream.xclaim(webhooks.WEBHOOK_STREAM, webhooks.CONSUMER_GROUP, "worker-1", 0, [m for m, _ in head])
+    await stream.xclaim(webhooks.WEBHOOK_STREAM, webhooks.CONSUMER_GROUP, "worker-1", 0, [m for m, _ in head])
+    await deliver(stream, message("invoice.voided"))
+
+    await asyncio.sleep(0.02)
+    await webhooks._retry_failed(stream, "worker-2")
+
+    assert retried == ["invoice.voided"]
+    assert await pending_ids(stream) == [m for m, _ in head]
+
+@pytest.mark.asyncio
+async def test_consumer_keeps_running_after_unexpected_error(handlers, stream, monkeypatch):
+    calls = 0
+
+    async def get_fake_redis():
+        return stream
+
+    async def flaky_retry(redis, consumer):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ValueError("bad entry")
+        # Still alive after the error; stop here
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(webhooks, "get_redis", get_fake_redis)
+    monkeypatch.setattr(webhooks, "_retry_failed", flaky_retry)
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(webhooks._consume("worker-1"), 5)
+    assert calls == 2